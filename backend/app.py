@@ -1,94 +1,315 @@
 # backend/app.py
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, Response, g, jsonify, request, stream_with_context
 from flask_cors import CORS
-import hardcoded_data
+import catalog
 # import mock_gemini # Remove or comment out old mock import
 import gemini_interaction as gemini_api # Use the new Gemini interaction module
-import logging # For logging from app.py as well
+import content_cache
+import content_pack
+import event_log
+import grading
+import mcq_pool
+import prefetch
+import llm_gateway
+import log_setup
+import question_bank
+import quiz_store
+import static_assets
+import token_budget
+import metrics
+import hashlib
+import hmac
+import json
 import os
+import secrets
+import threading
+import time
 
 app = Flask(__name__, static_folder='static', static_url_path='')
-CORS(app)
+CORS(app, expose_headers=["ETag", "X-Request-Id", "X-Total-Count"])
 
-# Configure basic logging for Flask app
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(module)s - %(message)s')
+# Browsers and proxies may reuse /api/subjects and /api/topics responses for this long, then revalidate.
+CATALOG_MAX_AGE = int(os.environ.get("CATALOG_MAX_AGE", "60"))
+
+# Largest class accepted by /api/grade-batch in one request.
+GRADE_BATCH_MAX_SUBMISSIONS = int(os.environ.get("GRADE_BATCH_MAX_SUBMISSIONS", "50000"))
+ASSIGNMENT_MAX_QUESTIONS = int(os.environ.get("ASSIGNMENT_MAX_QUESTIONS", "30"))
+
+# Bearer token for the teacher endpoints (/api/assignments, /api/grade-batch). Empty disables them.
+TEACHER_API_KEY = os.environ.get("TEACHER_API_KEY", "")
+
+# JSON log lines tagged with the request id, written by a background thread (LOG_FORMAT=text for the plain format).
+log_setup.configure()
+
+# Select the LLM backend (LLM_BACKEND=gemini by default, or "local" for the offline stand-in).
+# This is cheap: the Gemini SDK is imported by the warm-up below (or by the first LLM call),
+# so the worker starts serving catalog, pack and cached content straight away.
+gemini_api.configure_backend()
+if os.environ.get("LLM_WARMUP", "1") != "0":
+    threading.Thread(target=gemini_api.warm_up_backend, name="llm-warmup", daemon=True).start()
+
+# Load the curriculum catalog now, so a missing or broken catalog file fails at startup.
+catalog.current()
+
+# Memory-map the pre-generated content pack, if one has been built (see pregenerate.py).
+content_pack.load(prompt_version=gemini_api.PROMPT_VERSION)
+
+# Pre-warm the MCQ pools of the hot topics in the background (per worker process).
+mcq_pool.start()
+
+# Quiz and problem outcomes are written to the learner event log by a background thread.
+event_log.start()
+
+# Export the per-process stats as gauges on /metrics, and share this worker's metrics with the others.
+metrics.register_collector("catalog", catalog.stats)
+metrics.register_collector("content_cache", content_cache.stats)
+metrics.register_collector("content_pack", content_pack.stats)
+metrics.register_collector("mcq_pool", lambda: mcq_pool.stats(per_topic=False))
+metrics.register_collector("prefetch", prefetch.stats)
+metrics.register_collector("question_bank", question_bank.stats)
+metrics.register_collector("llm_gateway", llm_gateway.stats)
+metrics.register_collector("token_budget", token_budget.stats, label="tenant")
+metrics.register_collector("logging", log_setup.stats)
+metrics.register_collector("event_log", event_log.stats)
+metrics.register_collector("degraded", lambda: {"served": gemini_api.degraded_stats()}, label="content_type")
+metrics.start()
+
+# Build the gzip/brotli variants of the static front end that are missing or outdated.
+if static_assets.PRECOMPRESS_ON_START:
+    static_assets.precompress(app.static_folder)
+
+@app.before_request
+def _start_timer():
+    g.request_started = time.perf_counter()
+
+@app.before_request
+def _tag_request_logs():
+    log_setup.set_request_id(request.headers.get("X-Request-Id"))
+
+@app.after_request
+def _return_request_id(response):
+    response.headers["X-Request-Id"] = log_setup.request_id()
+    # Cleared once the body is sent, so the records of a streamed response keep the id.
+    response.call_on_close(log_setup.clear_request_id)
+    return response
+
+@app.before_request
+def _open_budget_scope():
+    # LLM calls made for this request are charged to the tenant and capped by the request budget.
+    token_budget.begin(token_budget.tenant_id(request.headers.get("X-Tenant-Id")))
+
+@app.after_request
+def _close_budget_scope(response):
+    # Closed when the server has sent the whole body: a streamed response keeps making
+    # LLM calls after this hook (teardown_request runs before the stream, too early).
+    active, path = token_budget.current(), request.path
+
+    def close():
+        if token_budget.current() is active:
+            token_budget.end()
+        if active is not None and active.spent:
+            app.logger.info("[TOKEN BUDGET] %s: %s tokens for tenant '%s'", path, active.spent, active.tenant)
+    response.call_on_close(close)
+    return response
+
+@app.after_request
+def _record_request_metrics(response):
+    # Streaming responses are timed to their headers; the LLM metrics cover the rest.
+    started = g.pop("request_started", None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        metrics.observe("eduro_http_request_duration_seconds", time.perf_counter() - started, route=route, method=request.method)
+        metrics.inc("eduro_http_requests_total", route=route, method=request.method, status=str(response.status_code))
+    return response
 
 @app.route('/')
 def serve_index():
     app.logger.info("GET / - Serving index.html")
-    # 'index.html' is directly in the 'static_folder' specified above
-    return send_from_directory(app.static_folder, 'index.html')
+    # 'index.html' is directly in the 'static_folder' specified above; its asset URLs carry content hashes.
+    return static_assets.index_response(app.static_folder, request)
+
+def serve_static(filename):
+    # Replaces Flask's static view: precompressed variants and long-lived caching for versioned URLs.
+    if filename == static_assets.INDEX_FILENAME:
+        return serve_index()
+    return static_assets.send(app.static_folder, filename, request.accept_encodings, request.args.get('v'))
+
+app.view_functions['static'] = serve_static
+
+def _catalog_filters():
+    """board/grade query parameters for the catalog endpoints. Raises ValueError on a bad grade."""
+    grade = request.args.get('grade')
+    return request.args.get('board') or None, int(grade) if grade else None
+
+def _catalog_response(build_payload):
+    """
+    Serves a catalog listing with an ETag derived from the catalog version and the query, and
+    a Cache-Control max-age. A matching If-None-Match gets a 304 without building the body.
+    ?offset=&limit= paginate the list; the full length is sent as X-Total-Count.
+    """
+    catalog_version = catalog.current().version
+    etag = hashlib.blake2b(f"{catalog_version}?{request.query_string.decode()}".encode(), digest_size=12).hexdigest()
+    headers = {"Cache-Control": f"public, max-age={CATALOG_MAX_AGE}"}
+    if etag in request.if_none_match:
+        response = Response(status=304, headers=headers)
+        response.set_etag(etag)
+        return response
+    try:
+        offset = int(request.args.get('offset', 0))
+        limit = int(request.args['limit']) if request.args.get('limit') else None
+        items = build_payload()
+    except ValueError:
+        return jsonify({"error": "grade, offset and limit must be integers"}), 400
+    page, total = catalog.paginate(items, offset, limit)
+    response = jsonify(page)
+    response.headers.update(headers)
+    response.headers["X-Total-Count"] = str(total)
+    response.set_etag(etag)
+    return response
 
 @app.route('/api/subjects', methods=['GET'])
 def api_get_subjects():
     app.logger.info("GET /api/subjects called")
-    return jsonify(hardcoded_data.get_subjects())
+    return _catalog_response(lambda: catalog.get_subjects(*_catalog_filters()))
 
 @app.route('/api/topics', methods=['GET'])
 def api_get_topics():
     subject = request.args.get('subject')
-    app.logger.info(f"GET /api/topics called with subject: {subject}")
+    app.logger.info("GET /api/topics called with subject: %s", subject)
     if not subject:
         app.logger.warning("Subject parameter missing for /api/topics")
         return jsonify({"error": "Subject parameter is required"}), 400
-    return jsonify(hardcoded_data.get_topics(subject))
+    return _catalog_response(lambda: catalog.get_topics(subject, *_catalog_filters()))
+
+def _view_key(session_id):
+    """Per-student key for permute.view: the session, or a one-off key for clients without one."""
+    return session_id or secrets.token_urlsafe(8)
+
+def _draw_or_generate_mcqs(topic, num_questions, session_id):
+    """
+    Serves MCQs the session has not seen from the content pack, the pre-warmed pool or the
+    question bank, falling back to a live Gemini call.
+    """
+    questions = mcq_pool.draw(topic, num_questions, session_id)
+    if questions:
+        app.logger.info("Served %s MCQs for topic '%s' from the pack/pool", len(questions), topic)
+        question_bank.mark_seen(session_id, questions)
+        return questions
+    questions = question_bank.fetch_unseen(topic, num_questions, session_id)
+    if questions:
+        app.logger.info("Served %s MCQs for topic '%s' from the question bank", len(questions), topic)
+        mcq_pool.mark_seen(session_id, questions)
+        return questions
+    questions = gemini_api.generate_mcqs(topic, num_questions=num_questions)
+    if questions:
+        mcq_pool.record_live_generation(topic, questions, session_id)
+        question_bank.mark_seen(session_id, questions)
+    return questions
 
 @app.route('/api/initial-mcqs', methods=['POST'])
 def api_initial_mcqs():
     data = request.json
     subject = data.get('subject')
     topic = data.get('topic')
-    app.logger.info(f"POST /api/initial-mcqs for subject: {subject}, topic: {topic}")
+    session_id = data.get('session_id')
+    app.logger.info("POST /api/initial-mcqs for subject: %s, topic: %s", subject, topic)
 
     if not subject or not topic:
         app.logger.warning("Missing subject or topic for /api/initial-mcqs")
         return jsonify({"error": "Subject and topic are required"}), 400
 
-    questions = gemini_api.generate_mcqs(topic, num_questions=3)
+    prefetch.enter_topic(session_id, subject, topic)
+    questions = _draw_or_generate_mcqs(topic, 3, session_id)
     if not questions: # Handles empty list or other failures from Gemini
-        app.logger.error(f"Failed to generate initial MCQs for topic: {topic}")
+        app.logger.error("Failed to generate initial MCQs for topic: %s", topic)
         return jsonify({"error": "AI failed to generate initial quiz questions. Please try again later."}), 500
     
-    app.logger.info(f"Successfully generated {len(questions)} initial MCQs for topic: {topic}")
-    return jsonify({"questions": questions})
+    view_key = _view_key(session_id)
+    degraded = gemini_api.is_degraded(questions)
+    quiz_id = quiz_store.create_quiz("mcq", questions, subject=subject, topic=topic, view_key=view_key, degraded=degraded)
+    app.logger.info("Successfully generated %s initial MCQs for topic: %s (quiz %s)", len(questions), topic, quiz_id)
+    return jsonify({"quiz_id": quiz_id, "questions": [quiz_store.public_question(q, view_key) for q in questions], "degraded": degraded})
 
 
 @app.route('/api/evaluate-initial-mcqs', methods=['POST'])
 def api_evaluate_initial_mcqs():
     data = request.json
     user_answers = data.get('answers')
-    original_questions = data.get('original_questions')
-    subject = data.get('subject') # For fetching sections if needed
-    topic = data.get('topic')     # For fetching sections if needed
-    app.logger.info(f"POST /api/evaluate-initial-mcqs for topic: {topic}")
+    quiz_id = data.get('quiz_id')
+    app.logger.info("POST /api/evaluate-initial-mcqs for quiz: %s", quiz_id)
 
 
-    if not user_answers or not original_questions:
-        app.logger.warning("Missing answers or original_questions for MCQ evaluation")
-        return jsonify({"error": "Answers and original questions are required"}), 400
+    if not user_answers or not quiz_id:
+        app.logger.warning("Missing answers or quiz_id for MCQ evaluation")
+        return jsonify({"error": "Answers and quiz_id are required"}), 400
 
-    correct_count = 0
-    for user_ans in user_answers:
-        q_id = user_ans.get("question_id")
-        selected_answer = user_ans.get("selected_answer")
-        
-        original_q = next((q for q in original_questions if q["id"] == q_id), None)
-        if original_q and original_q["correct_answer"] == selected_answer:
-            correct_count += 1
+    quiz = quiz_store.get_quiz(quiz_id)
+    if not quiz or quiz["kind"] != "mcq":
+        app.logger.warning("Unknown or expired quiz: %s", quiz_id)
+        return jsonify({"error": "This quiz has expired. Please start the topic again."}), 404
+
+    answer_key = quiz_store.answer_key(quiz)
+    # Keep one answer per question so resubmitting an answer cannot inflate the score.
+    selected = {ans.get("question_id"): ans.get("selected_answer") for ans in user_answers}
+    correct_count = sum(1 for q_id, answer in selected.items() if q_id in answer_key and answer_key[q_id] == answer)
             
-    all_correct = correct_count == len(original_questions)
-    app.logger.info(f"MCQ Evaluation: {correct_count}/{len(original_questions)} correct. All correct: {all_correct}")
+    all_correct = correct_count == len(answer_key)
+    app.logger.info("MCQ Evaluation: %s/%s correct. All correct: %s", correct_count, len(answer_key), all_correct)
+
+    if quiz.get("degraded"):
+        # Placeholder questions (served while the AI tutor was unavailable) have arbitrary
+        # answer keys: no placement decision, the student studies every section.
+        return jsonify({
+            "all_correct": False,
+            "degraded": True,
+            "message": "These were practice questions while the AI tutor was unavailable, so they don't decide where you start. Let's review the topic.",
+            "sections": catalog.get_sections(quiz.get("subject"), quiz.get("topic")),
+            "skipped_sections": [],
+            "expanded_sections": [],
+            "section_plan": [],
+        })
+
+    student, learner_token = _student(data)
+    section_of = {q.get("id"): q.get("section_title") for q in quiz["questions"]}
+    event_log.record("mcq", student, quiz.get("subject"), quiz.get("topic"), [
+        (section_of.get(q_id), q_id, selected.get(q_id) == answer) for q_id, answer in answer_key.items()
+    ], quiz_id=quiz_id)
     
     if all_correct:
-        return jsonify({"all_correct": True, "message": "Great job! All correct."})
+        return jsonify({"all_correct": True, "message": "Great job! All correct.", "learner_token": learner_token})
     else:
-        sections = hardcoded_data.get_sections(subject, topic)
+        # Sections this student has already mastered are skipped; weak ones are expanded.
+        sections = catalog.get_sections(quiz.get("subject"), quiz.get("topic"))
+        plan = event_log.section_plan(student, quiz.get("subject"), quiz.get("topic"), sections,
+                                      correct_count / max(len(answer_key), 1))
         return jsonify({
             "all_correct": False,
-            "message": f"You got {correct_count} out of {len(original_questions)} correct. Let's review the topic.",
-            "sections": sections
+            "message": f"You got {correct_count} out of {len(answer_key)} correct. Let's review the topic.",
+            "sections": [item["section_title"] for item in plan if item["action"] != "skip"],
+            "skipped_sections": [item["section_title"] for item in plan if item["action"] == "skip"],
+            "expanded_sections": [item["section_title"] for item in plan if item["action"] == "expand"],
+            "section_plan": plan,
+            "learner_token": learner_token,
         })
 
+def _student(data):
+    """
+    The learner an answer is recorded for and the learner token to return: the one the client
+    sent if this server signed it, else a newly issued learner.
+    """
+    token = data.get("learner_token")
+    student = event_log.student_id(token)
+    if student is None:
+        token = event_log.issue_learner_token()
+        student = event_log.student_id(token)
+    return student, token
+
+def _content_error_message(raw_error):
+    """Maps a generation error sentinel to the message shown to the student."""
+    if "blocked" in raw_error:
+        return "Sorry, the AI tutor couldn't generate this content due to safety filters. Please try a different section or topic."
+    return "Sorry, the AI tutor couldn't generate this part of the lesson. Please try moving to the next step or try again later."
+
 @app.route('/api/learning-content', methods=['POST'])
 def api_learning_content():
     data = request.json
@@ -96,81 +317,329 @@ def api_learning_content():
     topic = data.get('topic')
     section_title = data.get('section_title')
     content_type = data.get('content_type') # 'explanation', 'example', 'problem'
-    app.logger.info(f"POST /api/learning-content for {topic} - {section_title}, type: {content_type}")
+    session_id = data.get('session_id')
+    app.logger.info("POST /api/learning-content for %s - %s, type: %s", topic, section_title, content_type)
 
 
     if not all([subject, topic, section_title, content_type]):
         app.logger.warning("Missing parameters for /api/learning-content")
         return jsonify({"error": "Missing required parameters"}), 400
 
+    prefetch.wait_for(session_id, subject, topic, section_title, content_type)
+    prefetch.schedule_after(session_id, subject, topic, section_title, content_type)
+
+    degraded_before = gemini_api.degraded_in_thread()
     content = ""
     if content_type == "explanation":
         content = gemini_api.generate_explanation(topic, section_title)
     elif content_type == "example":
         content = gemini_api.generate_solved_example(topic, section_title)
     elif content_type == "problem":
-        problem_mcq = gemini_api.generate_problem(topic, section_title)
+        # A banked problem this session has not seen yet saves a generation.
+        banked = question_bank.fetch_unseen(topic, 1, session_id, section_title=section_title)
+        problem_mcq = banked[0] if banked else gemini_api.generate_problem(topic, section_title)
         if not problem_mcq: # Check if None or empty
-            app.logger.error(f"AI failed to generate problem MCQ for {topic} - {section_title}")
+            app.logger.error("AI failed to generate problem MCQ for %s - %s", topic, section_title)
             user_error_message = "Sorry, the AI tutor couldn't generate a practice problem for this section. Please try moving to the next step or try again later."
             # Return the raw_error if you want more details on frontend/logging for debugging
             return jsonify({"error": user_error_message, "raw_error": "Problem generation returned None from AI"}), 500
-        content = problem_mcq # content is now the MCQ dict
+        # The answer key stays on the server; the client gets the question and a problem_id to grade against.
+        if not banked:
+            question_bank.mark_seen(session_id, [problem_mcq])
+        view_key = _view_key(session_id)
+        problem_degraded = gemini_api.is_degraded([problem_mcq])
+        problem_id = quiz_store.create_quiz("problem", [problem_mcq], subject=subject, topic=topic,
+                                            section_title=section_title, view_key=view_key, degraded=problem_degraded)
+        content = dict(quiz_store.public_question(problem_mcq, view_key), problem_id=problem_id, degraded=problem_degraded)
     else:
-        app.logger.warning(f"Invalid content_type: {content_type}")
+        app.logger.warning("Invalid content_type: %s", content_type)
         return jsonify({"error": "Invalid content_type"}), 400
     
     # Check for error strings from text generation, or if content is still None (e.g. invalid content_type not caught)
-    if isinstance(content, str) and (content.startswith("[AI Error:") or content.startswith("[Error:") or content.startswith("[AI content generation blocked:")):
-        app.logger.error(f"AI failed to generate content for {content_type} on {topic} - {section_title}: {content}")
-        user_error_message = "Sorry, the AI tutor couldn't generate this part of the lesson. Please try moving to the next step or try again later."
-        if "blocked" in content:
-            user_error_message = "Sorry, the AI tutor couldn't generate this content due to safety filters. Please try a different section or topic."
-        return jsonify({"error": user_error_message, "raw_error": content}), 500
+    if isinstance(content, str) and content.startswith(content_cache.ERROR_PREFIXES):
+        app.logger.error("AI failed to generate content for %s on %s - %s: %s", content_type, topic, section_title, content)
+        return jsonify({"error": _content_error_message(content), "raw_error": content}), 500
     elif content is None and content_type not in ["explanation", "example", "problem"]: # Should be caught by invalid content_type earlier
-        app.logger.error(f"Content remained None for an unknown reason, content_type: {content_type}")
+        app.logger.error("Content remained None for an unknown reason, content_type: %s", content_type)
         return jsonify({"error": "An unexpected error occurred generating content."}), 500
         
-    app.logger.info(f"Successfully generated learning content for {content_type}")
-    return jsonify({"content": content})
+    app.logger.info("Successfully generated learning content for %s", content_type)
+    # Clients may keep lesson text (not per-student problems, nor offline placeholder text) across visits.
+    degraded = gemini_api.degraded_in_thread() != degraded_before
+    cacheable = content_type != "problem" and not degraded
+    return jsonify({"content": content, "cacheable": cacheable, "degraded": degraded})
+
+
+def _sse_event(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+@app.route('/api/learning-content/stream', methods=['GET', 'POST'])
+def api_learning_content_stream():
+    """
+    Server-Sent Events variant of /api/learning-content for text content types.
+    Emits "chunk" events ({"text": ...}) as Gemini produces them, then one terminal
+    "done" ({"content": full_text, "cacheable": bool, "degraded": bool}) or "error" ({"error": ..., "raw_error": ...}) event.
+    """
+    data = request.get_json(silent=True) or request.args
+    subject = data.get('subject')
+    topic = data.get('topic')
+    section_title = data.get('section_title')
+    content_type = data.get('content_type') # 'explanation' or 'example'
+    session_id = data.get('session_id')
+    app.logger.info("%s /api/learning-content/stream for %s - %s, type: %s", request.method, topic, section_title, content_type)
+
+    if not all([subject, topic, section_title, content_type]):
+        app.logger.warning("Missing parameters for /api/learning-content/stream")
+        return jsonify({"error": "Missing required parameters"}), 400
+    if content_type not in gemini_api.TEXT_CONTENT_TYPES:
+        app.logger.warning("Invalid content_type for streaming: %s", content_type)
+        return jsonify({"error": "Only 'explanation' and 'example' can be streamed"}), 400
+
+    prefetch.wait_for(session_id, subject, topic, section_title, content_type)
+    prefetch.schedule_after(session_id, subject, topic, section_title, content_type)
+
+    def generate():
+        # An initial comment flushes the response headers so the client can start reading immediately.
+        yield ": stream-open\n\n"
+        degraded_before = gemini_api.degraded_in_thread()
+        for event, value in gemini_api.stream_text_content(content_type, topic, section_title):
+            if event == "chunk":
+                yield _sse_event("chunk", {"text": value})
+            elif event == "done":
+                app.logger.info("Successfully streamed learning content for %s", content_type)
+                degraded = gemini_api.degraded_in_thread() != degraded_before
+                yield _sse_event("done", {"content": value, "cacheable": not degraded, "degraded": degraded})
+            else:
+                app.logger.error("AI failed to stream %s on %s - %s: %s", content_type, topic, section_title, value)
+                yield _sse_event("error", {"error": _content_error_message(value), "raw_error": value})
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers=headers)
+
+
+@app.route('/api/lesson-bundle', methods=['POST'])
+def api_lesson_bundle():
+    """
+    Returns every section's explanation, solved example and practice problem for a topic
+    in one response, generated with a single structured Gemini call. Parts that could not
+    be generated are null; the client falls back to /api/learning-content for those.
+    "cacheable" is false when any part may be offline placeholder content.
+    """
+    data = request.json
+    subject = data.get('subject')
+    topic = data.get('topic')
+    app.logger.info("POST /api/lesson-bundle for subject: %s, topic: %s", subject, topic)
+
+    if not subject or not topic:
+        app.logger.warning("Missing subject or topic for /api/lesson-bundle")
+        return jsonify({"error": "Subject and topic are required"}), 400
+
+    sections = catalog.get_sections(subject, topic)
+    if not sections:
+        app.logger.warning("No sections for %s - %s", subject, topic)
+        return jsonify({"error": "Unknown subject or topic"}), 404
+
+    # Repairs run on pool threads, so this compares the process-wide count: conservative under load.
+    degraded_before = sum(gemini_api.degraded_stats().values())
+    lesson = gemini_api.generate_lesson_bundle(topic, sections)
+    cacheable = sum(gemini_api.degraded_stats().values()) == degraded_before
+    view_key = _view_key(data.get('session_id'))
+    bundle = []
+    for item in lesson:
+        problem = item["problem"]
+        if problem:
+            problem_degraded = gemini_api.is_degraded([problem])
+            problem_id = quiz_store.create_quiz("problem", [problem], subject=subject, topic=topic,
+                                                section_title=item["section_title"], view_key=view_key, degraded=problem_degraded)
+            problem = dict(quiz_store.public_question(problem, view_key), problem_id=problem_id, degraded=problem_degraded)
+        bundle.append({
+            "section_title": item["section_title"],
+            "explanation": item["explanation"] if content_cache.is_cacheable(item["explanation"]) else None,
+            "example": item["example"] if content_cache.is_cacheable(item["example"]) else None,
+            "problem": problem,
+        })
+
+    app.logger.info("Served lesson bundle for %s (%s sections)", topic, len(bundle))
+    return jsonify({"sections": bundle, "cacheable": cacheable})
 
 
 @app.route('/api/advanced-mcqs', methods=['POST'])
 def api_advanced_mcqs():
     data = request.json
     topic = data.get('topic')
-    app.logger.info(f"POST /api/advanced-mcqs for topic: {topic}")
+    session_id = data.get('session_id')
+    app.logger.info("POST /api/advanced-mcqs for topic: %s", topic)
 
     if not topic:
         app.logger.warning("Missing topic for /api/advanced-mcqs")
         return jsonify({"error": "Topic is required"}), 400
     
-    questions = gemini_api.generate_mcqs(topic, num_questions=5)
+    prefetch.leave(session_id) # The lesson is over; nothing further to prefetch.
+    questions = _draw_or_generate_mcqs(topic, 5, session_id)
     if not questions: # Handles empty list or other failures from Gemini
-        app.logger.error(f"Failed to generate advanced MCQs for topic: {topic}")
+        app.logger.error("Failed to generate advanced MCQs for topic: %s", topic)
         return jsonify({"error": "AI failed to generate advanced quiz questions. Please try again later."}), 500
     
-    app.logger.info(f"Successfully generated {len(questions)} advanced MCQs for topic: {topic}")
-    return jsonify({"questions": questions})
+    view_key = _view_key(session_id)
+    degraded = gemini_api.is_degraded(questions)
+    quiz_id = quiz_store.create_quiz("mcq", questions, subject=data.get('subject'), topic=topic, view_key=view_key, degraded=degraded)
+    app.logger.info("Successfully generated %s advanced MCQs for topic: %s (quiz %s)", len(questions), topic, quiz_id)
+    return jsonify({"quiz_id": quiz_id, "questions": [quiz_store.public_question(q, view_key) for q in questions], "degraded": degraded})
 
 @app.route('/api/evaluate-problem-answer', methods=['POST'])
 def api_evaluate_problem_answer():
     data = request.json
     user_answer = data.get('user_answer')
-    problem = data.get('problem')  # Should be the MCQ dict as returned by generate_problem
-    app.logger.info(f"POST /api/evaluate-problem-answer for problem id: {problem.get('id') if problem else None}")
+    problem_id = data.get('problem_id')  # As returned with the problem by /api/learning-content
+    app.logger.info("POST /api/evaluate-problem-answer for problem id: %s", problem_id)
+
+    if not user_answer or not problem_id:
+        app.logger.warning("Missing user_answer or problem_id for problem answer evaluation")
+        return jsonify({"error": "User answer and problem_id are required"}), 400
 
-    if not user_answer or not problem:
-        app.logger.warning("Missing user_answer or problem for problem answer evaluation")
-        return jsonify({"error": "User answer and problem are required"}), 400
+    problem = quiz_store.get_quiz(problem_id)
+    if not problem or problem["kind"] != "problem":
+        app.logger.warning("Unknown or expired problem: %s", problem_id)
+        return jsonify({"error": "This problem has expired. Click 'Next' to get a new one."}), 404
 
-    correct_answer = problem.get('correct_answer')
+    # Graded against the view the student was shown (options order, template values).
+    correct_answer = quiz_store.student_questions(problem)[0]["correct_answer"]
     is_correct = (user_answer.strip() == correct_answer.strip())
+    result = {"correct": is_correct}
+    if not problem.get("degraded"):  # Placeholder problems are practice only: no mastery from them.
+        student, result["learner_token"] = _student(data)
+        event_log.record("problem", student, problem.get("subject"), problem.get("topic"),
+                         [(problem.get("section_title"), problem["questions"][0].get("id"), is_correct)], quiz_id=problem_id)
 
     if is_correct:
-        return jsonify({"correct": True, "message": "Correct! Proceed to the next section."})
+        result["message"] = "Correct! Proceed to the next section."
     else:
-        return jsonify({"correct": False, "message": "Incorrect. Please review this section and try again."})
+        result["message"] = "Incorrect. Please review this section and try again."
+    return jsonify(result)
+
+def _teacher_auth_error():
+    """None if the request carries the TEACHER_API_KEY bearer token, else the error response to return."""
+    if not TEACHER_API_KEY:
+        return jsonify({"error": "Teacher endpoints are disabled on this server."}), 403
+    supplied = request.headers.get("Authorization", "")
+    if not hmac.compare_digest(supplied.encode(), f"Bearer {TEACHER_API_KEY}".encode()):
+        app.logger.warning("Rejected teacher request to %s without a valid token", request.path)
+        return jsonify({"error": "Teacher authorization required"}), 401
+    return None
+
+@app.route('/api/assignments', methods=['POST'])
+def api_create_assignment():
+    """
+    Creates a quiz to hand out to a whole class (teachers only). Body: {"subject", "topic",
+    "num_questions"}. Every student gets the same view of it, which /api/grade-batch grades
+    against. Returns {"assignment_id", "questions"} without the answers.
+    """
+    auth_error = _teacher_auth_error()
+    if auth_error:
+        return auth_error
+    data = request.get_json(silent=True) or {}
+    subject = data.get('subject')
+    topic = data.get('topic')
+    try:
+        num_questions = int(data.get('num_questions', 10))
+    except (TypeError, ValueError):
+        num_questions = 0
+    app.logger.info("POST /api/assignments for subject: %s, topic: %s (%s questions)", subject, topic, num_questions)
+
+    if not subject or not topic or not 0 < num_questions <= ASSIGNMENT_MAX_QUESTIONS:
+        return jsonify({"error": f"subject, topic and 1-{ASSIGNMENT_MAX_QUESTIONS} num_questions are required"}), 400
+
+    # Never placeholder questions: their answer keys are arbitrary.
+    questions = gemini_api.generate_mcqs(topic, num_questions=num_questions, allow_degraded=False)
+    if not questions:
+        app.logger.error("Failed to generate assignment questions for topic: %s", topic)
+        return jsonify({"error": "AI failed to generate the assignment questions. Please try again later."}), 503
+
+    view_key = secrets.token_urlsafe(8)  # one view, shared by the whole class
+    assignment_id = quiz_store.create_quiz("assignment", questions, subject=subject, topic=topic, view_key=view_key)
+    app.logger.info("Created assignment %s with %s questions for topic: %s", assignment_id, len(questions), topic)
+    return jsonify({"assignment_id": assignment_id, "questions": [quiz_store.public_question(q, view_key) for q in questions]})
+
+@app.route('/api/grade-batch', methods=['POST'])
+def api_grade_batch():
+    """
+    Grades a whole class's answer sheets for one assignment in a single request (teachers
+    only; see grading.py). Body: {"assignment_id", "submissions": [{"student_id", "answers"}, ...],
+    "stream": false, "question_sections": {question_id: section}}; answers is either the
+    /api/evaluate-initial-mcqs list or {question_id: selected_answer}. Sections default to
+    the assignment's topic. With "stream": true, or an Accept header of
+    application/x-ndjson, the result is newline-delimited JSON: the class summary first,
+    then the students in chunks.
+    """
+    auth_error = _teacher_auth_error()
+    if auth_error:
+        return auth_error
+    data = request.get_json(silent=True) or {}
+    assignment_id = data.get('assignment_id')
+    submissions = data.get('submissions')
+    app.logger.info("POST /api/grade-batch for assignment: %s (%s submissions)", assignment_id, len(submissions) if isinstance(submissions, list) else 0)
+
+    if not assignment_id or not isinstance(submissions, list) or not submissions:
+        app.logger.warning("Missing assignment_id or submissions for batch grading")
+        return jsonify({"error": "assignment_id and a non-empty submissions list are required"}), 400
+    if len(submissions) > GRADE_BATCH_MAX_SUBMISSIONS:
+        return jsonify({"error": f"At most {GRADE_BATCH_MAX_SUBMISSIONS} submissions per request"}), 413
+
+    # Only class assignments: a student's own quiz is a per-student view and must not be graded in bulk.
+    assignment = quiz_store.get_quiz(assignment_id)
+    if not assignment or assignment["kind"] != "assignment":
+        app.logger.warning("Unknown or expired assignment: %s", assignment_id)
+        return jsonify({"error": "This assignment has expired."}), 404
+
+    questions = quiz_store.student_questions(assignment)
+    overrides = data.get('question_sections') if isinstance(data.get('question_sections'), dict) else {}
+    default_section = assignment.get("topic") or ""
+    sections = [str(overrides.get(q["id"]) or q.get("section_title") or default_section) for q in questions]
+
+    started = time.perf_counter()
+    result = grading.grade_batch(questions, submissions, sections)
+    app.logger.info("Graded %s submissions x %s questions in %.1f ms", len(submissions), len(questions), (time.perf_counter() - started) * 1000)
+    metrics.inc("eduro_batch_graded_submissions_total", len(submissions), kind=assignment["kind"])
+
+    if data.get('stream') or request.accept_mimetypes.best == 'application/x-ndjson':
+        return Response(stream_with_context(grading.iter_ndjson(result)), mimetype='application/x-ndjson')
+    return jsonify(dict(grading.summary(result), assignment_id=assignment_id, results=grading.student_rows(result)))
+
+@app.route('/api/stats', methods=['GET'])
+def api_stats():
+    # Counters are per worker process; scrape each worker (or aggregate) when running under gunicorn.
+    return jsonify({
+        "pid": os.getpid(),
+        "content_cache": content_cache.stats(),
+        "content_pack": content_pack.stats(),
+        "catalog": catalog.stats(),
+        "mcq_pool": mcq_pool.stats(),
+        "prefetch": prefetch.stats(),
+        "question_bank": question_bank.stats(),
+        "llm_gateway": llm_gateway.stats(),
+        "token_budget": token_budget.stats(),
+        "degraded_served": gemini_api.degraded_stats(),
+    })
+
+@app.route('/api/ready', methods=['GET'])
+def api_ready():
+    # Readiness probe: 200 once the LLM backend is usable in this worker, 503 until then.
+    # The breaker state is informational; an open breaker is served in degraded mode.
+    llm = gemini_api.backend_status()
+    llm["circuit_open"] = llm_gateway.circuit_open()
+    ready = llm["state"] == "ready"
+    return jsonify({
+        "ready": ready,
+        "pid": os.getpid(),
+        "llm": llm,
+        "catalog_version": catalog.stats()["version"],
+        "content_pack_loaded": content_pack.stats()["loaded"],
+    }), 200 if ready else 503
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    # Aggregated across all gunicorn workers on this host (see metrics.py).
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 if __name__ == '__main__':
     app.logger.info("Starting Flask app for local development...")
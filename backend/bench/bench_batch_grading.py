@@ -0,0 +1,97 @@
+# backend/bench/bench_batch_grading.py
+#
+# Classroom grading two ways, in-process through Flask's test client (no network):
+#   per request   one POST /api/evaluate-initial-mcqs per student, as the student UI does
+#   batch         one POST /api/grade-batch with every sheet for an assignment with the same
+#                 questions (JSON, then NDJSON streaming)
+# The quiz has --questions synthetic MCQs over 4 sections; each synthetic student
+# answers each question correctly with a per-student probability.
+#
+#   cd backend && python bench/bench_batch_grading.py --students 5000
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SECTIONS = 4
+
+
+def synthetic_quiz(questions):
+    return [{
+        "id": f"q{j + 1}",
+        "question_text": f"Synthetic question {j + 1}?",
+        "options": [f"q{j + 1} option {k}" for k in range(4)],
+        "correct_answer": f"q{j + 1} option 0",
+        "section_title": f"Section {j % SECTIONS + 1}",
+    } for j in range(questions)]
+
+
+def synthetic_submissions(shown, students, seed=5):
+    rng = random.Random(seed)
+    submissions = []
+    for i in range(students):
+        ability = rng.random()
+        answers = [{"question_id": q["id"],
+                    "selected_answer": q["correct_answer"] if rng.random() < ability else rng.choice(q["options"])}
+                   for q in shown]
+        submissions.append({"student_id": f"student-{i}", "answers": answers})
+    return submissions
+
+
+def _timed(function):
+    started = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--questions", type=int, default=20)
+    args = parser.parse_args()
+
+    os.environ.update(LLM_BACKEND="local", LLM_WARMUP="0", MCQ_POOL_ENABLED="0", PREFETCH_ENABLED="0",
+                      EDURO_DATA_DIR=tempfile.mkdtemp(prefix="eduro-grading-"), TEACHER_API_KEY="bench")
+    import logging
+    import app
+    import quiz_store
+    logging.getLogger().setLevel(logging.WARNING)
+    app.app.logger.setLevel(logging.WARNING)
+    client = app.app.test_client()
+
+    quiz_id = quiz_store.create_quiz("mcq", synthetic_quiz(args.questions), subject="Bench", topic="Bench", view_key="class")
+    assignment_id = quiz_store.create_quiz("assignment", synthetic_quiz(args.questions), subject="Bench", topic="Bench",
+                                           view_key="class")
+    shown = quiz_store.student_questions(quiz_store.get_quiz(quiz_id))
+    submissions = synthetic_submissions(shown, args.students)
+
+    def per_request():
+        for submission in submissions:
+            client.post("/api/evaluate-initial-mcqs", json={"quiz_id": quiz_id, "answers": submission["answers"]})
+
+    def batch(stream):
+        response = client.post("/api/grade-batch", headers={"Authorization": "Bearer bench"},
+                               json={"assignment_id": assignment_id, "submissions": submissions, "stream": stream})
+        return response.get_data()
+
+    _, per_request_seconds = _timed(per_request)
+    body, batch_seconds = _timed(lambda: batch(False))
+    streamed, stream_seconds = _timed(lambda: batch(True))
+
+    result = json.loads(body)
+    assert sum(len(json.loads(line).get("results", ())) for line in streamed.splitlines()) == args.students
+    print(f"\n{args.students} students x {args.questions} questions (mean score {result['mean_score']:.2f})")
+    for label, seconds in (("per request", per_request_seconds), ("batch JSON", batch_seconds),
+                           ("batch NDJSON", stream_seconds)):
+        print(f"{label:<14}{seconds:>9.3f} s {seconds / args.students * 1e6:>10.1f} us/student "
+              f"{per_request_seconds / seconds:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
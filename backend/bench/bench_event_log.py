@@ -0,0 +1,85 @@
+# backend/bench/bench_event_log.py
+#
+# Cost of event_log.record() on the grading threads, and whether the writer keeps up:
+# --threads threads record --events outcomes (one per call, as /api/evaluate-problem-answer
+# does) for --students students, against a temporary EVENT_LOG_DIR and MASTERY_DB.
+# --rate paces the threads to that many events per second in total (0 = as fast as they can,
+# which shows where EVENT_MAX_PENDING starts dropping). Reports the per-call CPU and wall
+# time on the recording threads, the sustained rate, how long the writer took to drain
+# what was left, and the compaction time.
+#
+#   cd backend && python bench/bench_event_log.py --events 100000 --rate 10000
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SECTIONS = ("Variables and Expressions", "Solving Linear Equations", "Inequalities")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=200000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--students", type=int, default=5000)
+    parser.add_argument("--rate", type=float, default=10000, help="events per second over all threads; 0 = unpaced")
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="eduro-events-")
+    os.environ["EVENT_LOG_DIR"] = os.path.join(data_dir, "events")
+    os.environ["MASTERY_DB"] = os.path.join(data_dir, "mastery.sqlite3")
+    sys.path.insert(0, BACKEND_DIR)
+    import log_setup
+    log_setup.configure(default_format="text")
+    import event_log
+    event_log.start()
+
+    per_thread = args.events // args.threads
+    thread_cpu, wall = [0.0] * args.threads, [0.0] * args.threads
+    interval = args.threads / args.rate if args.rate else 0  # seconds between one thread's calls
+
+    def worker(index):
+        cpu_started, started = time.thread_time(), time.perf_counter()
+        for i in range(per_thread):
+            if interval:
+                lag = started + i * interval - time.perf_counter()
+                if lag > 0:
+                    time.sleep(lag)
+            call_started = time.perf_counter()
+            student = f"learner-{(index * per_thread + i) % args.students}"
+            event_log.record("problem", student, "Mathematics", "Algebra Basics",
+                             [(SECTIONS[i % len(SECTIONS)], f"q-{i}", i % 3 != 0)], quiz_id=f"p-{i}")
+            wall[index] += time.perf_counter() - call_started
+        thread_cpu[index] = time.thread_time() - cpu_started
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    recorded_in = time.perf_counter() - started
+    drain_started = time.perf_counter()
+    event_log.flush()
+    drained_in = time.perf_counter() - drain_started
+    event_log.close_segment()
+    compact_started = time.perf_counter()
+    compacted = event_log.compact()
+    compacted_in = time.perf_counter() - compact_started
+
+    total = per_thread * args.threads
+    stats = event_log.stats()
+    print(f"\n{total} outcomes, {args.threads} threads, {args.students} students")
+    print(f"record() per call:   {sum(thread_cpu) / total * 1e6:.1f} us CPU, {sum(wall) / total * 1e6:.1f} us wall")
+    print(f"sustained rate:      {total / recorded_in:,.0f} events/s (dropped {stats['dropped']})")
+    print(f"final flush:         {drained_in * 1000:.0f} ms (last batch write {stats['last_flush_ms']} ms)")
+    print(f"compaction:          {compacted} events in {compacted_in * 1000:.0f} ms")
+    print(f"data left in {data_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# backend/bench/bench_lesson_bundle.py
+#
+# Compares the per-step lesson path (explanation, example and problem requested
+# separately for every section) against one /api/lesson-bundle style call.
+# Reports wall time, Gemini calls and prompt/output tokens per topic.
+# Needs GOOGLE_API_KEY (LLM_BACKEND=local gives an offline dry run); caching is
+# disabled so every run hits the backend.
+#
+#   cd backend && python bench/bench_lesson_bundle.py --topic "Quadratic Equations"
+
+import argparse
+import os
+import sys
+import time
+
+# Measure real generations, not cache hits.
+os.environ["CONTENT_CACHE_DB"] = ""
+os.environ["CONTENT_CACHE_MAX_ENTRIES"] = "0"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import catalog
+import gemini_interaction
+import llm_gateway
+
+
+def _measure(run):
+    before = llm_gateway.stats()
+    started = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - started
+    after = llm_gateway.stats()
+    return {
+        "seconds": elapsed,
+        "calls": after["upstream_calls"] - before["upstream_calls"],
+        "prompt_tokens": after["prompt_tokens"] - before["prompt_tokens"],
+        "output_tokens": after["output_tokens"] - before["output_tokens"],
+    }
+
+
+def per_step(topic, sections):
+    for section_title in sections:
+        gemini_interaction.generate_explanation(topic, section_title)
+        gemini_interaction.generate_solved_example(topic, section_title)
+        gemini_interaction.generate_problem(topic, section_title)
+
+
+def bundled(topic, sections):
+    gemini_interaction.generate_lesson_bundle(topic, sections)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--subject", default="Mathematics")
+    parser.add_argument("--topic", default="Quadratic Equations")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    gemini_interaction.configure_backend()
+    sections = catalog.get_sections(args.subject, args.topic)
+    if not sections:
+        sys.exit(f"No sections for {args.subject} / {args.topic}")
+    if not gemini_interaction.model:
+        sys.exit("LLM backend not initialized; set GOOGLE_API_KEY (or LLM_BACKEND=local for an offline dry run).")
+
+    print(f"{args.topic}: {len(sections)} sections, {args.runs} run(s) per mode")
+    print(f"{'mode':<10}{'wall s':>10}{'calls':>8}{'prompt tok':>12}{'output tok':>12}")
+    for name, run in (("per-step", per_step), ("bundle", bundled)):
+        results = [_measure(lambda: run(args.topic, sections)) for _ in range(args.runs)]
+        avg = {key: sum(r[key] for r in results) / len(results) for key in results[0]}
+        print(f"{name:<10}{avg['seconds']:>10.2f}{avg['calls']:>8.1f}{avg['prompt_tokens']:>12.0f}{avg['output_tokens']:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# backend/bench/bench_logging.py
+#
+# Logging cost per request, before and after log_setup, with the log calls of a
+# /api/learning-content request (4 INFO records and the DEBUG dump of the raw model
+# output, disabled at INFO) made by --threads threads at once:
+#   before   f-string messages, logging.basicConfig (formatted and written on the request thread)
+#   text     lazy %-style arguments, log_setup with LOG_FORMAT=text
+#   json     lazy %-style arguments, log_setup JSON lines
+# Each mode runs in its own process with stderr sent to a file. Reports the request
+# threads' CPU and wall time per request, and the whole process's CPU (including the
+# writer thread) per request.
+#
+#   cd backend && python bench/bench_logging.py --requests 20000 --threads 8
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RAW_RESPONSE = "The solution isolates x by subtracting 3 from both sides, then dividing by 2. " * 80  # ~6 KB
+
+
+def one_request(mode, logging, topic, section, request_number):
+    if mode == "before":
+        logging.info(f"POST /api/learning-content for {topic} - {section}, type: explanation")
+        logging.info(f"[GEMINI API] Generating explanation for: {topic} - {section}")
+        logging.debug(f"[GEMINI RAW RESPONSE for explanation]:\n{RAW_RESPONSE}\n")
+        logging.info(f"Successfully generated explanation.")
+        logging.info(f"Successfully generated learning content for explanation (request {request_number})")
+    else:
+        logging.info("POST /api/learning-content for %s - %s, type: %s", topic, section, "explanation")
+        logging.info("[GEMINI API] Generating %s for: %s - %s", "explanation", topic, section)
+        logging.debug("[GEMINI RAW RESPONSE for %s]:\n%s\n", "explanation", RAW_RESPONSE)
+        logging.info("Successfully generated %s.", "explanation")
+        logging.info("Successfully generated learning content for %s (request %s)", "explanation", request_number)
+
+
+def run_mode(mode, requests, threads):
+    """Runs in the child process: configures logging for mode and logs requests from threads."""
+    import logging
+    if mode == "before":
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(module)s - %(message)s')
+    else:
+        os.environ["LOG_FORMAT"] = mode
+        import log_setup
+        log_setup.configure()
+
+    per_thread = requests // threads
+    thread_cpu, wall = [0.0] * threads, [0.0] * threads
+
+    def worker(index):
+        cpu_started, started = time.thread_time(), time.perf_counter()
+        for i in range(per_thread):
+            one_request(mode, logging, "Algebra Basics", "Solving Linear Equations", i)
+        thread_cpu[index] = time.thread_time() - cpu_started
+        wall[index] = time.perf_counter() - started
+
+    process_started = time.process_time()
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    if mode != "before":
+        log_setup._stop()  # include the writer's remaining work in the process CPU
+    process_cpu = time.process_time() - process_started
+    total = per_thread * threads
+    print(f"{mode} {sum(thread_cpu) / total * 1e6:.1f} {sum(wall) / total * 1e6:.1f} {process_cpu / total * 1e6:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--mode", help=argparse.SUPPRESS)  # set for the child processes
+    args = parser.parse_args()
+
+    if args.mode:
+        sys.path.insert(0, BACKEND_DIR)
+        run_mode(args.mode, args.requests, args.threads)
+        return
+
+    print(f"\n{args.requests} simulated requests, {args.threads} threads (microseconds per request)")
+    print(f"{'mode':<8}{'request CPU':>13}{'request wall':>14}{'process CPU':>13}")
+    for mode in ("before", "text", "json"):
+        with tempfile.TemporaryFile("w") as log:
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), "--mode", mode,
+                                     "--requests", str(args.requests), "--threads", str(args.threads)],
+                                    stdout=subprocess.PIPE, stderr=log, text=True, check=True).stdout
+        _, cpu, wall, process = output.split()
+        print(f"{mode:<8}{float(cpu):>13.1f}{float(wall):>14.1f}{float(process):>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
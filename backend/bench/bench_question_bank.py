@@ -0,0 +1,80 @@
+# backend/bench/bench_question_bank.py
+#
+# Question bank at scale: bulk-imports --questions synthetic MCQs spread over
+# --topics topics x 4 sections into a scratch database, then times fetch_unseen()
+# for random (topic, section) slots and sessions (each session keeps drawing, so
+# its seen set grows as it would for a real student).
+#
+#   cd backend && python bench/bench_question_bank.py --questions 100000
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SECTIONS = 4
+
+
+def synthetic_questions(count, topics, seed=7):
+    rng = random.Random(seed)
+    words = [f"w{i}" for i in range(5000)]
+    for i in range(count):
+        text = " ".join(rng.choices(words, k=14)) + f" (#{i})?"
+        options = [" ".join(rng.choices(words, k=3)) for _ in range(4)]
+        yield {
+            "topic": f"topic-{i % topics}",
+            "section": f"section-{(i // topics) % SECTIONS}",
+            "difficulty": "standard",
+            "question": {"question_text": text, "options": options, "correct_answer": options[0]},
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--questions", type=int, default=20000)
+    parser.add_argument("--topics", type=int, default=200)
+    parser.add_argument("--fetches", type=int, default=2000)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--per-fetch", type=int, default=3)
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="eduro-bank-")
+    os.environ["QUESTION_BANK_DB"] = os.path.join(scratch, "question_bank.sqlite3")
+    import question_bank
+
+    source = os.path.join(scratch, "questions.jsonl")
+    with open(source, "w") as f:
+        for record in synthetic_questions(args.questions, args.topics):
+            f.write(json.dumps(record) + "\n")
+    started = time.perf_counter()
+    added, skipped = question_bank.import_jsonl(source)
+    import_seconds = time.perf_counter() - started
+    size_mb = os.path.getsize(os.environ["QUESTION_BANK_DB"]) / 1e6
+
+    rng = random.Random(11)
+    latencies = []
+    misses = 0
+    for _ in range(args.fetches):
+        topic = f"topic-{rng.randrange(args.topics)}"
+        section = f"section-{rng.randrange(SECTIONS)}"
+        session = f"session-{rng.randrange(args.sessions)}"
+        started = time.perf_counter()
+        questions = question_bank.fetch_unseen(topic, args.per_fetch, session, section_title=section)
+        latencies.append((time.perf_counter() - started) * 1000)
+        misses += questions is None
+    latencies.sort()
+
+    print(f"\nImported {added} questions ({skipped} rejected as duplicates) in {import_seconds:.1f}s "
+          f"({added / import_seconds:.0f}/s), database {size_mb:.0f} MB")
+    print(f"fetch_unseen x{args.fetches} ({args.per_fetch} questions, {args.sessions} sessions, {misses} misses): "
+          f"p50 {statistics.median(latencies):.3f} ms, p99 {latencies[int(len(latencies) * 0.99) - 1]:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# backend/bench/bench_routing.py
+#
+# Model routing against the previous single-model setup, per content type:
+#   before   standard model, the full prompt templates as written, no output cap
+#   routed   the ROUTES tier, compact prompt variant, per-item output cap
+# For each content type it makes --runs calls of each kind directly through the
+# gateway (no cache, pack or top-up round), reporting the model, prompt and
+# output tokens, latency, estimated cost and the validation pass rate (valid
+# MCQs / MCQs asked for; non-empty text for explanations and examples).
+# Uses LLM_BACKEND (default: the local stand-in, whose latency and validity are
+# simulated; only the token counts are meaningful there). Run with
+# LLM_BACKEND=gemini and GOOGLE_API_KEY set to compare the real models.
+#
+#   cd backend && LLM_BACKEND=gemini python bench/bench_routing.py --runs 20
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CASES = [("mcqs", 5), ("problem", 1), ("explanation", 1), ("solved example", 1)]
+
+
+def build_call(gi, content_type, topic, section, count, routed):
+    """(model name, prompt, generation config) for one call, routed or as before routing existed."""
+    variant = gi._prompt_variant(content_type) if routed else "full"
+    if content_type == "mcqs":
+        prompt, base = gi.MCQ_PROMPT_TEMPLATES[variant].format(num_questions=count, topic=topic), gi.mcq_generation_config
+    elif content_type == "problem":
+        prompt, base = gi.PROBLEM_PROMPT_TEMPLATES[variant].format(topic=topic, section_title=section), gi.problem_generation_config
+    else:
+        template = {name: template for template, name in gi.TEXT_CONTENT_TYPES.values()}[content_type]
+        prompt, base = template.format(topic=topic, section_title=section), gi.text_generation_config
+    if not routed:
+        return gi.MODEL_NAME, prompt, base
+    model_name, config = gi._route(content_type, base, count)
+    return model_name, gi.compact_prompt(prompt), config
+
+
+def passed(gi, content_type, count, text):
+    if content_type in ("mcqs", "problem"):
+        valid = [q for q in gi._parse_mcq_list(text, content_type) if not gi._mcq_rejection_reason(q)]
+        return min(len(valid), count) / count
+    return 1.0 if text.strip() else 0.0
+
+
+def run(gi, token_budget, content_type, count, routed, runs, topic, section):
+    model_name, prompt, config = build_call(gi, content_type, topic, section, count, routed)
+    latencies, prompt_tokens, output_tokens, pass_rates = [], [], [], []
+    for i in range(runs):
+        # A distinct suffix per run so identical prompts are not coalesced or served from a cache.
+        response_started = time.perf_counter()
+        try:
+            response = gi._send(content_type, model_name, f"{prompt}\n(Request {i + 1}.)", config)
+            text = response.text
+        except Exception as e:
+            print(f"  {content_type} ({'routed' if routed else 'before'}) call failed: {type(e).__name__}: {e}")
+            pass_rates.append(0.0)
+            continue
+        latencies.append(time.perf_counter() - response_started)
+        usage = getattr(response, "usage_metadata", None)
+        prompt_tokens.append(getattr(usage, "prompt_token_count", 0) or 0)
+        output_tokens.append(getattr(usage, "candidates_token_count", 0) or 0)
+        pass_rates.append(passed(gi, content_type, count, text))
+    input_price, output_price = token_budget.MODEL_PRICES.get(model_name, (0.0, 0.0))
+    mean = lambda values: statistics.mean(values) if values else 0.0
+    return {
+        "model": model_name,
+        "prompt_estimate": len(prompt) // 4,
+        "cap": config.get("max_output_tokens") or "-",
+        "prompt": mean(prompt_tokens),
+        "output": mean(output_tokens),
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else 0.0,
+        "usd_per_1k": (mean(prompt_tokens) * input_price + mean(output_tokens) * output_price) / 1e6 * 1000,
+        "pass": mean(pass_rates),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--topic", default="Linear Equations")
+    parser.add_argument("--section", default="Solving Linear Equations in One Variable")
+    args = parser.parse_args()
+
+    os.environ.setdefault("LLM_BACKEND", "local")
+    os.environ.setdefault("LOCAL_LLM_LATENCY_MEDIAN", "0.05")
+    os.environ.update(EDURO_DATA_DIR=tempfile.mkdtemp(prefix="eduro-routing-"), LLM_HEDGES_PER_MINUTE="0")
+    import logging
+    import gemini_interaction as gi
+    import token_budget
+    logging.basicConfig(level=logging.WARNING)
+    if gi.configure_backend() is None:
+        sys.exit("No LLM backend could be configured")
+
+    print(f"\nBackend {gi.model.name}, {args.runs} calls per row (means; p50 latency)")
+    print(f"{'content type':<16}{'mode':<8}{'model':<24}{'prompt~':>8}{'cap':>6}{'prompt':>8}{'output':>8}"
+          f"{'p50 ms':>8}{'$/1k':>8}{'pass':>7}")
+    for content_type, count in CASES:
+        for routed in (False, True):
+            r = run(gi, token_budget, content_type, count, routed, args.runs, args.topic, args.section)
+            print(f"{content_type:<16}{'routed' if routed else 'before':<8}{r['model']:<24}{r['prompt_estimate']:>8}"
+                  f"{r['cap']:>6}{r['prompt']:>8.0f}{r['output']:>8.0f}{r['p50_ms']:>8.0f}{r['usd_per_1k']:>8.3f}{r['pass']:>7.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# backend/bench/bench_structured_output.py
+#
+# Measures how many paid MCQ generations are thrown away, before and after
+# schema-enforced output plus the tolerant parser:
+#   legacy      free-form JSON prompt, _clean_json_from_text + strict json.loads
+#   structured  response_mime_type/response_schema, parsed with mcq_parser fallback
+# A generation counts as discarded when it yields no valid MCQ, the case where the
+# student has to retry. Every generation in the two runs sees the same prompt.
+# Needs GOOGLE_API_KEY, or LLM_BACKEND=local with LOCAL_LLM_MALFORMED_RATE>0 for an
+# offline run.
+#
+#   cd backend && LLM_BACKEND=local LOCAL_LLM_MALFORMED_RATE=0.2 LOCAL_LLM_LATENCY_MEDIAN=0 \
+#       python bench/bench_structured_output.py --runs 200
+
+import argparse
+import json
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gemini_interaction
+
+
+def legacy_parse(text):
+    """The pre-structured-output path: any syntax defect discards the whole response."""
+    try:
+        data = json.loads(gemini_interaction._clean_json_from_text(text))
+    except ValueError:
+        return []
+    return data if isinstance(data, list) else []
+
+
+def run(mode, prompt, generation_config, runs, num_questions):
+    totals = {"generations": 0, "discarded": 0, "short": 0, "valid_questions": 0, "output_tokens": 0}
+    for _ in range(runs):
+        try:
+            response = gemini_interaction.model.generate_content(prompt, generation_config=generation_config)
+            text = response.text
+        except Exception as e:
+            logging.error("%s: generation failed: %s", mode, e)
+            continue
+        usage = getattr(response, "usage_metadata", None)
+        totals["output_tokens"] += getattr(usage, "candidates_token_count", 0) or 0
+        candidates = legacy_parse(text) if mode == "legacy" else gemini_interaction._parse_mcq_list(text, "mcqs")
+        valid = [q for q in candidates if not gemini_interaction._mcq_rejection_reason(q)]
+        totals["generations"] += 1
+        totals["valid_questions"] += len(valid)
+        if not valid:
+            totals["discarded"] += 1
+        elif len(valid) < num_questions:
+            totals["short"] += 1
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--topic", default="Quadratic Equations")
+    parser.add_argument("--questions", type=int, default=5)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.ERROR)
+
+    if not gemini_interaction.configure_backend():
+        sys.exit("No LLM backend available (set GOOGLE_API_KEY, or LLM_BACKEND=local).")
+
+    prompt = gemini_interaction.MCQ_PROMPT_TEMPLATE.format(num_questions=args.questions, topic=args.topic)
+    free_form_config = {k: v for k, v in gemini_interaction.mcq_generation_config.items()
+                        if k not in ("response_mime_type", "response_schema")}
+    structured_config = dict(free_form_config, response_mime_type="application/json",
+                             response_schema=gemini_interaction.MCQ_RESPONSE_SCHEMA)
+
+    results = {
+        "legacy": run("legacy", prompt, free_form_config, args.runs, args.questions),
+        "structured": run("structured", prompt, structured_config, args.runs, args.questions),
+    }
+
+    print(f"\n{args.runs} generations of {args.questions} MCQs per mode ({gemini_interaction.model.model_name})")
+    print(f"{'mode':<12}{'discarded':>11}{'rate':>8}{'short':>8}{'valid/gen':>11}{'out tok/valid q':>17}")
+    for mode, t in results.items():
+        generations = t["generations"] or 1
+        per_question = t["output_tokens"] / t["valid_questions"] if t["valid_questions"] else float("nan")
+        print(f"{mode:<12}{t['discarded']:>11}{t['discarded'] / generations:>8.1%}{t['short']:>8}"
+              f"{t['valid_questions'] / generations:>11.2f}{per_question:>17.1f}")
+    saved = results["legacy"]["discarded"] - results["structured"]["discarded"]
+    print(f"\nRetries saved: {saved} per {args.runs} generations "
+          f"(each discarded generation is a full retry for the student).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# backend/bench/bench_topup.py
+#
+# Tokens spent per delivered valid MCQ, with and without top-up generation:
+#   regenerate  no top-up; when a request comes back short, the whole set is
+#               requested again (what the client did before), up to --attempts
+#   topup       generate_mcqs keeps the valid questions and asks only for the missing ones
+# Needs GOOGLE_API_KEY, or LLM_BACKEND=local with LOCAL_LLM_MALFORMED_RATE>0 for an
+# offline run.
+#
+#   cd backend && LLM_BACKEND=local LOCAL_LLM_MALFORMED_RATE=0.3 LOCAL_LLM_LATENCY_MEDIAN=0 \
+#       python bench/bench_topup.py --runs 200
+
+import argparse
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gemini_interaction
+import llm_gateway
+
+
+def _tokens():
+    stats = llm_gateway.stats()
+    return stats["prompt_tokens"] + stats["output_tokens"], stats["upstream_calls"]
+
+
+def regenerate(topic, num_questions, attempts):
+    questions = []
+    for _ in range(attempts):
+        questions = gemini_interaction.generate_mcqs(topic, num_questions, allow_degraded=False)
+        if len(questions) >= num_questions:
+            break
+    return questions
+
+
+def run(strategy, topic, num_questions, runs, attempts):
+    gemini_interaction.TOPUP_MAX_ROUNDS = 0 if strategy == "regenerate" else TOPUP_ROUNDS
+    tokens_before, calls_before = _tokens()
+    delivered = complete = 0
+    for _ in range(runs):
+        if strategy == "regenerate":
+            questions = regenerate(topic, num_questions, attempts)
+        else:
+            questions = gemini_interaction.generate_mcqs(topic, num_questions, allow_degraded=False)
+        delivered += len(questions)
+        complete += len(questions) >= num_questions
+    tokens_after, calls_after = _tokens()
+    return {"tokens": tokens_after - tokens_before, "calls": calls_after - calls_before,
+            "delivered": delivered, "complete": complete}
+
+
+TOPUP_ROUNDS = gemini_interaction.TOPUP_MAX_ROUNDS
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--topic", default="Quadratic Equations")
+    parser.add_argument("--questions", type=int, default=5)
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--attempts", type=int, default=3, help="Whole-set attempts for the regenerate strategy")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.ERROR)
+
+    if not gemini_interaction.configure_backend():
+        sys.exit("No LLM backend available (set GOOGLE_API_KEY, or LLM_BACKEND=local).")
+
+    print(f"\n{args.runs} requests for {args.questions} MCQs per strategy ({gemini_interaction.model.model_name})")
+    print(f"{'strategy':<12}{'complete':>10}{'delivered':>11}{'calls':>8}{'tokens':>10}{'tokens/valid q':>16}")
+    for strategy in ("regenerate", "topup"):
+        r = run(strategy, args.topic, args.questions, args.runs, args.attempts)
+        per_question = r["tokens"] / r["delivered"] if r["delivered"] else float("nan")
+        print(f"{strategy:<12}{r['complete']:>10}{r['delivered']:>11}{r['calls']:>8}{r['tokens']:>10}{per_question:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+# backend/bench/load_test.py
+#
+# End-to-end load benchmark. Starts the app under gunicorn with the offline
+# LLM stand-in (LLM_BACKEND=local), then runs simulated students through the
+# whole flow (subjects -> topics -> initial quiz -> grading -> streamed
+# explanation -> example -> problem -> grading -> lesson bundle -> advanced
+# quiz) at each concurrency level. Reports throughput and p50/p95/p99 latency
+# per endpoint, and the server's CPU time per request. Runs fully offline; compare worker/thread configurations with
+# --workers/--threads/--worker-class.
+#
+#   cd backend
+#   python bench/load_test.py --workers 2 --threads 8 --concurrency 1,8,32 --duration 20
+#   LOCAL_LLM_LATENCY_MEDIAN=2 python bench/load_test.py --no-cache --json results.json
+#   python bench/load_test.py --url http://127.0.0.1:5001 --concurrency 16   # existing server
+
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import quote, urlsplit
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class Recorder:
+    """Thread-safe per-endpoint latency and error collection."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, label, seconds, ok):
+        with self._lock:
+            self.latencies[label].append(seconds)
+            if not ok:
+                self.errors[label] += 1
+
+    def summary(self, elapsed):
+        rows = {}
+        for label, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            rows[label] = {
+                "requests": len(values),
+                "errors": self.errors.get(label, 0),
+                "rps": len(values) / elapsed if elapsed else 0.0,
+                "p50_ms": percentile(values, 50) * 1000,
+                "p95_ms": percentile(values, 95) * 1000,
+                "p99_ms": percentile(values, 99) * 1000,
+            }
+        return rows
+
+
+class Client:
+    """One keep-alive HTTP connection per simulated student."""
+
+    def __init__(self, base_url, recorder, timeout=120):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.recorder = recorder
+        self.timeout = timeout
+        self.conn = None
+
+    def _connection(self):
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return self.conn
+
+    def request(self, label, method, path, payload=None, stream=False):
+        body = json.dumps(payload) if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body else {}
+        started = time.perf_counter()
+        try:
+            conn = self._connection()
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            if stream:
+                # Time to the first content chunk is what the student perceives.
+                first = None
+                while True:
+                    line = response.readline()
+                    if not line:
+                        break
+                    if first is None and line.startswith(b"event: chunk"):
+                        first = time.perf_counter() - started
+                if first is not None:
+                    self.recorder.record(label + " [first chunk]", first, True)
+                data = None
+            else:
+                raw = response.read()
+                data = json.loads(raw) if raw and response.getheader("Content-Type", "").startswith("application/json") else None
+            ok = 200 <= response.status < 300
+        except (OSError, http.client.HTTPException, ValueError):
+            self.conn = None
+            ok, data = False, None
+        self.recorder.record(label, time.perf_counter() - started, ok)
+        if self.conn is not None and not ok:
+            # Drop the connection after an error so the next request starts clean.
+            self.conn.close()
+            self.conn = None
+        return data if ok else None
+
+
+def student_flow(client, rng, bundle_probability):
+    """One pass of a simulated student through every /api endpoint."""
+    client.request("GET /api/stats", "GET", "/api/stats")
+    subjects = client.request("GET /api/subjects", "GET", "/api/subjects") or []
+    if not subjects:
+        return
+    subject = rng.choice(subjects)
+    topics = client.request("GET /api/topics", "GET", f"/api/topics?subject={quote(subject)}") or []
+    if not topics:
+        return
+    topic = rng.choice(topics)
+    session_id = f"bench-{rng.getrandbits(48):x}"
+    base = {"subject": subject, "topic": topic, "session_id": session_id}
+
+    quiz = client.request("POST /api/initial-mcqs", "POST", "/api/initial-mcqs", base)
+    sections = []
+    if quiz and quiz.get("questions"):
+        answers = [{"question_id": q["id"], "selected_answer": rng.choice(q["options"])} for q in quiz["questions"]]
+        result = client.request("POST /api/evaluate-initial-mcqs", "POST", "/api/evaluate-initial-mcqs",
+                                dict(base, quiz_id=quiz.get("quiz_id"), answers=answers))
+        sections = (result or {}).get("sections") or []
+    if not sections:
+        return
+
+    section = rng.choice(sections)
+    step = dict(base, section_title=section)
+    client.request("POST /api/learning-content/stream", "POST", "/api/learning-content/stream",
+                   dict(step, content_type="explanation"), stream=True)
+    client.request("POST /api/learning-content (example)", "POST", "/api/learning-content", dict(step, content_type="example"))
+    problem = client.request("POST /api/learning-content (problem)", "POST", "/api/learning-content", dict(step, content_type="problem"))
+    content = (problem or {}).get("content") or {}
+    if content.get("options"):
+        client.request("POST /api/evaluate-problem-answer", "POST", "/api/evaluate-problem-answer",
+                       {"problem_id": content.get("problem_id"), "user_answer": rng.choice(content["options"])})
+
+    if rng.random() < bundle_probability:
+        client.request("POST /api/lesson-bundle", "POST", "/api/lesson-bundle", base)
+    client.request("POST /api/advanced-mcqs", "POST", "/api/advanced-mcqs", base)
+
+
+def run_level(base_url, concurrency, duration, bundle_probability, seed):
+    recorder = Recorder()
+    deadline = time.monotonic() + duration
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        client = Client(base_url, recorder)
+        while time.monotonic() < deadline:
+            student_flow(client, rng, bundle_probability)
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    started = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - started
+    return elapsed, recorder.summary(elapsed)
+
+
+def server_cpu_seconds(server):
+    """User+system CPU seconds used so far by the gunicorn master and its workers (Linux only; None elsewhere)."""
+    if server is None or not os.path.isdir("/proc"):
+        return None
+    ticks = os.sysconf("SC_CLK_TCK")
+    total = 0
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        # fields[1] is the parent pid; fields[11] and fields[12] are utime and stime.
+        if int(entry) == server.pid or int(fields[1]) == server.pid:
+            total += int(fields[11]) + int(fields[12])
+    return total / ticks
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(args):
+    """Launches gunicorn with the local LLM stand-in in a scratch data directory."""
+    if shutil.which("gunicorn") is None:
+        sys.exit("gunicorn is not installed (pip install -r requirements.txt)")
+    port = _free_port()
+    data_dir = tempfile.mkdtemp(prefix="eduro-bench-")
+    env = dict(os.environ, LLM_BACKEND="local", EDURO_DATA_DIR=data_dir)
+    env.setdefault("MCQ_POOL_ENABLED", "1" if args.pool else "0")
+    if args.no_cache:
+        env["CONTENT_CACHE_DB"] = ""
+        env["CONTENT_CACHE_MAX_ENTRIES"] = "0"
+    command = [
+        "gunicorn", "--chdir", BACKEND_DIR, "--bind", f"127.0.0.1:{port}",
+        "--workers", str(args.workers), "--threads", str(args.threads),
+        "--worker-class", args.worker_class, "--timeout", "300", "--log-level", "warning",
+        "app:app",
+    ]
+    log = open(os.path.join(data_dir, "gunicorn.log"), "w")
+    server = subprocess.Popen(command, env=env, stdout=log, stderr=subprocess.STDOUT)
+    base_url = f"http://127.0.0.1:{port}"
+
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            sys.exit(f"gunicorn exited early; see {log.name}")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/api/ready")
+            if conn.getresponse().status == 200:
+                return server, base_url, data_dir
+        except OSError:
+            pass
+        time.sleep(0.2)
+    server.terminate()
+    sys.exit("gunicorn did not become ready within 60s")
+
+
+def _request_count(rows):
+    return sum(row["requests"] for label, row in rows.items() if not label.endswith("[first chunk]"))
+
+
+def print_level(concurrency, elapsed, rows, cpu_seconds=None):
+    total = _request_count(rows)
+    errors = sum(row["errors"] for row in rows.values())
+    cpu = f", server CPU {cpu_seconds / max(total, 1) * 1000:.2f} ms/request" if cpu_seconds is not None else ""
+    print(f"\n=== concurrency {concurrency}: {total} requests in {elapsed:.1f}s "
+          f"({total / elapsed:.1f} req/s, {errors} errors{cpu}) ===")
+    print(f"{'endpoint':<52}{'reqs':>7}{'err':>6}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for label, row in rows.items():
+        print(f"{label:<52}{row['requests']:>7}{row['errors']:>6}{row['rps']:>8.1f}"
+              f"{row['p50_ms']:>9.0f}{row['p95_ms']:>9.0f}{row['p99_ms']:>9.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end load benchmark for the tutor API.")
+    parser.add_argument("--url", help="Benchmark an already running server instead of starting gunicorn")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--worker-class", default="gthread")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds per concurrency level")
+    parser.add_argument("--bundle-probability", type=float, default=0.2,
+                        help="Fraction of student flows that also request /api/lesson-bundle")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the content cache so every step generates")
+    parser.add_argument("--pool", action="store_true", help="Enable the MCQ pools (off by default for a cold-path benchmark)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    server = data_dir = None
+    if args.url:
+        base_url = args.url.rstrip("/")
+    else:
+        server, base_url, data_dir = start_server(args)
+        print(f"gunicorn: {args.workers} worker(s) x {args.threads} thread(s), class {args.worker_class}, at {base_url}")
+
+    results = {"config": vars(args), "levels": []}
+    try:
+        for concurrency in [int(c) for c in args.concurrency.split(",") if c.strip()]:
+            cpu_before = server_cpu_seconds(server)
+            elapsed, rows = run_level(base_url, concurrency, args.duration, args.bundle_probability, args.seed)
+            cpu_seconds = server_cpu_seconds(server) - cpu_before if cpu_before is not None else None
+            print_level(concurrency, elapsed, rows, cpu_seconds)
+            results["levels"].append({"concurrency": concurrency, "elapsed": elapsed, "server_cpu_seconds": cpu_seconds,
+                                      "endpoints": rows})
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
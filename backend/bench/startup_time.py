@@ -0,0 +1,162 @@
+# backend/bench/startup_time.py
+#
+# Worker startup cost, for the current tree and optionally an older revision:
+#   import app        seconds to import the app module in a fresh interpreter
+#   first request     seconds from launching gunicorn to the first 200 from /api/subjects
+#   ready             seconds from launching gunicorn to the first 200 from /api/ready
+#   respawn req/rdy   the same two, after SIGKILLing the worker, for its replacement
+# Uses the Gemini backend with a placeholder key; no API call is made. The older
+# revision is checked out into a temporary git worktree.
+#
+#   cd backend && python bench/startup_time.py --runs 5 --baseline HEAD~1
+
+import argparse
+import http.client
+import json
+import os
+import shutil
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_DIR = os.path.dirname(BACKEND_DIR)
+
+COLUMNS = ["import", "first", "ready", "respawn_first", "respawn_ready"]
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import app; print(time.perf_counter() - t)"
+
+
+def _env(data_dir, extra=None):
+    env = dict(os.environ, LLM_BACKEND="gemini", GOOGLE_API_KEY=os.environ.get("GOOGLE_API_KEY", "placeholder"),
+               EDURO_DATA_DIR=data_dir, MCQ_POOL_ENABLED="0", PREFETCH_ENABLED="0", PYTHONWARNINGS="ignore")
+    env.update(extra or {})
+    return env
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _get(port, path):
+    """(status, parsed JSON body or None); status is None if the server did not answer."""
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+        conn.request("GET", path)
+        response = conn.getresponse()
+        body = response.read()
+    except OSError:
+        return None, None
+    try:
+        return response.status, json.loads(body)
+    except ValueError:
+        return response.status, None
+
+
+def _wait_until_serving(port, started, deadline, old_pid=None):
+    """
+    Seconds from started to the first /api/subjects 200 (from a worker other than old_pid), and
+    to the first /api/ready 200 (None on a revision without the endpoint, or on timeout).
+    """
+    first = None
+    while time.perf_counter() < deadline:
+        if first is None:
+            status, body = _get(port, "/api/stats")
+            if status == 200 and body.get("pid") != old_pid and _get(port, "/api/subjects")[0] == 200:
+                first = time.perf_counter() - started
+        if first is not None:
+            status, _ = _get(port, "/api/ready")
+            if status == 200:
+                return first, time.perf_counter() - started
+            if status == 404:
+                return first, None
+        time.sleep(0.01)
+    return first, None
+
+
+def measure_import(backend_dir, env):
+    output = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], cwd=backend_dir, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def measure_boot(backend_dir, env, timeout=60):
+    """
+    Launches gunicorn with one worker and times the cold start, then kills the worker and
+    times its replacement (what every autoscale event or worker restart pays).
+    Returns {"first", "ready", "respawn_first", "respawn_ready"} in seconds.
+    """
+    port = _free_port()
+    command = ["gunicorn", "--chdir", backend_dir, "--bind", f"127.0.0.1:{port}", "--workers", "1",
+               "--threads", "4", "--worker-class", "gthread", "--log-level", "warning", "app:app"]
+    started = time.perf_counter()
+    server = subprocess.Popen(command, cwd=backend_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    result = {}
+    try:
+        result["first"], result["ready"] = _wait_until_serving(port, started, started + timeout)
+        status, body = _get(port, "/api/stats")
+        if status == 200:
+            os.kill(body["pid"], signal.SIGKILL)
+            killed = time.perf_counter()
+            result["respawn_first"], result["respawn_ready"] = _wait_until_serving(port, killed, killed + timeout, body["pid"])
+    finally:
+        server.terminate()
+        server.wait()
+    return result
+
+
+def measure(label, backend_dir, runs, extra_env=None):
+    data_dir = tempfile.mkdtemp(prefix="eduro-startup-")
+    try:
+        env = _env(data_dir, extra_env)
+        imports = [measure_import(backend_dir, env) for _ in range(runs)]
+        boots = [measure_boot(backend_dir, env) for _ in range(runs)]
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+    result = {"label": label, "import": statistics.median(imports)}
+    for key in COLUMNS[1:]:
+        values = [boot[key] for boot in boots if boot.get(key) is not None]
+        result[key] = statistics.median(values) if values else None
+    return result
+
+
+def _fmt(seconds):
+    return f"{seconds:>12.2f}" if seconds is not None else f"{'n/a':>12}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure app import time and time to the first served request.")
+    parser.add_argument("--runs", type=int, default=3, help="Repetitions per measurement (median is reported)")
+    parser.add_argument("--baseline", help="Also measure this git revision (e.g. HEAD~1)")
+    args = parser.parse_args()
+    if shutil.which("gunicorn") is None:
+        sys.exit("gunicorn is not installed (pip install -r requirements.txt)")
+
+    results = []
+    worktree = None
+    try:
+        if args.baseline:
+            worktree = tempfile.mkdtemp(prefix="eduro-baseline-")
+            subprocess.run(["git", "-C", REPO_DIR, "worktree", "add", "--detach", worktree, args.baseline],
+                           check=True, capture_output=True)
+            results.append(measure(f"baseline {args.baseline}", os.path.join(worktree, "backend"), args.runs))
+        results.append(measure("lazy SDK import", BACKEND_DIR, args.runs, {"LLM_PRELOAD_SDK": "0"}))
+        results.append(measure("SDK preloaded in master", BACKEND_DIR, args.runs))
+    finally:
+        if worktree:
+            subprocess.run(["git", "-C", REPO_DIR, "worktree", "remove", "--force", worktree], capture_output=True)
+
+    print(f"\nMedian of {args.runs} runs, seconds (1 gunicorn worker, Gemini backend, no API calls)")
+    print(f"{'tree':<28}{'import app':>12}{'first req':>12}{'ready':>12}{'respawn req':>12}{'respawn rdy':>12}")
+    for r in results:
+        print(f"{r['label']:<28}" + "".join(_fmt(r[key]) for key in COLUMNS))
+
+
+if __name__ == "__main__":
+    main()
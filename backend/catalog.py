@@ -0,0 +1,176 @@
+# backend/catalog.py
+#
+# The curriculum catalog: subjects, topics and sections, loaded from a JSON data
+# file (backend/data/curriculum.json, or CATALOG_FILE) into read-only indexes.
+# Names are interned and every list the API returns is precomputed as a tuple, so
+# lookups allocate nothing. Each worker re-checks the file's mtime at most every
+# CATALOG_RELOAD_SECONDS and swaps in a freshly built catalog when it changed,
+# so edits go live without restarting the workers. A file that fails to load
+# leaves the previous catalog in place.
+#
+# File format:
+#   {"version": 1, "subjects": [{"name": "Mathematics", "topics": [
+#       {"name": "Geometry", "board": "CBSE", "grade": 7, "sections": ["Basic Shapes", ...]}]}]}
+# board and grade are optional. A topic name must be unique within its subject.
+
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+# --- Configuration ---
+CATALOG_FILE = os.environ.get("CATALOG_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "curriculum.json"))
+CATALOG_RELOAD_SECONDS = float(os.environ.get("CATALOG_RELOAD_SECONDS", "2"))
+
+_EMPTY = ()
+
+_catalog = None
+_checked_at = 0.0
+_failed_state = None  # (mtime, size) of a file version that failed to load, so it is not retried
+_reload_lock = threading.Lock()
+_stats = {"reloads": 0, "reload_errors": 0}
+
+
+def _intern(value):
+    return sys.intern(str(value))
+
+
+class Catalog:
+    """An immutable, indexed snapshot of one version of the catalog file."""
+
+    def __init__(self, document, version, file_state=None):
+        if not isinstance(document, dict) or not isinstance(document.get("subjects"), list):
+            raise ValueError("catalog must be an object with a 'subjects' list")
+        self.version = version
+        self.file_state = file_state
+        subjects = []
+        topics = {}             # (subject, board, grade) -> topic names; board/grade None means any
+        subjects_by = {}        # (board, grade) -> subject names
+        sections = {}           # (subject, topic) -> section titles
+        for subject_entry in document["subjects"]:
+            subject = _intern(subject_entry["name"])
+            subjects.append(subject)
+            for topic_entry in subject_entry.get("topics", []):
+                topic = _intern(topic_entry["name"])
+                if (subject, topic) in sections:
+                    raise ValueError(f"duplicate topic '{topic}' in subject '{subject}'")
+                board = _intern(topic_entry["board"]) if topic_entry.get("board") else None
+                grade = int(topic_entry["grade"]) if topic_entry.get("grade") is not None else None
+                sections[(subject, topic)] = tuple(_intern(title) for title in topic_entry.get("sections", []))
+                for b in {None, board}:
+                    for gr in {None, grade}:
+                        topics.setdefault((subject, b, gr), []).append(topic)
+                        names = subjects_by.setdefault((b, gr), [])
+                        if not names or names[-1] != subject:
+                            names.append(subject)
+        subjects_by[(None, None)] = subjects
+        self.subjects = tuple(subjects)
+        self._topics = {key: tuple(names) for key, names in topics.items()}
+        self._subjects_by = {key: tuple(names) for key, names in subjects_by.items()}
+        self._sections = sections
+        self.all_topics = tuple(topic for subject in self.subjects for topic in self._topics.get((subject, None, None), _EMPTY))
+        self._topic_names = frozenset(self.all_topics)
+
+    def get_subjects(self, board=None, grade=None):
+        return self._subjects_by.get((board, grade), _EMPTY)
+
+    def get_topics(self, subject, board=None, grade=None):
+        return self._topics.get((subject, board, grade), _EMPTY)
+
+    def get_sections(self, subject, topic):
+        return self._sections.get((subject, topic), _EMPTY)
+
+    def has_topic(self, topic):
+        return topic in self._topic_names
+
+
+def _file_state(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def load(path=None):
+    """Reads and indexes the catalog file. Raises OSError/ValueError if it is missing or invalid."""
+    path = path or CATALOG_FILE
+    state = _file_state(path)
+    with open(path, "rb") as f:
+        raw = f.read()
+    try:
+        document = json.loads(raw)
+    except ValueError as e:
+        raise ValueError(f"{path} is not valid JSON: {e}")
+    version = f"{document.get('version', 0)}-{hashlib.blake2b(raw, digest_size=8).hexdigest()}"
+    return Catalog(document, version, state)
+
+
+def current():
+    """The current catalog, reloading it first if the file changed since the last check."""
+    global _catalog, _checked_at, _failed_state
+    catalog = _catalog
+    now = time.monotonic()
+    if catalog is not None and now - _checked_at < CATALOG_RELOAD_SECONDS:
+        return catalog
+    with _reload_lock:
+        if _catalog is not None and now - _checked_at < CATALOG_RELOAD_SECONDS:
+            return _catalog
+        _checked_at = now
+        try:
+            state = _file_state(CATALOG_FILE)
+            if _catalog is not None and state in (_catalog.file_state, _failed_state):
+                return _catalog
+            fresh = load()
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            _stats["reload_errors"] += 1
+            _failed_state = state if isinstance(e, (ValueError, KeyError, TypeError)) else None
+            if _catalog is None:
+                raise
+            logging.error("[CATALOG] Could not reload %s, keeping version %s: %s", CATALOG_FILE, _catalog.version, e)
+            return _catalog
+        if _catalog is not None:
+            _stats["reloads"] += 1
+            logging.info("[CATALOG] Reloaded %s (version %s)", CATALOG_FILE, fresh.version)
+        _catalog = fresh
+        return fresh
+
+
+def get_subjects(board=None, grade=None):
+    return current().get_subjects(board, grade)
+
+
+def get_topics(subject, board=None, grade=None):
+    return current().get_topics(subject, board, grade)
+
+
+def get_sections(subject, topic):
+    return current().get_sections(subject, topic)
+
+
+def all_topics():
+    """Every topic name across all subjects, in catalog order."""
+    return current().all_topics
+
+
+def has_topic(topic):
+    """True if topic is a topic name in any subject."""
+    return current().has_topic(topic)
+
+
+def paginate(items, offset=0, limit=None):
+    """A slice of items plus the total count, for ?offset=&limit= style pagination."""
+    offset = max(0, offset)
+    end = None if limit is None else offset + max(0, limit)
+    return items[offset:end], len(items)
+
+
+def stats():
+    catalog = _catalog
+    return {
+        "subjects": len(catalog.subjects) if catalog else 0,
+        "topics": len(catalog.all_topics) if catalog else 0,
+        "version": catalog.version if catalog else None,
+        "reloads": _stats["reloads"],
+        "reload_errors": _stats["reload_errors"],
+    }
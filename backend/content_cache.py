@@ -0,0 +1,209 @@
+# backend/content_cache.py
+#
+# Two-tier cache for generated lesson content (explanations, solved examples,
+# problem MCQs). The first tier is an in-process LRU with TTL eviction, the
+# second a SQLite database in WAL mode that every gunicorn worker on the host
+# shares and that survives restarts.
+
+import copy
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import sqlite_store
+
+# --- Configuration ---
+# Set CONTENT_CACHE_DB to an empty string to run with the in-process tier only.
+CACHE_DB_PATH = os.environ.get("CONTENT_CACHE_DB", sqlite_store.default_path("content_cache.sqlite3"))
+MEMORY_MAX_ENTRIES = int(os.environ.get("CONTENT_CACHE_MAX_ENTRIES", 512))
+MEMORY_TTL_SECONDS = float(os.environ.get("CONTENT_CACHE_MEMORY_TTL", 3600))
+PERSISTENT_TTL_SECONDS = float(os.environ.get("CONTENT_CACHE_TTL", 7 * 24 * 3600))
+
+# Generation failures are reported as strings with these prefixes; they must never be cached.
+ERROR_PREFIXES = ("[AI Error:", "[Error:", "[AI content generation blocked:")
+
+# How many writes between sweeps of expired rows in the persistent tier.
+_PURGE_EVERY_N_PUTS = 200
+
+
+def config_fingerprint(generation_config):
+    """Returns a JSON-serialisable view of a generation config (dict, dataclass or SDK object)."""
+    if generation_config is None:
+        return None
+    if isinstance(generation_config, dict):
+        return generation_config
+    if hasattr(generation_config, "__dataclass_fields__"):
+        return {name: getattr(generation_config, name) for name in generation_config.__dataclass_fields__}
+    if hasattr(generation_config, "__dict__"):
+        return vars(generation_config)
+    return repr(generation_config)
+
+
+def make_key(model_name, prompt_version, content_type, prompt, generation_config=None):
+    """
+    Builds the cache key for one generation. The output of a generation depends only
+    on the model, the rendered prompt and the generation config, so that is what we hash.
+    """
+    material = json.dumps(
+        {
+            "model": model_name,
+            "prompt_version": prompt_version,
+            "content_type": content_type,
+            "prompt": prompt,
+            "config": config_fingerprint(generation_config),
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def is_cacheable(value):
+    """Only successful generations are cached: no None, empty results or error sentinels."""
+    if not value:
+        return False
+    if isinstance(value, str):
+        return not value.startswith(ERROR_PREFIXES)
+    return isinstance(value, (dict, list))
+
+
+class _MemoryTier:
+    """Thread-safe LRU with a maximum size and a per-entry TTL."""
+
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class _SqliteTier:
+    """Persistent tier shared by all worker processes."""
+
+    _SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS content_cache ("
+        " key TEXT PRIMARY KEY,"
+        " value TEXT NOT NULL,"
+        " created_at REAL NOT NULL,"
+        " expires_at REAL NOT NULL);"
+    )
+
+    def __init__(self, db_path, ttl_seconds):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self._conn = sqlite_store.ThreadLocalConnection(db_path, self._SCHEMA)
+        self._puts = 0
+
+    def _connection(self):
+        return self._conn.get()
+
+    def get(self, key):
+        row = self._connection().execute(
+            "SELECT value, expires_at FROM content_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO content_cache (key, value, created_at, expires_at) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value), now, now + self.ttl_seconds),
+        )
+        self._puts += 1
+        if self._puts % _PURGE_EVERY_N_PUTS == 0:
+            conn.execute("DELETE FROM content_cache WHERE expires_at < ?", (now,))
+
+
+_memory = _MemoryTier(MEMORY_MAX_ENTRIES, MEMORY_TTL_SECONDS)
+_persistent = _SqliteTier(CACHE_DB_PATH, PERSISTENT_TTL_SECONDS) if CACHE_DB_PATH else None
+
+_stats_lock = threading.Lock()
+_stats = {"memory_hits": 0, "persistent_hits": 0, "misses": 0, "stores": 0, "rejected": 0, "errors": 0}
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def get(key):
+    """Returns the cached value for key, or None on a miss. Dict/list values are returned as copies."""
+    value = _memory.get(key)
+    if value is not None:
+        _count("memory_hits")
+        return copy.deepcopy(value)
+
+    if _persistent is not None:
+        try:
+            value = _persistent.get(key)
+        except sqlite3.Error as e:
+            logging.error("Content cache: persistent tier read failed: %s", e)
+            _count("errors")
+            value = None
+        if value is not None:
+            _count("persistent_hits")
+            _memory.put(key, value)
+            return copy.deepcopy(value)
+
+    _count("misses")
+    return None
+
+
+def put(key, value):
+    """Stores a successful generation in both tiers. Error sentinels and empty results are ignored."""
+    if not is_cacheable(value):
+        _count("rejected")
+        return False
+    value = copy.deepcopy(value)
+    _memory.put(key, value)
+    if _persistent is not None:
+        try:
+            _persistent.put(key, value)
+        except sqlite3.Error as e:
+            logging.error("Content cache: persistent tier write failed: %s", e)
+            _count("errors")
+    _count("stores")
+    return True
+
+
+def stats():
+    """Hit/miss counters for this process plus the current size of the in-process tier."""
+    with _stats_lock:
+        snapshot = dict(_stats)
+    lookups = snapshot["memory_hits"] + snapshot["persistent_hits"] + snapshot["misses"]
+    snapshot["hit_rate"] = round((lookups - snapshot["misses"]) / lookups, 4) if lookups else 0.0
+    snapshot["memory_entries"] = len(_memory)
+    snapshot["persistent_enabled"] = _persistent is not None
+    return snapshot
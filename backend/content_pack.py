@@ -0,0 +1,185 @@
+# backend/content_pack.py
+#
+# Read-only, pre-generated curriculum content (built offline by pregenerate.py).
+# The pack is a single binary file that every worker memory-maps at startup, so
+# all workers on a host share one copy in the page cache. Entries are found by
+# binary search over a fixed-width index, then decompressed. No LLM call is made
+# for anything in the pack; generators fall back to the cache or live generation
+# for anything it does not have.
+#
+# Layout (little-endian):
+#   header   "<8sIIQQ": magic, format version, metadata length, index offset, entry count
+#   metadata JSON (pack version, prompt version, model, creation time, counts)
+#   payloads zlib-compressed JSON {"k": key, "v": value}, back to back
+#   index    entry count x "<16sQI": blake2b-128 of the key, payload offset, payload length,
+#            sorted by hash
+#
+# Keys are (content_type, topic, section_title): "explanation", "solved example" and
+# "problem" per section, and "mcqs" per topic (section_title "").
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+import sqlite_store
+
+MAGIC = b"EDUPACK\x00"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sIIQQ")
+INDEX_ENTRY = struct.Struct("<16sQI")
+
+# --- Configuration ---
+PACK_PATH = os.environ.get("CONTENT_PACK", sqlite_store.default_path("content.pack"))
+
+_pack = None
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+
+def _key_string(content_type, topic, section_title=""):
+    return "\x1f".join((content_type, topic, section_title or ""))
+
+
+def _key_hash(key_string):
+    return hashlib.blake2b(key_string.encode("utf-8"), digest_size=16).digest()
+
+
+def write_pack(path, entries, metadata=None):
+    """
+    Writes entries ({(content_type, topic, section_title): value}) as a pack file at path.
+    The file is written next to path and renamed into place, so readers never see half a pack.
+    """
+    records = []
+    for (content_type, topic, section_title), value in entries.items():
+        key = _key_string(content_type, topic, section_title)
+        payload = zlib.compress(json.dumps({"k": key, "v": value}, separators=(",", ":")).encode("utf-8"), 9)
+        records.append((_key_hash(key), payload))
+    records.sort(key=lambda record: record[0])
+
+    metadata = dict(metadata or {})
+    metadata["entries"] = len(records)
+    metadata.setdefault("created_at", time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()))
+    meta_bytes = json.dumps(metadata, sort_keys=True).encode("utf-8")
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        offset = HEADER.size + len(meta_bytes)
+        index = []
+        for key_hash, payload in records:
+            index.append(INDEX_ENTRY.pack(key_hash, offset, len(payload)))
+            offset += len(payload)
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(meta_bytes), offset, len(records)))
+        f.write(meta_bytes)
+        for _, payload in records:
+            f.write(payload)
+        f.write(b"".join(index))
+    os.replace(tmp_path, path)
+    return metadata
+
+
+class ContentPack:
+    """A memory-mapped pack file. Lookups are safe from any thread."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, meta_length, self._index_offset, self.entry_count = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} content pack")
+        self.metadata = json.loads(self._mmap[HEADER.size:HEADER.size + meta_length])
+
+    def _find(self, key_hash):
+        low, high = 0, self.entry_count
+        while low < high:
+            middle = (low + high) // 2
+            entry_hash, offset, length = INDEX_ENTRY.unpack_from(self._mmap, self._index_offset + middle * INDEX_ENTRY.size)
+            if entry_hash == key_hash:
+                return offset, length
+            if entry_hash < key_hash:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def get(self, content_type, topic, section_title=""):
+        key = _key_string(content_type, topic, section_title)
+        location = self._find(_key_hash(key))
+        if location is None:
+            return None
+        offset, length = location
+        record = json.loads(zlib.decompress(self._mmap[offset:offset + length]))
+        # Guards against a (practically impossible) 128-bit hash collision.
+        return record["v"] if record.get("k") == key else None
+
+    def close(self):
+        self._mmap.close()
+
+
+def load(path=None, prompt_version=None):
+    """
+    Memory-maps the pack at path (default CONTENT_PACK, else backend/var/content.pack).
+    A missing pack is normal (everything is generated live). A pack built for a different
+    prompt_version is ignored so stale content is not served after a prompt change.
+    """
+    global _pack
+    path = path or PACK_PATH
+    if not path or not os.path.exists(path):
+        logging.info("[CONTENT PACK] No content pack at %s; all content is generated live", path)
+        _pack = None
+        return None
+    try:
+        pack = ContentPack(path)
+    except (OSError, ValueError, struct.error) as e:
+        logging.error("[CONTENT PACK] Could not load %s: %s", path, e)
+        _pack = None
+        return None
+    pack_prompt_version = pack.metadata.get("prompt_version")
+    if prompt_version is not None and pack_prompt_version != prompt_version:
+        logging.warning("[CONTENT PACK] Ignoring %s: built for prompt version %s, current is %s. Re-run pregenerate.py.", path, pack_prompt_version, prompt_version)
+        pack.close()
+        _pack = None
+        return None
+    _pack = pack
+    logging.info("[CONTENT PACK] Loaded %s (version %s, %s entries)", path, pack.metadata.get('pack_version'), pack.entry_count)
+    return pack
+
+
+def lookup(content_type, topic, section_title=""):
+    """The pre-generated value for this key, or None when there is no pack or no entry."""
+    pack = _pack
+    if pack is None:
+        return None
+    try:
+        value = pack.get(content_type, topic, section_title)
+    except (ValueError, zlib.error) as e:
+        logging.error("[CONTENT PACK] Corrupt entry for %s / %s / %s: %s", content_type, topic, section_title, e)
+        value = None
+    with _stats_lock:
+        _stats["hits" if value is not None else "misses"] += 1
+    return value
+
+
+def has(content_type, topic, section_title=""):
+    """True if the pack has an entry for this key (index lookup only, nothing is decompressed)."""
+    pack = _pack
+    return pack is not None and pack._find(_key_hash(_key_string(content_type, topic, section_title))) is not None
+
+
+def stats():
+    """Pack version and hit/miss counters for this process."""
+    with _stats_lock:
+        snapshot = dict(_stats)
+    pack = _pack
+    snapshot["loaded"] = pack is not None
+    snapshot["entries"] = pack.entry_count if pack else 0
+    snapshot["pack_version"] = pack.metadata.get("pack_version") if pack else None
+    return snapshot
@@ -0,0 +1,556 @@
+# backend/event_log.py
+#
+# Append-only log of learner outcomes (initial-quiz answers and practice-problem
+# answers) and the per-student, per-section mastery aggregates kept from it.
+#   - record() appends to this process's pending batch and adds to its pending counts;
+#     it never touches the disk. A writer thread flushes the batch every EVENT_FLUSH_SECONDS:
+#       * the events are appended as JSON lines to this process's open segment file in
+#         EVENT_LOG_DIR, which is closed at EVENT_SEGMENT_BYTES or EVENT_SEGMENT_SECONDS;
+#       * the batch's counts are added to the mastery table (MASTERY_DB, shared by all
+#         workers) in one transaction.
+#   - Every EVENT_COMPACT_SECONDS closed segments are folded into one columnar part
+#     (NumPy .npz, one array per field, strings dictionary-encoded) for analysis.
+#   - mastery() reads one student's rows for a topic by primary key, plus the counts this
+#     process has not written yet; section_plan() turns them into skip/expand decisions.
+#   - Students are identified by ids the server issues, handed to the client as an HMAC-signed
+#     learner token (issue_learner_token), so a client cannot record answers for, or read the
+#     plan of, a student id it was not given.
+#
+#   cd backend && python event_log.py summary    # error rate per section over the whole log
+#   cd backend && python event_log.py compact    # fold closed segments into a part now
+#   cd backend && python event_log.py rebuild    # recompute the mastery table from the log
+
+import argparse
+import atexit
+import glob
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+import log_setup
+import metrics
+import sqlite_store
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking; compaction assumes a single process.
+    fcntl = None
+
+# --- Configuration ---
+# Set EVENT_LOG_DIR to an empty string to keep no event files, MASTERY_DB to keep mastery in process memory only.
+EVENT_LOG_DIR = os.environ.get("EVENT_LOG_DIR", sqlite_store.default_path("events"))
+MASTERY_DB = os.environ.get("MASTERY_DB", sqlite_store.default_path("mastery.sqlite3"))
+EVENT_FLUSH_SECONDS = float(os.environ.get("EVENT_FLUSH_SECONDS", 0.5))
+EVENT_BATCH_SIZE = int(os.environ.get("EVENT_BATCH_SIZE", 2000))            # flush early once this many are pending
+EVENT_MAX_PENDING = int(os.environ.get("EVENT_MAX_PENDING", 100000))        # beyond this, events are dropped, not waited for
+EVENT_SEGMENT_BYTES = int(os.environ.get("EVENT_SEGMENT_BYTES", 8 * 1024 * 1024))
+EVENT_SEGMENT_SECONDS = float(os.environ.get("EVENT_SEGMENT_SECONDS", 300))
+EVENT_COMPACT_SECONDS = float(os.environ.get("EVENT_COMPACT_SECONDS", 600))
+MASTERY_MIN_ATTEMPTS = int(os.environ.get("MASTERY_MIN_ATTEMPTS", 3))       # answers before a section is skipped or expanded
+MASTERY_SKIP_AT = float(os.environ.get("MASTERY_SKIP_AT", 0.8))
+MASTERY_EXPAND_BELOW = float(os.environ.get("MASTERY_EXPAND_BELOW", 0.5))
+MASTERY_SKIP_MIN_QUIZ_SCORE = float(os.environ.get("MASTERY_SKIP_MIN_QUIZ_SCORE", 0.5))  # no skipping after a weaker quiz
+# Key for signing learner tokens. Empty: a random key generated once in the data directory and shared by all workers.
+LEARNER_TOKEN_SECRET = os.environ.get("LEARNER_TOKEN_SECRET", "")
+LEARNER_TOKEN_KEY_FILE = os.environ.get("LEARNER_TOKEN_KEY_FILE", sqlite_store.default_path("learner_token.key"))
+
+FIELDS = ("ts", "kind", "student", "subject", "topic", "section", "question_id", "quiz_id", "correct")
+_STRING_FIELDS = FIELDS[1:-1]
+_MAX_ID_LENGTH = 64
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS mastery ("
+    " student TEXT NOT NULL,"
+    " subject TEXT NOT NULL,"
+    " topic TEXT NOT NULL,"
+    " section TEXT NOT NULL,"
+    " attempts INTEGER NOT NULL,"
+    " correct INTEGER NOT NULL,"
+    " last_correct INTEGER NOT NULL,"
+    " updated_at REAL NOT NULL,"
+    " PRIMARY KEY (student, subject, topic, section)) WITHOUT ROWID;"
+)
+_UPSERT = (
+    "INSERT INTO mastery VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT (student, subject, topic, section) DO UPDATE SET"
+    " attempts = attempts + excluded.attempts, correct = correct + excluded.correct,"
+    " last_correct = excluded.last_correct, updated_at = excluded.updated_at"
+)
+
+_conn = sqlite_store.ThreadLocalConnection(MASTERY_DB, _SCHEMA) if MASTERY_DB else None
+_lock = threading.Lock()        # pending batch and counts
+_flush_lock = threading.Lock()  # one flush at a time
+_wake = threading.Event()
+_writer = None
+_segment = None
+_last_compaction = time.monotonic()
+
+# Counts are nested (student, subject, topic) -> section -> [attempts, correct, last_correct, updated_at],
+# so one student's topic is a single lookup.
+_pending_events = []
+_pending_counts = {}
+_flushing_counts = {}  # taken by the running flush; still counted by mastery() until it is written
+_memory_counts = {}    # the mastery table when MASTERY_DB is empty
+_token_key = None
+_token_key_lock = threading.Lock()
+_stats = {"recorded": 0, "dropped": 0, "written": 0, "write_errors": 0, "segments_closed": 0,
+          "compacted": 0, "last_flush_ms": 0.0}
+
+
+def _learner_token_key():
+    """The learner token signing key: LEARNER_TOKEN_SECRET, else the key file (created by the first worker)."""
+    global _token_key
+    with _token_key_lock:
+        if _token_key is None:
+            if LEARNER_TOKEN_SECRET:
+                _token_key = LEARNER_TOKEN_SECRET.encode()
+            else:
+                _token_key = _load_or_create_key(LEARNER_TOKEN_KEY_FILE)
+        return _token_key
+
+
+def _load_or_create_key(path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Written to a private temporary file and linked into place, so other workers never read a partial key.
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(secrets.token_bytes(32))
+        os.link(temp_path, path)
+        logging.info("[EVENTS] Created learner token key %s", path)
+    except FileExistsError:
+        pass  # Another worker created it first.
+    finally:
+        os.unlink(temp_path)
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _signature(student):
+    return hmac.new(_learner_token_key(), student.encode(), hashlib.sha256).hexdigest()[:32]
+
+
+def issue_learner_token():
+    """A new server-issued student id, as the signed token the client sends back with its answers."""
+    student = secrets.token_urlsafe(12)
+    return f"{student}.{_signature(student)}"
+
+
+def student_id(token):
+    """The student id in a learner token this server issued, or None for a missing, malformed or forged one."""
+    if not isinstance(token, str) or len(token) > _MAX_ID_LENGTH or not token.isascii():
+        return None
+    student, _, signature = token.partition(".")
+    if not student or not hmac.compare_digest(signature.encode(), _signature(student).encode()):
+        return None
+    return student
+
+
+def _add_counts(counts, key, section, attempts, correct, last_correct, updated_at):
+    sections = counts.setdefault(key, {})
+    entry = sections.get(section)
+    if entry is None:
+        sections[section] = [attempts, correct, last_correct, updated_at]
+    else:
+        entry[0] += attempts
+        entry[1] += correct
+        if updated_at >= entry[3]:
+            entry[2], entry[3] = last_correct, updated_at
+
+
+def record(kind, student, subject, topic, outcomes, quiz_id=None):
+    """
+    Queues one event per (section, question_id, correct) in outcomes for student. Returns
+    False, dropping them, if EVENT_MAX_PENDING events are already waiting for the writer.
+    """
+    if not student or not outcomes:
+        return False
+    now = time.time()
+    key = (student, subject or "", topic or "")
+    with _lock:
+        if len(_pending_events) + len(outcomes) > EVENT_MAX_PENDING:
+            _stats["dropped"] += len(outcomes)
+            return False
+        for section, question_id, correct in outcomes:
+            correct = int(bool(correct))
+            _pending_events.append((now, kind, student, key[1], key[2], section or "", question_id or "", quiz_id or "", correct))
+            _add_counts(_pending_counts, key, section or "", 1, correct, correct, now)
+        _stats["recorded"] += len(outcomes)
+        flush_now = len(_pending_events) >= EVENT_BATCH_SIZE
+    metrics.inc("eduro_learner_events_total", len(outcomes), kind=kind)
+    if flush_now:
+        _wake.set()
+    return True
+
+
+def mastery(student, subject, topic):
+    """
+    {section: {"attempts", "correct", "mastery"}} for student in one topic ("" is the
+    topic-level bucket for answers without a section). mastery is the smoothed share
+    correct, (correct + 1) / (attempts + 2).
+    """
+    key = (student, subject or "", topic or "")
+    sections = {}
+    if _conn is not None:
+        try:
+            rows = _conn.get().execute(
+                "SELECT section, attempts, correct, last_correct, updated_at FROM mastery"
+                " WHERE student = ? AND subject = ? AND topic = ?", key).fetchall()
+        except sqlite3.Error as e:
+            logging.error("[EVENT LOG] Mastery lookup failed for %s: %s", student, e)
+            rows = []
+        for section, attempts, correct, last_correct, updated_at in rows:
+            _add_counts(sections, None, section, attempts, correct, last_correct, updated_at)
+    with _lock:
+        # A flush that commits during the read above can be counted twice until the next lookup.
+        layers = [_flushing_counts.get(key, {}), _pending_counts.get(key, {})]
+        if _conn is None:
+            layers.insert(0, _memory_counts.get(key, {}))
+        for layer in layers:
+            for section, (attempts, correct, last_correct, updated_at) in layer.items():
+                _add_counts(sections, None, section, attempts, correct, last_correct, updated_at)
+    return {
+        section: {"attempts": attempts, "correct": correct, "mastery": round((correct + 1) / (attempts + 2), 3)}
+        for section, (attempts, correct, _, _) in sections.get(None, {}).items()
+    }
+
+
+def section_plan(student, subject, topic, sections, quiz_score):
+    """
+    [{"section_title", "action", "mastery", "attempts"}] for sections, in order. action is
+    "skip" (MASTERY_MIN_ATTEMPTS answers, mastery at least MASTERY_SKIP_AT, and an initial
+    quiz score of at least MASTERY_SKIP_MIN_QUIZ_SCORE), "expand" (MASTERY_MIN_ATTEMPTS
+    answers and mastery below MASTERY_EXPAND_BELOW) or "study". One section is always kept.
+    """
+    by_section = mastery(student, subject, topic) if student else {}
+    plan = []
+    for title in sections:
+        entry = by_section.get(title, {"attempts": 0, "mastery": 0.5})
+        action = "study"
+        if entry["attempts"] >= MASTERY_MIN_ATTEMPTS:
+            if entry["mastery"] >= MASTERY_SKIP_AT and quiz_score >= MASTERY_SKIP_MIN_QUIZ_SCORE:
+                action = "skip"
+            elif entry["mastery"] < MASTERY_EXPAND_BELOW:
+                action = "expand"
+        plan.append({"section_title": title, "action": action, "mastery": entry["mastery"], "attempts": entry["attempts"]})
+    if plan and all(item["action"] == "skip" for item in plan):
+        min(plan, key=lambda item: item["mastery"])["action"] = "study"
+    return plan
+
+
+# --- Writer ---
+
+class _Segment:
+    """This process's open segment: seg-<pid>-<ns>.open, renamed to .jsonl when closed."""
+
+    def __init__(self):
+        os.makedirs(EVENT_LOG_DIR, exist_ok=True)
+        self.path = os.path.join(EVENT_LOG_DIR, f"seg-{os.getpid()}-{time.time_ns()}.open")
+        self.file = open(self.path, "a", encoding="utf-8")
+        self.opened = time.monotonic()
+        self.size = 0
+
+    def append(self, events):
+        data = "".join(json.dumps(dict(zip(FIELDS, event)), separators=(",", ":")) + "\n" for event in events)
+        self.file.write(data)
+        self.file.flush()
+        self.size += len(data)
+
+    def due(self):
+        return self.size >= EVENT_SEGMENT_BYTES or (self.size and time.monotonic() - self.opened >= EVENT_SEGMENT_SECONDS)
+
+    def close(self):
+        self.file.close()
+        if self.size:
+            os.replace(self.path, self.path[:-len(".open")] + ".jsonl")
+        else:
+            os.remove(self.path)
+
+
+def _write_counts(counts, replace=False):
+    """Adds counts to the mastery table in one transaction; replace=True first empties it, in the same one."""
+    rows = [(student, subject, topic, section, attempts, correct, last_correct, updated_at)
+            for (student, subject, topic), sections in counts.items()
+            for section, (attempts, correct, last_correct, updated_at) in sections.items()]
+    conn = _conn.get()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if replace:
+            conn.execute("DELETE FROM mastery")
+        conn.executemany(_UPSERT, rows)
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def flush():
+    """Writes the pending events and counts; called by the writer thread, or directly by tools."""
+    global _pending_events, _pending_counts, _flushing_counts, _segment
+    with _flush_lock:
+        with _lock:
+            events, _pending_events = _pending_events, []
+            _flushing_counts, _pending_counts = _pending_counts, {}
+            counts = _flushing_counts
+        started = time.perf_counter()
+        try:
+            if events and EVENT_LOG_DIR:
+                try:
+                    if _segment is None:
+                        _segment = _Segment()
+                    _segment.append(events)
+                    _stats["written"] += len(events)
+                except OSError as e:
+                    _stats["write_errors"] += 1
+                    logging.error("[EVENT LOG] Could not append %s events to %s: %s", len(events), EVENT_LOG_DIR, e)
+            if counts:
+                if _conn is None:
+                    with _lock:
+                        for key, sections in counts.items():
+                            for section, entry in sections.items():
+                                _add_counts(_memory_counts, key, section, *entry)
+                else:
+                    try:
+                        _write_counts(counts)
+                    except sqlite3.Error as e:
+                        _stats["write_errors"] += 1
+                        logging.error("[EVENT LOG] Could not update mastery (%s); keeping the counts for the next flush", e)
+                        with _lock:
+                            for key, sections in counts.items():
+                                for section, entry in sections.items():
+                                    _add_counts(_pending_counts, key, section, *entry)
+        finally:
+            with _lock:
+                _flushing_counts = {}
+        if events:
+            _stats["last_flush_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        if _segment is not None and _segment.due():
+            _close_segment()
+
+
+def close_segment():
+    """Closes this process's open segment now (it becomes eligible for compaction)."""
+    with _flush_lock:
+        _close_segment()
+
+
+def _close_segment():
+    global _segment
+    segment, _segment = _segment, None
+    if segment is None:
+        return
+    try:
+        segment.close()
+        _stats["segments_closed"] += 1
+    except OSError as e:
+        logging.error("[EVENT LOG] Could not close segment %s: %s", segment.path, e)
+
+
+def _writer_loop():
+    global _last_compaction
+    while True:
+        _wake.wait(EVENT_FLUSH_SECONDS)
+        _wake.clear()
+        try:
+            flush()
+            if EVENT_LOG_DIR and time.monotonic() - _last_compaction >= EVENT_COMPACT_SECONDS:
+                _last_compaction = time.monotonic()
+                compact()
+        except Exception as e:
+            logging.error("[EVENT LOG] Writer error: %s", e)
+
+
+def start():
+    """Starts the writer thread (once per process)."""
+    global _writer
+    if _writer is not None and _writer.is_alive():
+        return
+    _writer = threading.Thread(target=_writer_loop, name="event-log-writer", daemon=True)
+    _writer.start()
+
+
+def _shutdown():
+    # Writes what is pending and closes the segment, so a clean exit leaves nothing open.
+    if _writer is None:
+        return
+    flush()
+    close_segment()
+
+
+atexit.register(_shutdown)
+
+
+def _reset_after_fork():
+    global _lock, _flush_lock, _writer, _segment
+    was_started = _writer is not None
+    _lock, _flush_lock = threading.Lock(), threading.Lock()
+    _pending_events.clear()
+    _pending_counts.clear()
+    _writer = _segment = None  # the parent's segment file stays the parent's
+    if was_started:
+        start()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def stats():
+    with _lock:
+        return dict(_stats, pending=len(_pending_events))
+
+
+# --- Compaction and reading ---
+
+class _DirectoryLock:
+    """Exclusive flock on EVENT_LOG_DIR/.lock so two workers never compact the same segments."""
+
+    def __enter__(self):
+        self._file = open(os.path.join(EVENT_LOG_DIR, ".lock"), "w")
+        if fcntl is not None:
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info):
+        if fcntl is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._file.close()
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+def _closed_segments():
+    """Closed segments, plus open ones left behind by processes that have exited."""
+    paths = sorted(glob.glob(os.path.join(EVENT_LOG_DIR, "seg-*.jsonl")))
+    for path in sorted(glob.glob(os.path.join(EVENT_LOG_DIR, "seg-*.open"))):
+        pid = int(os.path.basename(path).split("-")[1])
+        if pid != os.getpid() and not _pid_alive(pid):
+            paths.append(path)
+    return paths
+
+
+def _read_segment(path, columns):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue  # the torn last line of a segment whose process was killed mid-write
+            for field in FIELDS:
+                columns[field].append(event.get(field))
+
+
+def _write_part(path, columns):
+    import numpy as np
+    arrays = {"ts": np.asarray(columns["ts"], dtype=np.float64), "correct": np.asarray(columns["correct"], dtype=bool)}
+    for field in _STRING_FIELDS:
+        values, codes = np.unique(np.asarray([value or "" for value in columns[field]], dtype=str), return_inverse=True)
+        arrays[field] = codes.astype(np.int32)
+        arrays[f"{field}.values"] = values
+    with open(path + ".tmp", "wb") as f:
+        np.savez_compressed(f, **arrays)
+    os.replace(path + ".tmp", path)
+
+
+def compact():
+    """Folds the closed segments into one columnar part; returns the number of events compacted."""
+    if not EVENT_LOG_DIR or not os.path.isdir(EVENT_LOG_DIR):
+        return 0
+    with _DirectoryLock():
+        paths = _closed_segments()
+        if not paths:
+            return 0
+        columns = {field: [] for field in FIELDS}
+        for path in paths:
+            _read_segment(path, columns)
+        count = len(columns["ts"])
+        if count:
+            _write_part(os.path.join(EVENT_LOG_DIR, f"part-{time.time_ns()}.npz"), columns)
+        for path in paths:
+            os.remove(path)
+    _stats["compacted"] += count
+    logging.info("[EVENT LOG] Compacted %s events from %s segment(s)", count, len(paths))
+    return count
+
+
+def read_columns():
+    """Every event written so far (parts and segments) as {field: NumPy array}, strings decoded."""
+    import numpy as np
+    columns = {field: [] for field in FIELDS}
+    parts = []
+    if EVENT_LOG_DIR and os.path.isdir(EVENT_LOG_DIR):
+        for path in sorted(glob.glob(os.path.join(EVENT_LOG_DIR, "part-*.npz"))):
+            with np.load(path) as part:
+                parts.append({field: part[f"{field}.values"][part[field]] if field in _STRING_FIELDS else part[field]
+                              for field in FIELDS})
+        for path in sorted(glob.glob(os.path.join(EVENT_LOG_DIR, "seg-*.jsonl")) + glob.glob(os.path.join(EVENT_LOG_DIR, "seg-*.open"))):
+            _read_segment(path, columns)
+    loose = {field: np.asarray([value or "" for value in columns[field]], dtype=str) for field in _STRING_FIELDS}
+    loose.update(ts=np.asarray(columns["ts"], dtype=np.float64), correct=np.asarray(columns["correct"], dtype=bool))
+    return {field: np.concatenate([part[field] for part in parts] + [loose[field]]) for field in FIELDS}
+
+
+def rebuild():
+    """Recomputes the mastery table from the whole log; returns the number of (student, section) rows."""
+    columns = read_columns()
+    counts = {}
+    for i in columns["ts"].argsort(kind="stable"):
+        key = (str(columns["student"][i]), str(columns["subject"][i]), str(columns["topic"][i]))
+        correct = int(columns["correct"][i])
+        _add_counts(counts, key, str(columns["section"][i]), 1, correct, correct, float(columns["ts"][i]))
+    if _conn is not None:
+        # Readers never see an empty or half-written table, and a failed rebuild leaves the old one.
+        _write_counts(counts, replace=True)
+    else:
+        with _lock:
+            _memory_counts.clear()
+            _memory_counts.update(counts)
+    return sum(len(sections) for sections in counts.values())
+
+
+def summary(limit=20):
+    """(subject, topic, section, answers, error rate, students) for the sections with the most wrong answers."""
+    import numpy as np
+    columns = read_columns()
+    if not len(columns["ts"]):
+        return []
+    keys = np.char.add(np.char.add(np.char.add(columns["subject"], "\x1f"), np.char.add(columns["topic"], "\x1f")), columns["section"])
+    unique, inverse = np.unique(keys, return_inverse=True)
+    answers = np.bincount(inverse, minlength=len(unique))
+    wrong = np.bincount(inverse, weights=(~columns["correct"]).astype(np.float64), minlength=len(unique))
+    rows = []
+    for index in np.argsort(-wrong, kind="stable")[:limit]:
+        students = len(np.unique(columns["student"][inverse == index]))
+        subject, topic, section = str(unique[index]).split("\x1f")
+        rows.append((subject, topic, section, int(answers[index]), float(wrong[index] / answers[index]), students))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Learner event log maintenance.")
+    parser.add_argument("command", choices=("summary", "compact", "rebuild"))
+    args = parser.parse_args()
+    log_setup.configure(default_format="text")
+    if args.command == "compact":
+        print(f"{compact()} events compacted")
+    elif args.command == "rebuild":
+        print(f"{rebuild()} mastery rows rebuilt from the log")
+    else:
+        print(f"{'subject':<16}{'topic':<24}{'section':<44}{'answers':>8}{'wrong':>7}{'students':>9}")
+        for subject, topic, section, answers, error_rate, students in summary():
+            print(f"{subject:<16}{topic:<24}{section or '(topic)':<44}{answers:>8}{error_rate:>7.0%}{students:>9}")
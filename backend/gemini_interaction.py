@@ -1,32 +1,33 @@
 # backend/gemini_interaction.py
 
-import google.generativeai as genai
-import os
 import json
+import os
 import re
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import content_cache
+import content_pack
+import llm_backend
+import llm_gateway
+import log_setup
+import mcq_parser
+import metrics
+import mock_gemini
+import question_bank
+import resilience
+import token_budget
 # from google.generativeai import types
 # from google.generativeai.types import Tool, GenerateContentConfig, GoogleSearch
 
-# Configure logging for better debugging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-
-# --- Configuration ---
-try:
-    API_KEY = os.environ["GOOGLE_API_KEY"]
-    genai.configure(api_key=API_KEY)
-    logging.info("Google API Key configured successfully.")
-except KeyError:
-    logging.error("CRITICAL: GOOGLE_API_KEY environment variable not set.")
-    logging.error("Please set it before running the application. Example: export GOOGLE_API_KEY='your_api_key_here'")
-    # In a real app, you might want to raise an exception or sys.exit() here
-    # For this prototype, we'll let it proceed but API calls will fail.
-    # Consider adding: raise SystemExit("GOOGLE_API_KEY not set.")
-
 # --- Model Initialization ---
 # Use the specific model you mentioned or a suitable alternative.
 # "gemini-1.5-flash-latest" is a good general-purpose and fast model.
-MODEL_NAME = "gemini-2.0-flash" # Adjusted from gemini-2.0-flash as 1.5-flash is widely available
+MODEL_NAME = os.environ.get("GEMINI_MODEL", "gemini-2.0-flash") # Standard tier; see Model routing below
+
+# Bump whenever a prompt template changes so cached generations from the old prompt are not served.
+PROMPT_VERSION = "2"
 
 # Safety settings can be adjusted. These are fairly standard.
 SAFETY_SETTINGS = [
@@ -36,50 +37,237 @@ SAFETY_SETTINGS = [
     {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
 ]
 
-# Generation config for MCQs - aiming for JSON output
-mcq_generation_config = genai.types.GenerationConfig(
-    # response_mime_type="application/json", # Enable if your model version strongly supports it
-    temperature=0.6, # Slightly lower for more structured output
-    top_p=0.95,
-    top_k=40
+# Structured output: MCQ requests set response_mime_type="application/json" plus a response
+# schema, so the model returns a bare JSON array of MCQs. Set LLM_STRUCTURED_OUTPUT=0 for
+# models that do not support it; mcq_parser recovers what it can from free-form output either way.
+STRUCTURED_OUTPUT = os.environ.get("LLM_STRUCTURED_OUTPUT", "1") != "0"
+
+MCQ_RESPONSE_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "id": {"type": "string"},
+            "question_text": {"type": "string"},
+            "options": {"type": "array", "items": {"type": "string"}, "min_items": 4, "max_items": 4},
+            "correct_answer": {"type": "string"},
+        },
+        "required": ["id", "question_text", "options", "correct_answer"],
+    },
+}
+_structured_mcq_config = (
+    {"response_mime_type": "application/json", "response_schema": MCQ_RESPONSE_SCHEMA} if STRUCTURED_OUTPUT else {}
 )
 
+# Generation config for MCQs - aiming for JSON output.
+# Plain dicts are accepted by every backend (the Gemini SDK converts them to GenerationConfig).
+mcq_generation_config = {
+    "temperature": 0.6, # Slightly lower for more structured output
+    "top_p": 0.95,
+    "top_k": 40,
+    **_structured_mcq_config,
+}
+
 # Generation config for general text (explanations, etc.)
-text_generation_config = genai.types.GenerationConfig(
-    temperature=0.7,
-    top_p=0.95,
-    top_k=40
-)
+text_generation_config = {
+    "temperature": 0.7,
+    "top_p": 0.95,
+    "top_k": 40,
+}
+
+# Generation config for single practice-problem MCQs (text temperature, MCQ schema).
+problem_generation_config = dict(text_generation_config, **_structured_mcq_config)
+
+# --- Model routing ---
+# Each content type has a route: model tier, output-token cap and prompt variant.
+# Practice problems and MCQ sets are short and schema-constrained, so they go to the lite
+# tier with compact prompts (the response schema already enforces the format that the full
+# prompts spell out). Explanations, solved examples and lesson bundles stay on the standard
+# model. Every prompt is whitespace-compacted, and its tokens are estimated and reserved
+# from the token budgets (token_budget.py) before it is sent.
+# LLM_ROUTING=0 sends everything to the standard model with the full prompts and no output
+# cap. LLM_ROUTES='{"mcqs": {"tier": "standard"}}' overrides individual routes.
+ROUTING_ENABLED = os.environ.get("LLM_ROUTING", "1") != "0"
+MODEL_TIERS = {
+    "standard": MODEL_NAME,
+    "lite": os.environ.get("GEMINI_MODEL_LITE", "gemini-2.0-flash-lite"),
+}
+# max_output_tokens is per item: per question for MCQ sets, per section for lesson bundles.
+ROUTES = {
+    "explanation": {"tier": "standard", "max_output_tokens": 1536, "prompt": "full"},
+    "solved example": {"tier": "standard", "max_output_tokens": 1536, "prompt": "full"},
+    "problem": {"tier": "lite", "max_output_tokens": 384, "prompt": "compact"},
+    "mcqs": {"tier": "lite", "max_output_tokens": 256, "prompt": "compact"},
+    "lesson bundle": {"tier": "standard", "max_output_tokens": 3072, "prompt": "full"},
+}
+for _content_type, _override in json.loads(os.environ.get("LLM_ROUTES", "{}")).items():
+    ROUTES[_content_type] = dict(ROUTES.get(_content_type, {}), **_override)
 
 # URL_CONTEXT_TOOL = Tool(url_context = types.UrlContext)
 # url_grounding_config=GenerateContentConfig(
 #         tools=[URL_CONTEXT_TOOL],
 #         response_modalities=["TEXT"],
 #     )
-# Initialize the model instance
-# Check if API_KEY was actually found before creating the model
-if 'API_KEY' in globals() and API_KEY:
+
+# The active llm_backend instance (Gemini, or the local stand-in for load tests).
+# It exposes the same generate_content / generate_content_async calls as a Gemini model.
+model = None
+_tier_backends = {}  # model name -> backend for routed tiers other than the standard one
+_tier_lock = threading.Lock()
+
+def configure_backend(name=None):
+    """
+    Creates the LLM backend named by name (default: the LLM_BACKEND environment variable,
+    else "gemini") and makes it the model every generator uses. On failure the model stays
+    None and generators report "Model not initialized", as before.
+    """
+    global model
+    _tier_backends.clear()
     try:
-        model = genai.GenerativeModel(
-            MODEL_NAME,
-            safety_settings=SAFETY_SETTINGS
-            # Default generation_config can be set here if desired for all calls
-        )
-        logging.info(f"Gemini model '{MODEL_NAME}' initialized.")
+        model = llm_backend.create_backend(name, model_name=MODEL_NAME, safety_settings=SAFETY_SETTINGS)
     except Exception as e:
-        logging.error(f"Failed to initialize Gemini model: {e}")
-        model = None # Ensure model is None if initialization fails
-else:
-    model = None
-    logging.error("Gemini model not initialized because API key is missing.")
+        logging.error("Failed to initialize LLM backend: %s", e)
+        model = None
+    return model
 
+_warm_up_error = None
+
+def warm_up_backend():
+    """
+    Finishes the backend's deferred initialization (for Gemini: importing the SDK and building
+    the model). app.py runs this in a background thread at worker start so /api/ready can report
+    when the backend is usable; without it the first LLM call pays the cost instead.
+    """
+    global _warm_up_error
+    backend = model
+    if backend is None:
+        return False
+    try:
+        backend.warm_up()
+    except Exception as e:
+        _warm_up_error = str(e)
+        logging.error("Failed to initialize LLM backend '%s': %s", backend.name, e)
+        return False
+    _warm_up_error = None
+    return True
+
+def backend_status():
+    """{"backend", "state", "error"}: state is "ready", "starting", "failed" or "unavailable" (no backend)."""
+    backend = model
+    if backend is None:
+        return {"backend": None, "state": "unavailable", "error": "Model not initialized"}
+    if backend.ready:
+        return {"backend": backend.name, "state": "ready", "error": None}
+    if _warm_up_error:
+        return {"backend": backend.name, "state": "failed", "error": _warm_up_error}
+    return {"backend": backend.name, "state": "starting", "error": None}
+
+
+def _route(content_type, base_config, items=1):
+    """(model name, generation config) for one call of content_type producing items questions or sections."""
+    route = ROUTES.get(content_type) if ROUTING_ENABLED else None
+    if not route:
+        return MODEL_NAME, base_config
+    return MODEL_TIERS.get(route["tier"], MODEL_NAME), dict(base_config, max_output_tokens=route["max_output_tokens"] * max(1, items))
+
+def _prompt_variant(content_type):
+    """"compact" or "full". Compact prompts rely on the response schema, so they need STRUCTURED_OUTPUT."""
+    route = ROUTES.get(content_type) if ROUTING_ENABLED else None
+    return "compact" if route and route.get("prompt") == "compact" and STRUCTURED_OUTPUT else "full"
+
+def _backend(model_name):
+    """The backend for model_name: the configured model itself, or a sibling of the same kind."""
+    backend = model
+    if backend is None or model_name == backend.model_name:
+        return backend
+    with _tier_lock:
+        if model_name not in _tier_backends:
+            _tier_backends[model_name] = llm_backend.create_backend(backend.name, model_name=model_name, safety_settings=SAFETY_SETTINGS)
+        return _tier_backends[model_name]
+
+def compact_prompt(prompt):
+    """Drops the indentation and repeated blank lines of the triple-quoted templates (they cost tokens, not meaning)."""
+    lines = []
+    for line in prompt.strip().splitlines():
+        line = " ".join(line.split())
+        if line or (lines and lines[-1]):
+            lines.append(line)
+    return "\n".join(lines)
+
+def _send(content_type, model_name, prompt, generation_config, validate=None):
+    """
+    llm_gateway.generate on the routed backend. The call's estimated tokens (prompt plus output
+    cap) are reserved from the request and tenant budgets first; BudgetExceededError is raised
+    instead of sending a call they cannot cover.
+    """
+    estimate = llm_gateway.estimate_tokens(prompt, generation_config)
+    reservation = token_budget.reserve(estimate, content_type)
+    logging.debug("[ROUTING] %s -> %s (~%s tokens reserved)", content_type, model_name, estimate)
+    try:
+        response = llm_gateway.generate(_backend(model_name), prompt, generation_config=generation_config,
+                                        content_type=content_type, validate=validate)
+    except BaseException:
+        token_budget.release(reservation)
+        raise
+    token_budget.settle(reservation, model_name, content_type, llm_gateway.last_usage())
+    return response
+
+
+# --- Degraded mode ---
+# When Gemini is unavailable (circuit breaker open, client-side quota exhausted, or a
+# transient error that survived the gateway's retries) we serve the offline mock_gemini
+# content instead of an error, so the frontend does not retry into an overloaded API.
+# Degraded content is never cached.
+_MOCK_TEXT_GENERATORS = {
+    "explanation": mock_gemini.generate_explanation_mock,
+    "solved example": mock_gemini.generate_solved_example_mock,
+}
+# Offline tools that must never store placeholder content (pregenerate.py) set LLM_DEGRADED_MODE=0.
+DEGRADED_MODE = os.environ.get("LLM_DEGRADED_MODE", "1") != "0"
+_degraded_lock = threading.Lock()
+_degraded_served = {}
+_degraded_local = threading.local()
+
+def _should_degrade(error):
+    if not DEGRADED_MODE:
+        return False
+    return isinstance(error, llm_gateway.LLMUnavailableError) or resilience.is_retryable(error)
+
+def _serve_degraded(content_type_log_name, error, mock_generator, *args):
+    logging.warning("[DEGRADED] Gemini unavailable for %s (%s: %s); serving offline content.", content_type_log_name, type(error).__name__, error)
+    with _degraded_lock:
+        _degraded_served[content_type_log_name] = _degraded_served.get(content_type_log_name, 0) + 1
+    _degraded_local.served = degraded_in_thread() + 1
+    content = mock_generator(*args)
+    # Placeholder questions have arbitrary answer keys: mark them so they are never graded as a real assessment.
+    for item in content if isinstance(content, list) else [content]:
+        if isinstance(item, dict):
+            item["degraded"] = True
+    return content
+
+def is_degraded(questions):
+    """True if any of the MCQ or problem dicts is offline placeholder content."""
+    return any(isinstance(q, dict) and q.get("degraded") for q in questions)
+
+def degraded_stats():
+    """How many responses per content type were served from the offline fallback in this process."""
+    with _degraded_lock:
+        return dict(_degraded_served)
+
+def degraded_in_thread():
+    """How many degraded responses this thread has produced; compare before and after a call."""
+    return getattr(_degraded_local, "served", 0)
+
+def _degraded_total():
+    with _degraded_lock:
+        return sum(_degraded_served.values())
 
 def _clean_json_from_text(text_response):
     """
-    Attempts to extract a JSON array string from a larger text response
+    Attempts to extract a JSON array (or object) string from a larger text response
     that might include markdown backticks.
     """
-    match = re.search(r"```json\s*(\[.*\])\s*```", text_response, re.DOTALL)
+    match = re.search(r"```json\s*(\[.*\]|\{.*\})\s*```", text_response, re.DOTALL)
     if match:
         return match.group(1)
     # Fallback: if no markdown, assume the whole string might be JSON (or part of it)
@@ -89,13 +277,147 @@ def _clean_json_from_text(text_response):
         return text_response[json_start_match.start():]
     return text_response # Return original if no clear JSON structure found
 
-def generate_mcqs(topic, num_questions=3):
-    if not model:
-        logging.error("generate_mcqs: Model not initialized.")
-        return []
+def _json_response_ok(response):
+    """Hedging validator for JSON content types: the response text parses as JSON."""
+    try:
+        json.loads(_clean_json_from_text(response.text))
+        return True
+    except ValueError:
+        return False
+
+MCQ_REQUIRED_KEYS = ("id", "question_text", "options", "correct_answer")
 
-    logging.info(f"[GEMINI API] Attempting to generate {num_questions} MCQs for topic: {topic}")
-    prompt = f"""
+def _mcq_rejection_reason(q):
+    """
+    Applies the validation rules every generated MCQ must pass.
+    Returns None for a valid question, otherwise a short reason string.
+    """
+    if not isinstance(q, dict) or not all(key in q for key in MCQ_REQUIRED_KEYS):
+        return "missing_keys"
+    if not isinstance(q.get("options"), list) or len(q["options"]) != 4:
+        return "bad_options"
+    if q.get("correct_answer") not in q.get("options", []):
+        return "answer_not_in_options"
+    return None
+
+def _parse_mcq_list(text, content_type):
+    """
+    Returns the MCQ candidates in a model response as a list (not yet validated).
+    Well-formed JSON takes the fast path. Otherwise mcq_parser recovers every complete
+    object rather than discarding the whole generation. Returns [] when nothing is usable.
+    """
+    try:
+        data = json.loads(_clean_json_from_text(text))
+        if isinstance(data, list):
+            return data
+        if isinstance(data, dict):
+            return [data]
+    except ValueError:
+        pass
+    recovered, discarded = mcq_parser.parse_mcqs(text)
+    if recovered:
+        # A generation that strict json.loads would have thrown away (and the student retried).
+        metrics.inc("eduro_llm_parse_recovered_total", content_type=content_type)
+        logging.warning("Recovered %s MCQ object(s) from malformed %s output (%s fragment(s) dropped)", len(recovered), content_type, discarded)
+        return recovered
+    metrics.inc("eduro_llm_parse_failures_total", content_type=content_type)
+    logging.error("Could not parse any MCQ from the %s response: %s", content_type, text)
+    return []
+
+# --- Top-up generation ---
+# Valid MCQs from a response are kept; when some fail validation, the model is asked for
+# exactly the missing count, with the accepted questions listed so it does not repeat them.
+# Rounds stop when the request is complete or the round, latency or token budget runs out.
+TOPUP_MAX_ROUNDS = int(os.environ.get("MCQ_TOPUP_MAX_ROUNDS", 2))              # extra calls after the first
+TOPUP_BUDGET_SECONDS = float(os.environ.get("MCQ_TOPUP_BUDGET_SECONDS", 30))   # total time across rounds
+TOPUP_BUDGET_TOKENS = int(os.environ.get("MCQ_TOPUP_BUDGET_TOKENS", 8000))     # prompt + output tokens across rounds
+
+MCQ_TOPUP_AVOID_TEMPLATE = """
+    Do NOT repeat the questions below or ask the same thing in other words (the student already has them, or they were invalid):
+{accepted_list}
+"""
+
+def _with_avoid_list(prompt, avoid_texts):
+    if not avoid_texts:
+        return prompt
+    accepted_list = "\n".join(f"    - {text}" for text in avoid_texts)
+    return prompt + MCQ_TOPUP_AVOID_TEMPLATE.format(accepted_list=accepted_list)
+
+def _normalized_question(q):
+    return " ".join(str(q.get("question_text", "")).lower().split())
+
+def _response_tokens(response):
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return 0
+    return (getattr(usage, "prompt_token_count", 0) or 0) + (getattr(usage, "candidates_token_count", 0) or 0)
+
+def _generate_valid_mcqs(build_prompt, num_questions, generation_config, content_type):
+    """
+    Shared generate-validate-top-up loop for generate_mcqs and generate_problem.
+    build_prompt(missing, avoid_texts) returns the prompt for one round; avoid_texts are the
+    questions accepted or rejected so far, for _with_avoid_list. Returns the valid
+    questions with ids renumbered q1..qn, possibly fewer than num_questions when the budget
+    runs out. Errors from the first call propagate (the caller decides whether to degrade);
+    a failed top-up round just ends the loop with what was accepted so far.
+    """
+    accepted = []
+    rejected_texts = []
+    seen = set()
+    started = time.monotonic()
+    tokens_spent = 0
+    for round_number in range(TOPUP_MAX_ROUNDS + 1):
+        missing = num_questions - len(accepted)
+        prompt = compact_prompt(build_prompt(missing, [q["question_text"] for q in accepted] + rejected_texts))
+        model_name, round_config = _route(content_type, generation_config, missing)
+        round_started = time.monotonic()
+        try:
+            response = _send(content_type, model_name, prompt, round_config, validate=_json_response_ok)
+        except Exception as e:
+            if not accepted:
+                raise
+            logging.warning("Top-up round for %s failed (%s: %s); keeping %s valid MCQs", content_type, type(e).__name__, e, len(accepted))
+            break
+        logging.debug("[GEMINI RAW RESPONSE for %s]:\n%s\n", content_type, response.text, extra=log_setup.PAYLOAD)
+        round_tokens = _response_tokens(response)
+        tokens_spent += round_tokens
+
+        for q in _parse_mcq_list(response.text, content_type):
+            if len(accepted) >= num_questions:
+                break
+            reason = _mcq_rejection_reason(q)
+            if not reason and _normalized_question(q) in seen:
+                reason = "duplicate"
+            if reason:
+                # Skip malformed questions rather than guessing a fix; the next round replaces them.
+                logging.warning("%s MCQ rejected (%s): %s", content_type, reason, q, extra=log_setup.PAYLOAD)
+                metrics.inc("eduro_mcq_rejected_total", content_type=content_type, reason=reason)
+                if isinstance(q, dict) and isinstance(q.get("question_text"), str) and q["question_text"].strip():
+                    rejected_texts.append(q["question_text"])
+                continue
+            seen.add(_normalized_question(q))
+            accepted.append(q)
+
+        if len(accepted) >= num_questions:
+            break
+        elapsed = time.monotonic() - started
+        # The next round asks for fewer questions, so this round's cost is a safe estimate of it.
+        next_seconds = time.monotonic() - round_started
+        if (round_number == TOPUP_MAX_ROUNDS or elapsed + next_seconds > TOPUP_BUDGET_SECONDS
+                or tokens_spent + round_tokens > TOPUP_BUDGET_TOKENS):
+            logging.warning("Top-up stopped for %s after %s round(s), %.1fs, %s tokens: %s/%s valid MCQs",
+                            content_type, round_number + 1, elapsed, tokens_spent, len(accepted), num_questions)
+            break
+        metrics.inc("eduro_mcq_topup_rounds_total", content_type=content_type)
+        logging.info("Topping up %s missing %s MCQ(s) (round %s)", num_questions - len(accepted), content_type, round_number + 2)
+
+    if accepted:
+        metrics.inc("eduro_mcq_delivered_total", len(accepted), content_type=content_type)
+    else:
+        metrics.inc("eduro_llm_generations_discarded_total", content_type=content_type)
+    return [dict(q, id=f"q{i + 1}") for i, q in enumerate(accepted)]
+
+MCQ_PROMPT_TEMPLATE = """
     You are an AI assistant tasked with creating educational multiple-choice questions (MCQs).
     Generate exactly {num_questions} MCQs for the topic: "{topic}".
 
@@ -118,93 +440,107 @@ def generate_mcqs(topic, num_questions=3):
 
     Ensure the JSON is well-formed and directly parsable.
     """
+
+# Routed to the lite tier with the MCQ response schema, which already fixes the JSON shape.
+MCQ_COMPACT_PROMPT_TEMPLATE = """
+    Generate exactly {num_questions} MCQs for a beginner student on the topic: "{topic}".
+    Each has an "id" ("q1" to "q{num_questions}"), a "question_text", exactly 4 distinct "options",
+    and a "correct_answer" copied exactly from its options. Reply with the JSON array only.
+    """
+
+MCQ_PROMPT_TEMPLATES = {"full": MCQ_PROMPT_TEMPLATE, "compact": MCQ_COMPACT_PROMPT_TEMPLATE}
+
+def generate_mcqs(topic, num_questions=3, allow_degraded=True, avoid=()):
+    """
+    Generates num_questions validated MCQs for topic. Returns a (possibly shorter) list, or []
+    on failure. With allow_degraded, placeholder MCQs are returned while Gemini is unavailable;
+    background callers that store the result (e.g. the MCQ pool) should pass False.
+    avoid lists question texts the new questions must not repeat.
+    """
+    if not model:
+        logging.error("generate_mcqs: Model not initialized.")
+        return []
+
+    logging.info("[GEMINI API] Attempting to generate %s MCQs for topic: %s", num_questions, topic)
+    template = MCQ_PROMPT_TEMPLATES[_prompt_variant("mcqs")]
+    def build_prompt(missing, avoid_texts):
+        return _with_avoid_list(template.format(num_questions=missing, topic=topic), list(avoid) + avoid_texts)
+
     try:
-        # If your model reliably supports response_mime_type="application/json"
-        # response = model.generate_content(prompt, generation_config={"response_mime_type": "application/json"})
-        # Otherwise, generate text and parse
-        response = model.generate_content(prompt, generation_config=mcq_generation_config,  ) #config=url_grounding_config
-
-        logging.debug(f"[GEMINI RAW RESPONSE for MCQs]:\n{response.text}\n")
-
-        # Attempt to clean and parse JSON
-        json_text = _clean_json_from_text(response.text)
-        questions_data = json.loads(json_text)
-
-        # Basic validation
-        if not isinstance(questions_data, list) or len(questions_data) != num_questions:
-            logging.warning(f"MCQ generation: Expected {num_questions} questions in a list, got something else. Data: {questions_data}")
-            # Attempt to filter or fix if possible, or return error
-            if isinstance(questions_data, list): # If it's a list but wrong number
-                 logging.warning(f"Returning only {len(questions_data)} questions if valid.")
-            else: # Not a list at all
-                raise ValueError(f"Response was not a JSON list as expected. Raw: {response.text}")
-
-
-        valid_questions = []
-        for i, q in enumerate(questions_data):
-            if not all(key in q for key in ["id", "question_text", "options", "correct_answer"]):
-                logging.warning(f"MCQ {i+1} is missing required keys: {q}")
-                continue
-            if not isinstance(q.get("options"), list) or len(q["options"]) != 4:
-                logging.warning(f"MCQ {q.get('id', i+1)} has invalid options: {q.get('options')}")
-                continue
-            if q.get("correct_answer") not in q.get("options", []):
-                logging.warning(f"MCQ {q.get('id', i+1)}: Correct answer '{q.get('correct_answer')}' not in options {q.get('options')}. Trying to fix or skipping.")
-                # You might try to pick the first option as a default, or skip this question
-                continue # Skip malformed question for now
-            valid_questions.append(q)
-        
+        # mcq_generation_config requests schema-constrained JSON when STRUCTURED_OUTPUT is on.
+        valid_questions = _generate_valid_mcqs(build_prompt, num_questions, mcq_generation_config, "mcqs")
         if not valid_questions:
             logging.error("No valid MCQs could be parsed from Gemini's response.")
             return []
-            
-        logging.info(f"Successfully generated and parsed {len(valid_questions)} MCQs.")
+        if len(valid_questions) < num_questions:
+            logging.warning("MCQ generation: Expected %s questions, returning the %s valid ones.", num_questions, len(valid_questions))
+        logging.info("Successfully generated and parsed %s MCQs.", len(valid_questions))
+        question_bank.record(valid_questions, topic)
         return valid_questions
 
-    except json.JSONDecodeError as e:
-        logging.error(f"Failed to decode JSON from Gemini for MCQs: {e}. Response text: {response.text if 'response' in locals() else 'No response object'}")
-        return []
     except (AttributeError, ValueError, TypeError) as e:
-        logging.error(f"Error processing Gemini response for MCQs: {e}. Response text: {response.text if 'response' in locals() else 'No response object'}")
+        logging.error("Error processing Gemini response for MCQs: %s", e)
         return []
     except Exception as e: # Catch other Gemini API errors (rate limits, content filtering, etc.)
-        logging.error(f"An unexpected error occurred with Gemini API for MCQs: {e}")
-        if hasattr(response, 'prompt_feedback') and response.prompt_feedback:
-             logging.error(f"Prompt Feedback: {response.prompt_feedback}")
+        if _should_degrade(e):
+            if allow_degraded:
+                return _serve_degraded("MCQs", e, mock_gemini.generate_mcqs_mock, topic, num_questions)
+            logging.warning("Gemini unavailable for MCQs (%s: %s)", type(e).__name__, e)
+            return []
+        logging.error("An unexpected error occurred with Gemini API for MCQs: %s", e)
         return []
 
 
+def _packed(content_type_log_name, topic, section_title=""):
+    """Pre-generated content from the content pack (no LLM call), or None."""
+    value = content_pack.lookup(content_type_log_name, topic, section_title)
+    if value is not None:
+        logging.info("[CONTENT PACK] Serving pre-generated %s for: %s - %s", content_type_log_name, topic, section_title)
+    return value
+
 def generate_text_content(prompt_template, topic, section_title, content_type_log_name):
+    packed = _packed(content_type_log_name, topic, section_title)
+    if packed is not None:
+        return packed
+    prompt = compact_prompt(prompt_template.format(topic=topic, section_title=section_title))
+    model_name, generation_config = _route(content_type_log_name, text_generation_config)
+    cache_key = content_cache.make_key(model_name, PROMPT_VERSION, content_type_log_name, prompt, generation_config)
+    cached = content_cache.get(cache_key)
+    if cached is not None:
+        logging.info("[CONTENT CACHE] Serving cached %s for: %s - %s", content_type_log_name, topic, section_title)
+        return cached
+
     if not model:
-        logging.error(f"generate_{content_type_log_name}: Model not initialized.")
+        logging.error("generate_%s: Model not initialized.", content_type_log_name)
         return f"[Error: AI Model not available for {content_type_log_name}]"
 
-    logging.info(f"[GEMINI API] Generating {content_type_log_name} for: {topic} - {section_title}")
-    prompt = prompt_template.format(topic=topic, section_title=section_title)
+    logging.info("[GEMINI API] Generating %s for: %s - %s", content_type_log_name, topic, section_title)
 
     try:
-        response = model.generate_content(prompt, generation_config=text_generation_config) #config=url_grounding_config
+        response = _send(content_type_log_name, model_name, prompt, generation_config) #config=url_grounding_config
         if response.text:
-            logging.info(f"Successfully generated {content_type_log_name}.")
-            return response.text.strip()
+            logging.info("Successfully generated %s.", content_type_log_name)
+            text = response.text.strip()
+            content_cache.put(cache_key, text)
+            return text
         else:
             # Check for blocking reasons if response.text is empty
             if hasattr(response, 'prompt_feedback') and response.prompt_feedback:
-                logging.warning(f"{content_type_log_name} generation might be blocked. Feedback: {response.prompt_feedback}")
+                logging.warning("%s generation might be blocked. Feedback: %s", content_type_log_name, response.prompt_feedback)
                 if response.prompt_feedback.block_reason:
                     return f"[AI content generation blocked: {response.prompt_feedback.block_reason_message or response.prompt_feedback.block_reason}]"
-            logging.warning(f"Gemini returned an empty response for {content_type_log_name}.")
+            logging.warning("Gemini returned an empty response for %s.", content_type_log_name)
             return f"[AI Error: No content generated for {content_type_log_name}]"
 
     except Exception as e:
-        logging.error(f"An unexpected error occurred with Gemini API for {content_type_log_name}: {e}")
-        if hasattr(response, 'prompt_feedback') and response.prompt_feedback:
-             logging.error(f"Prompt Feedback: {response.prompt_feedback}")
+        if _should_degrade(e) and content_type_log_name in _MOCK_TEXT_GENERATORS:
+            return _serve_degraded(content_type_log_name, e, _MOCK_TEXT_GENERATORS[content_type_log_name], topic, section_title)
+        logging.error("An unexpected error occurred with Gemini API for %s: %s", content_type_log_name, e)
+        if 'response' in locals() and hasattr(response, 'prompt_feedback') and response.prompt_feedback:
+             logging.error("Prompt Feedback: %s", response.prompt_feedback)
         return f"[AI Error: Could not generate {content_type_log_name} - {e}]"
 
-def generate_explanation(topic, section_title):
-    topic_url = "https://ncert.nic.in/textbook/pdf/jemh104.pdf"
-    prompt_template = """
+EXPLANATION_PROMPT_TEMPLATE = """
     You are an AI Educational Tutor.
     Provide a clear and concise explanation for the section titled "{section_title}" within the broader topic of "{topic}".
     The explanation should be suitable for a beginner student.
@@ -213,11 +549,8 @@ def generate_explanation(topic, section_title):
     Do not include any preamble like "Okay, here's an explanation..." or "Sure, I can help with that...".
     Just provide the explanation text directly.
     """
-    return generate_text_content(prompt_template, topic, section_title, "explanation")
 
-def generate_solved_example(topic, section_title):
-    topic_url = "https://ncert.nic.in/textbook/pdf/jemh104.pdf"
-    prompt_template = """
+SOLVED_EXAMPLE_PROMPT_TEMPLATE = """
     You are an AI Educational Tutor.
     Create a relevant solved example for the section titled "{section_title}" within the topic of "{topic}".
     The example should clearly demonstrate the application of concepts from this section.
@@ -226,11 +559,145 @@ def generate_solved_example(topic, section_title):
     Do not include any preamble like "Okay, here's a solved example..." or "Sure, I can help with that...".
     Begin the problem statement with "Problem:" and the solution with "Solution:".
     """#you can use the {topic_url} to get the context of the topic and the section title.
-    return generate_text_content(prompt_template, topic, section_title, "solved example")
 
-def generate_problem(topic, section_title):
+# Text content types served by /api/learning-content, mapped to (prompt template, log name).
+TEXT_CONTENT_TYPES = {
+    "explanation": (EXPLANATION_PROMPT_TEMPLATE, "explanation"),
+    "example": (SOLVED_EXAMPLE_PROMPT_TEMPLATE, "solved example"),
+}
+
+def generate_explanation(topic, section_title):
     topic_url = "https://ncert.nic.in/textbook/pdf/jemh104.pdf"
-    prompt_template = f"""
+    return generate_text_content(EXPLANATION_PROMPT_TEMPLATE, topic, section_title, "explanation")
+
+def generate_solved_example(topic, section_title):
+    topic_url = "https://ncert.nic.in/textbook/pdf/jemh104.pdf"
+    return generate_text_content(SOLVED_EXAMPLE_PROMPT_TEMPLATE, topic, section_title, "solved example")
+
+def _block_reason(response_or_chunk):
+    """Returns a human-readable block reason if Gemini blocked the prompt or the candidate, else None."""
+    feedback = getattr(response_or_chunk, 'prompt_feedback', None)
+    if feedback and getattr(feedback, 'block_reason', None):
+        return getattr(feedback, 'block_reason_message', None) or str(feedback.block_reason)
+    for candidate in getattr(response_or_chunk, 'candidates', None) or []:
+        finish_reason = getattr(candidate, 'finish_reason', None)
+        if finish_reason is not None and getattr(finish_reason, 'name', str(finish_reason)) in ("SAFETY", "BLOCKLIST", "PROHIBITED_CONTENT", "SPII"):
+            return f"finish reason {getattr(finish_reason, 'name', finish_reason)}"
+    return None
+
+def stream_text_content(content_type, topic, section_title):
+    """
+    Streaming variant of generate_text_content for the content types in TEXT_CONTENT_TYPES.
+    Yields ("chunk", text) events as Gemini produces them, then exactly one terminal event:
+    ("done", full_text) or ("error", sentinel) where sentinel uses the same "[AI Error: ..." /
+    "[AI content generation blocked: ..." strings as the non-streaming path.
+    A completed stream populates the content cache under the same key as generate_text_content.
+    """
+    prompt_template, content_type_log_name = TEXT_CONTENT_TYPES[content_type]
+    packed = _packed(content_type_log_name, topic, section_title)
+    if packed is not None:
+        yield ("chunk", packed)
+        yield ("done", packed)
+        return
+    prompt = compact_prompt(prompt_template.format(topic=topic, section_title=section_title))
+    model_name, generation_config = _route(content_type_log_name, text_generation_config)
+    cache_key = content_cache.make_key(model_name, PROMPT_VERSION, content_type_log_name, prompt, generation_config)
+    cached = content_cache.get(cache_key)
+    if cached is not None:
+        logging.info("[CONTENT CACHE] Serving cached %s for: %s - %s", content_type_log_name, topic, section_title)
+        yield ("chunk", cached)
+        yield ("done", cached)
+        return
+
+    if not model:
+        logging.error("stream_%s: Model not initialized.", content_type_log_name)
+        yield ("error", f"[Error: AI Model not available for {content_type_log_name}]")
+        return
+
+    logging.info("[GEMINI API] Streaming %s for: %s - %s", content_type_log_name, topic, section_title)
+    reservation = None
+    try:
+        reservation = token_budget.reserve(llm_gateway.estimate_tokens(prompt, generation_config), content_type_log_name)
+        llm_gateway.admit_sync(prompt, generation_config)
+    except llm_gateway.LLMUnavailableError as e:
+        token_budget.release(reservation)
+        fallback = _serve_degraded(content_type_log_name, e, _MOCK_TEXT_GENERATORS[content_type_log_name], topic, section_title)
+        yield ("chunk", fallback)
+        yield ("done", fallback)
+        return
+
+    parts = []
+    chunk = None
+    started = time.monotonic()
+    reported = False
+
+    def report(error=None, usage_chunk=None):
+        # The stream's one report to the breaker, the call metrics and the budgets, however it ends.
+        nonlocal reported
+        if reported:
+            return
+        reported = True
+        llm_gateway.record_call(content_type_log_name, time.monotonic() - started, error)
+        if error is None:
+            llm_gateway.record_outcome()
+        elif isinstance(error, Exception):
+            llm_gateway.record_outcome(error)
+        else:
+            llm_gateway.release_admission()  # abandoned, e.g. GeneratorExit: no verdict on Gemini's health
+        if usage_chunk is None:
+            token_budget.release(reservation)
+        else:
+            # The final chunk carries the usage totals for the whole stream.
+            llm_gateway.record_usage(usage_chunk, content_type=content_type_log_name)
+            token_budget.settle(reservation, model_name, content_type_log_name, token_budget.usage_of(usage_chunk))
+
+    try:
+        # Streams go straight to the SDK rather than through llm_gateway: chunks have to be
+        # forwarded as they arrive, and a stream cannot be shared between callers.
+        # They are still admitted and reported to the circuit breaker, but not retried.
+        response = _backend(model_name).generate_content(prompt, generation_config=generation_config, stream=True)
+        for chunk in response:
+            blocked = _block_reason(chunk)
+            if blocked:
+                logging.warning("%s stream blocked after %s chunks: %s", content_type_log_name, len(parts), blocked)
+                report(usage_chunk=chunk)
+                yield ("error", f"[AI content generation blocked: {blocked}]")
+                return
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunks without text parts (e.g. a final chunk carrying only metadata).
+                continue
+            if text:
+                parts.append(text)
+                yield ("chunk", text)
+    except Exception as e:
+        report(e)
+        if not parts and _should_degrade(e):
+            fallback = _serve_degraded(content_type_log_name, e, _MOCK_TEXT_GENERATORS[content_type_log_name], topic, section_title)
+            yield ("chunk", fallback)
+            yield ("done", fallback)
+            return
+        logging.error("An unexpected error occurred while streaming %s: %s", content_type_log_name, e)
+        yield ("error", f"[AI Error: Could not generate {content_type_log_name} - {e}]")
+        return
+    except BaseException as e:
+        # GeneratorExit at a yield: the client disconnected and Flask closed the stream.
+        # Tokens already generated stay charged.
+        report(e, chunk if parts else None)
+        raise
+
+    report(usage_chunk=chunk)
+    full_text = "".join(parts).strip()
+    if not full_text:
+        logging.warning("Gemini returned an empty stream for %s.", content_type_log_name)
+        yield ("error", f"[AI Error: No content generated for {content_type_log_name}]")
+        return
+    content_cache.put(cache_key, full_text)
+    logging.info("Successfully streamed %s (%s chunks).", content_type_log_name, len(parts))
+    yield ("done", full_text)
+
+PROBLEM_PROMPT_TEMPLATE = """
     You are an AI assistant tasked with creating educational multiple-choice questions (MCQs).
     Generate exactly 1 MCQ for the topic: "{topic}" and the section: "{section_title}".
 
@@ -253,34 +720,195 @@ def generate_problem(topic, section_title):
 
     Ensure the JSON is well-formed and directly parsable.
     """
+
+PROBLEM_COMPACT_PROMPT_TEMPLATE = """
+    Generate exactly 1 MCQ testing the section: "{section_title}" of the topic: "{topic}".
+    It has "id" "q1", a "question_text", exactly 4 distinct "options", and a "correct_answer"
+    copied exactly from its options. Reply with a JSON array holding the one question.
+    """
+
+PROBLEM_PROMPT_TEMPLATES = {"full": PROBLEM_PROMPT_TEMPLATE, "compact": PROBLEM_COMPACT_PROMPT_TEMPLATE}
+
+def generate_problem(topic, section_title):
+    topic_url = "https://ncert.nic.in/textbook/pdf/jemh104.pdf"
+    packed = _packed("problem", topic, section_title)
+    if packed is not None:
+        return packed
+    prompt_template = compact_prompt(PROBLEM_PROMPT_TEMPLATES[_prompt_variant("problem")].format(topic=topic, section_title=section_title))
+    model_name, generation_config = _route("problem", problem_generation_config)
+    cache_key = content_cache.make_key(model_name, PROMPT_VERSION, "problem", prompt_template, generation_config)
+    cached = content_cache.get(cache_key)
+    if cached is not None:
+        logging.info("[CONTENT CACHE] Serving cached problem for: %s - %s", topic, section_title)
+        return cached
+
+    if not model:
+        logging.error("generate_problem: Model not initialized.")
+        return None
+
     try:
-        response = model.generate_content(prompt_template, generation_config=text_generation_config)
-        logging.debug(f"[GEMINI RAW RESPONSE for Problem]:\n{response.text}\n")
-        json_text = _clean_json_from_text(response.text)
-        questions_data = json.loads(json_text)
-        # Should be a list with one MCQ
-        if not isinstance(questions_data, list) or len(questions_data) != 1:
-            logging.warning(f"Problem generation: Expected 1 question in a list, got: {questions_data}")
-            return None
-        q = questions_data[0]
-        if not all(key in q for key in ["id", "question_text", "options", "correct_answer"]):
-            logging.warning(f"Generated problem is missing required keys: {q}")
-            return None
-        if not isinstance(q.get("options"), list) or len(q["options"]) != 4:
-            logging.warning(f"Generated problem has invalid options: {q.get('options')}")
+        # Same validate-and-top-up loop as generate_mcqs, for a single question.
+        questions = _generate_valid_mcqs(lambda missing, avoid_texts: _with_avoid_list(prompt_template, avoid_texts), 1,
+                                         problem_generation_config, "problem")
+        if not questions:
+            logging.error("No valid problem MCQ could be generated for %s - %s", topic, section_title)
             return None
-        if q.get("correct_answer") not in q.get("options", []):
-            logging.warning(f"Generated problem: Correct answer '{q.get('correct_answer')}' not in options {q.get('options')}")
-            return None
-        logging.info(f"Successfully generated and parsed MCQ problem for section.")
-
+        q = questions[0]
+        logging.info("Successfully generated and parsed MCQ problem for section.")
+        content_cache.put(cache_key, q)
+        question_bank.record([q], topic, section_title)
         return q
     except Exception as e:
-        logging.error(f"Error generating or parsing MCQ problem: {e}")
-        if 'response' in locals() and hasattr(response, 'prompt_feedback') and response.prompt_feedback:
-            logging.error(f"Prompt Feedback: {response.prompt_feedback}")
+        if _should_degrade(e):
+            return _serve_degraded("problem", e, mock_gemini.generate_problem_mock, topic, section_title)
+        logging.error("Error generating or parsing MCQ problem: %s", e)
         return None
 
+LESSON_BUNDLE_PROMPT_TEMPLATE = """
+    You are an AI Educational Tutor preparing a complete lesson on the topic "{topic}" for a beginner student.
+    The lesson has these sections, in order: {section_list}
+
+    For EACH section, write:
+    1.  "explanation": a clear and concise explanation of the section, focusing on key concepts, definitions
+        and why the section matters. Keep the language simple and engaging.
+    2.  "solved_example": a relevant solved example. Begin the problem statement with "Problem:" and the
+        step-by-step solution with "Solution:".
+    3.  "problem": one multiple-choice question testing the section, with a "id" string ("q1"), the
+        "question_text" (string), a list of exactly 4 "options" (strings) and the "correct_answer"
+        (string, which MUST be one of the options).
+
+    Do not include any preamble like "Okay, here's..." in any field.
+    Your entire response MUST be a single, valid JSON object of this form, with one entry per section in the same order:
+    {{
+        "sections": [
+            {{
+                "section_title": "<section title exactly as given>",
+                "explanation": "...",
+                "solved_example": "...",
+                "problem": {{"id": "q1", "question_text": "...", "options": ["...", "...", "...", "..."], "correct_answer": "..."}}
+            }}
+        ]
+    }}
+
+    Ensure the JSON is well-formed and directly parsable.
+    """
+
+def _text_part_ok(text):
+    return isinstance(text, str) and bool(text.strip()) and not text.startswith(content_cache.ERROR_PREFIXES)
+
+def _lesson_bundle_request(topic, sections):
+    """(model name, prompt, generation config) of the lesson bundle call for topic."""
+    prompt = compact_prompt(LESSON_BUNDLE_PROMPT_TEMPLATE.format(topic=topic, section_list=json.dumps(sections)))
+    model_name, generation_config = _route("lesson bundle", text_generation_config, len(sections))
+    return model_name, prompt, generation_config
+
+def _request_lesson_bundle(topic, sections):
+    """
+    One structured-JSON call for every section of a topic. Returns a dict keyed by
+    section title holding whatever parts came back (possibly none), never raises.
+    """
+    if not model:
+        logging.error("generate_lesson_bundle: Model not initialized.")
+        return {}
+
+    model_name, prompt, generation_config = _lesson_bundle_request(topic, sections)
+    logging.info("[GEMINI API] Generating lesson bundle for topic: %s (%s sections)", topic, len(sections))
+    try:
+        response = _send("lesson bundle", model_name, prompt, generation_config, validate=_json_response_ok)
+        logging.debug("[GEMINI RAW RESPONSE for Lesson Bundle]:\n%s\n", response.text, extra=log_setup.PAYLOAD)
+        bundle_data = json.loads(_clean_json_from_text(response.text))
+        entries = bundle_data.get("sections") if isinstance(bundle_data, dict) else None
+        if not isinstance(entries, list):
+            raise ValueError("Response did not contain a 'sections' list")
+    except Exception as e:
+        if isinstance(e, ValueError):  # Includes json.JSONDecodeError.
+            metrics.inc("eduro_llm_parse_failures_total", content_type="lesson bundle")
+        logging.error("Error generating or parsing lesson bundle for %s: %s", topic, e)
+        if 'response' in locals() and hasattr(response, 'prompt_feedback') and response.prompt_feedback:
+            logging.error("Prompt Feedback: %s", response.prompt_feedback)
+        return {}
+
+    parts_by_section = {}
+    for index, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            continue
+        # Prefer the echoed title; fall back to position when the model paraphrased it.
+        title = entry.get("section_title")
+        if title not in sections and index < len(sections):
+            title = sections[index]
+        if title in sections and title not in parts_by_section:
+            parts_by_section[title] = entry
+    return parts_by_section
+
+def generate_lesson_bundle(topic, sections):
+    """
+    Generates the explanation, solved example and problem MCQ for every section in one call.
+    Each part is validated with the same rules as the per-step generators; only the parts
+    that fail are regenerated individually. Returns a list of
+    {"section_title", "explanation", "example", "problem"} dicts in section order, with
+    "problem" set to None when even the regeneration failed. The assembled bundle is cached.
+    """
+    packed = [
+        {
+            "section_title": title,
+            "explanation": content_pack.lookup("explanation", topic, title),
+            "example": content_pack.lookup("solved example", topic, title),
+            "problem": content_pack.lookup("problem", topic, title),
+        }
+        for title in sections
+    ]
+    if all(item["explanation"] and item["example"] and item["problem"] for item in packed):
+        logging.info("[CONTENT PACK] Serving pre-generated lesson bundle for: %s", topic)
+        return packed
+    model_name, prompt, generation_config = _lesson_bundle_request(topic, sections)
+    cache_key = content_cache.make_key(model_name, PROMPT_VERSION, "lesson bundle", prompt, generation_config)
+    cached = content_cache.get(cache_key)
+    if cached is not None:
+        logging.info("[CONTENT CACHE] Serving cached lesson bundle for: %s", topic)
+        return cached
+
+    degraded_before = _degraded_total()
+    parts_by_section = _request_lesson_bundle(topic, sections)
+
+    lesson = []
+    repairs = []  # (section index, lesson field, regeneration function)
+    for index, title in enumerate(sections):
+        entry = parts_by_section.get(title, {})
+        item = {
+            "section_title": title,
+            "explanation": entry.get("explanation"),
+            "example": entry.get("solved_example"),
+            "problem": entry.get("problem"),
+        }
+        if not _text_part_ok(item["explanation"]):
+            repairs.append((index, "explanation", generate_explanation))
+        if not _text_part_ok(item["example"]):
+            repairs.append((index, "example", generate_solved_example))
+        reason = _mcq_rejection_reason(item["problem"])
+        if reason:
+            logging.warning("Lesson bundle problem for '%s' rejected (%s)", title, reason)
+            metrics.inc("eduro_mcq_rejected_total", content_type="lesson bundle", reason=reason)
+            repairs.append((index, "problem", generate_problem))
+        else:
+            item["problem"] = dict(item["problem"], id="q1")
+        lesson.append(item)
+
+    if repairs:
+        logging.info("Lesson bundle for %s: regenerating %s failed part(s) individually", topic, len(repairs))
+        with ThreadPoolExecutor(max_workers=min(len(repairs), 4)) as pool:
+            futures = [(index, field, pool.submit(token_budget.bind(regenerate), topic, sections[index])) for index, field, regenerate in repairs]
+            for index, field, future in futures:
+                lesson[index][field] = future.result()
+
+    complete = all(
+        _text_part_ok(item["explanation"]) and _text_part_ok(item["example"]) and item["problem"]
+        for item in lesson
+    )
+    # Do not cache a bundle that may contain offline placeholder parts.
+    if complete and _degraded_total() == degraded_before:
+        content_cache.put(cache_key, lesson)
+    return lesson
+
 # Optional: If you want to implement evaluation of free-text answers later
 # def evaluate_user_problem_answer(topic, section_title, problem_statement, user_answer):
 #     logging.info(f"[GEMINI API] Evaluating user answer for: {topic} - {section_title}")
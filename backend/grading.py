@@ -0,0 +1,141 @@
+# backend/grading.py
+#
+# Batch grading for classroom use: many students' answer sheets for one quiz are
+# scored together. Each sheet is turned into a row of option indices (-1 for
+# unanswered or unknown answers), so the whole class is an int8 matrix of
+# students x questions. Scores, per-question difficulty and per-section mastery are
+# then a handful of NumPy array operations instead of a Python loop per student.
+# NumPy is imported on first use so it does not add to worker startup.
+
+import json
+import os
+
+# --- Configuration ---
+MASTERY_THRESHOLD = float(os.environ.get("GRADING_MASTERY_THRESHOLD", 0.8))  # section fraction correct that counts as mastered
+STREAM_CHUNK_STUDENTS = 500
+
+
+def _answer_pairs(answers):
+    """(question_id, selected_answer) pairs from [{"question_id", "selected_answer"}, ...] or {question_id: answer}."""
+    if isinstance(answers, dict):
+        return answers.items()
+    if isinstance(answers, list):
+        return ((a.get("question_id"), a.get("selected_answer")) for a in answers if isinstance(a, dict))
+    return ()
+
+
+def grade_batch(questions, submissions, sections):
+    """
+    Scores submissions ([{"student_id", "answers"}, ...]) against questions (MCQ dicts as the
+    students saw them). sections[j] labels question j for the per-section aggregates.
+    Returns a dict of NumPy arrays and labels for summary() / student_rows().
+    """
+    import numpy as np
+
+    column = {q["id"]: j for j, q in enumerate(questions)}
+    option_index = [{str(option).strip(): i for i, option in enumerate(q["options"])} for q in questions]
+    key = np.array([index.get(str(q["correct_answer"]).strip(), -2) for q, index in zip(questions, option_index)], dtype=np.int8)
+
+    # Parsing the sheets is the only per-answer Python work.
+    answers = np.full((len(submissions), len(questions)), -1, dtype=np.int8)
+    student_ids = []
+    for row, submission in enumerate(submissions):
+        submission = submission if isinstance(submission, dict) else {}
+        student_ids.append(submission.get("student_id", row))
+        for question_id, selected in _answer_pairs(submission.get("answers")):
+            j = column.get(question_id)
+            if j is not None and selected is not None:
+                answers[row, j] = option_index[j].get(str(selected).strip(), -1)
+
+    correct = answers == key                      # students x questions, bool
+    scores = correct.sum(axis=1)
+    answered = answers >= 0
+
+    # Discrimination: correlation between getting a question right and the rest of the score.
+    rest = scores[:, None] - correct
+    x = correct - correct.mean(axis=0)
+    y = rest - rest.mean(axis=0)
+    denominator = np.sqrt((x * x).sum(axis=0) * (y * y).sum(axis=0))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        discrimination = np.where(denominator > 0, (x * y).sum(axis=0) / denominator, np.nan)
+
+    section_labels = list(dict.fromkeys(sections))
+    membership = np.array([[label == section for section in section_labels] for label in sections], dtype=np.int32)
+    section_fraction = (correct.astype(np.int32) @ membership) / membership.sum(axis=0)
+
+    option_counts = [np.bincount(answers[answered[:, j], j], minlength=len(questions[j]["options"]))
+                     for j in range(len(questions))]
+    return {
+        "questions": questions,
+        "sections": sections,
+        "section_labels": section_labels,
+        "student_ids": student_ids,
+        "scores": scores,
+        "correct": correct,
+        "answered": answered,
+        "discrimination": discrimination,
+        "section_fraction": section_fraction,
+        "option_counts": option_counts,
+    }
+
+
+def _rounded(value):
+    return None if value != value else round(float(value), 4)  # NaN -> None
+
+
+def summary(result):
+    """Class-level statistics: score distribution, per-question difficulty, per-section mastery."""
+    import numpy as np
+
+    questions, scores = result["questions"], result["scores"]
+    students = len(scores)
+    question_stats = []
+    for j, q in enumerate(questions):
+        question_stats.append({
+            "question_id": q["id"],
+            "section": result["sections"][j],
+            "p_correct": _rounded(result["correct"][:, j].mean()) if students else None,
+            "answered": _rounded(result["answered"][:, j].mean()) if students else None,
+            "discrimination": _rounded(result["discrimination"][j]),
+            "option_counts": {option: int(count) for option, count in zip(q["options"], result["option_counts"][j])},
+        })
+    section_stats = []
+    for s, label in enumerate(result["section_labels"]):
+        fractions = result["section_fraction"][:, s]
+        section_stats.append({
+            "section": label,
+            "questions": result["sections"].count(label),
+            "mean_score": _rounded(fractions.mean()) if students else None,
+            "mastery_rate": _rounded((fractions >= MASTERY_THRESHOLD).mean()) if students else None,
+        })
+    return {
+        "students": students,
+        "questions": len(questions),
+        "mean_score": _rounded(scores.mean()) if students else None,
+        "median_score": _rounded(np.median(scores)) if students else None,
+        "all_correct": int((scores == len(questions)).sum()),
+        "question_stats": question_stats,
+        "section_stats": section_stats,
+        "mastery_threshold": MASTERY_THRESHOLD,
+    }
+
+
+def student_rows(result, start=0, stop=None):
+    """Per-student results: score and per-section fraction correct."""
+    total = len(result["questions"])
+    labels = result["section_labels"]
+    scores = result["scores"][start:stop].tolist()
+    fractions = result["section_fraction"][start:stop].round(4).tolist()
+    return [
+        {"student_id": student_id, "score": score, "total": total, "all_correct": score == total,
+         "sections": dict(zip(labels, section_fraction))}
+        for student_id, score, section_fraction in zip(result["student_ids"][start:stop], scores, fractions)
+    ]
+
+
+def iter_ndjson(result):
+    """Newline-delimited JSON: one "summary" line, then "students" lines of STREAM_CHUNK_STUDENTS each."""
+    yield json.dumps(dict(summary(result), type="summary")) + "\n"
+    for start in range(0, len(result["scores"]), STREAM_CHUNK_STUDENTS):
+        rows = student_rows(result, start, start + STREAM_CHUNK_STUDENTS)
+        yield json.dumps({"type": "students", "offset": start, "results": rows}) + "\n"
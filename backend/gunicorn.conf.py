@@ -0,0 +1,49 @@
+# backend/gunicorn.conf.py
+#
+# Production settings, picked up automatically by `cd backend && gunicorn app:app`.
+# Command-line flags override anything set here.
+#
+# The app itself is not preloaded: importing app.py starts background threads (MCQ
+# pool refill, metrics flusher, LLM warm-up) and opens SQLite connections, none of
+# which survive a fork. What is expensive about a worker boot is importing the Gemini
+# SDK (google.generativeai plus gRPC and protobuf, ~0.8s), and that import alone is
+# fork-safe: it starts no threads and opens no gRPC channel (channels are created on
+# the first API call, which only ever happens in a worker). So the master imports the
+# SDK once and every worker inherits it, copy-on-write. pre_fork re-checks both
+# conditions before each fork and logs an error if either stops holding.
+
+import os
+import sys
+import threading
+import time
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5001')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))  # long enough for a streamed explanation
+
+PRELOAD_SDK = (os.environ.get("LLM_PRELOAD_SDK", "1") != "0"
+               and (os.environ.get("LLM_BACKEND") or "gemini").lower() == "gemini")
+
+
+def _sdk_clients():
+    """The SDK's cached API clients (empty until the first call), or None if it is not loaded."""
+    client = sys.modules.get("google.generativeai.client")
+    manager = getattr(client, "_client_manager", None)
+    return getattr(manager, "clients", None)
+
+
+def on_starting(server):
+    if PRELOAD_SDK:
+        started = time.perf_counter()
+        import google.generativeai  # noqa: F401
+        server.log.info(f"Preloaded google.generativeai in the master ({time.perf_counter() - started:.2f}s)")
+
+
+def pre_fork(server, worker):
+    if not PRELOAD_SDK:
+        return
+    if threading.active_count() > 1 or _sdk_clients():
+        server.log.error("Master is no longer fork-safe (threads or SDK clients exist); "
+                         "set LLM_PRELOAD_SDK=0 to stop preloading the SDK")
@@ -0,0 +1,263 @@
+# backend/llm_backend.py
+#
+# Pluggable text-generation backends. gemini_interaction talks to whichever backend
+# is configured through the same two calls the Gemini SDK model exposes:
+#
+#   generate_content(prompt, generation_config=None, stream=False)
+#   await generate_content_async(prompt, generation_config=None)
+#
+# Responses (and stream chunks) expose .text, .prompt_feedback, .candidates and
+# .usage_metadata like the SDK's. Select a backend with LLM_BACKEND=gemini|local.
+#
+# Creating a backend is cheap: the Gemini SDK (google.generativeai and its gRPC and
+# protobuf dependencies, most of a worker's import time) is imported on the first
+# call or on warm_up(), not when the app module is imported.
+
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+
+class LLMBackend:
+    """Interface implemented by every backend."""
+
+    name = None
+    model_name = None
+
+    @property
+    def ready(self):
+        """True once the backend can serve a call without further initialization."""
+        return True
+
+    def warm_up(self):
+        """Does any deferred initialization now (e.g. in a background thread at worker start)."""
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        raise NotImplementedError
+
+    async def generate_content_async(self, prompt, generation_config=None):
+        raise NotImplementedError
+
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini through the google-generativeai SDK."""
+
+    name = "gemini"
+
+    def __init__(self, model_name, safety_settings=None, api_key=None):
+        self._api_key = api_key or os.environ.get("GOOGLE_API_KEY")
+        if not self._api_key:
+            raise RuntimeError(
+                "GOOGLE_API_KEY environment variable not set. Example: export GOOGLE_API_KEY='your_api_key_here'"
+            )
+        self.model_name = model_name
+        self._safety_settings = safety_settings
+        self._model = None
+        self._load_lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self._model is not None
+
+    def warm_up(self):
+        self._get_model()
+
+    def _get_model(self):
+        model = self._model
+        if model is not None:
+            return model
+        with self._load_lock:
+            if self._model is None:
+                started = time.perf_counter()
+                import google.generativeai as genai
+
+                genai.configure(api_key=self._api_key)
+                self._model = genai.GenerativeModel(self.model_name, safety_settings=self._safety_settings)
+                logging.info("Gemini model '%s' initialized (%.2fs).", self.model_name, time.perf_counter() - started)
+            return self._model
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        return self._get_model().generate_content(prompt, generation_config=generation_config, stream=stream)
+
+    async def generate_content_async(self, prompt, generation_config=None):
+        return await self._get_model().generate_content_async(prompt, generation_config=generation_config)
+
+
+class LocalBackendError(Exception):
+    """Simulated transient upstream failure (classified as retryable via its 503 code)."""
+
+    code = 503
+
+
+class LocalBackend(LLMBackend):
+    """
+    Offline stand-in for load testing: produces well-formed MCQ JSON, lesson bundles and
+    lesson text after a simulated latency, and optionally malformed output or errors.
+
+    Configuration (environment):
+      LOCAL_LLM_LATENCY_DIST     fixed | uniform | exponential | lognormal (default)
+      LOCAL_LLM_LATENCY_MEDIAN   median latency in seconds (default 1.0)
+      LOCAL_LLM_LATENCY_SIGMA    spread: lognormal sigma, or +/- fraction for uniform (default 0.5)
+      LOCAL_LLM_TTFT             seconds to the first streamed chunk (default 0.3)
+      LOCAL_LLM_MALFORMED_RATE   fraction of JSON responses that are malformed (default 0)
+      LOCAL_LLM_ERROR_RATE       fraction of calls that raise LocalBackendError (default 0)
+      LOCAL_LLM_SEED             seed for reproducible runs
+    """
+
+    name = "local"
+
+    def __init__(self, model_name="local-stand-in"):
+        self.model_name = model_name
+        self.latency_dist = os.environ.get("LOCAL_LLM_LATENCY_DIST", "lognormal")
+        self.latency_median = float(os.environ.get("LOCAL_LLM_LATENCY_MEDIAN", 1.0))
+        self.latency_sigma = float(os.environ.get("LOCAL_LLM_LATENCY_SIGMA", 0.5))
+        self.ttft = float(os.environ.get("LOCAL_LLM_TTFT", 0.3))
+        self.malformed_rate = float(os.environ.get("LOCAL_LLM_MALFORMED_RATE", 0.0))
+        self.error_rate = float(os.environ.get("LOCAL_LLM_ERROR_RATE", 0.0))
+        seed = os.environ.get("LOCAL_LLM_SEED")
+        self._random = random.Random(int(seed) if seed else None)
+        logging.info(
+            "Local LLM stand-in initialized (%s, median %ss, malformed %.0f%%, errors %.0f%%).",
+            self.latency_dist, self.latency_median, self.malformed_rate * 100, self.error_rate * 100
+        )
+
+    # --- Latency and failure simulation ---
+
+    def sample_latency(self):
+        median, sigma = self.latency_median, self.latency_sigma
+        if self.latency_dist == "fixed":
+            return median
+        if self.latency_dist == "uniform":
+            return self._random.uniform(median * (1 - sigma), median * (1 + sigma))
+        if self.latency_dist == "exponential":
+            return self._random.expovariate(math.log(2) / median) if median > 0 else 0.0
+        return self._random.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+
+    def _maybe_fail(self):
+        if self.error_rate and self._random.random() < self.error_rate:
+            raise LocalBackendError("Simulated upstream failure")
+
+    # --- Content ---
+
+    def _render(self, prompt, generation_config=None):
+        """Returns the response text a real model would plausibly produce for prompt."""
+        json_mode = isinstance(generation_config, dict) and generation_config.get("response_mime_type") == "application/json"
+        topic_match = re.search(r'topic(?: of)?:? "([^"]*)"', prompt)
+        topic = topic_match.group(1) if topic_match else "the topic"
+        section_match = re.search(r'section(?: titled)?:? "([^"]*)"', prompt)
+        section = section_match.group(1) if section_match else topic
+
+        if '"sections": [' in prompt:
+            titles_match = re.search(r"in order: (\[.*?\])\n", prompt)
+            titles = json.loads(titles_match.group(1)) if titles_match else [section]
+            bundle = {
+                "sections": [
+                    {
+                        "section_title": title,
+                        "explanation": self._explanation(topic, title),
+                        "solved_example": self._example(topic, title),
+                        "problem": self._mcq(topic, 1, title),
+                    }
+                    for title in titles
+                ]
+            }
+            return self._maybe_malform(json.dumps(bundle, indent=2), json_mode)
+
+        count_match = re.search(r"Generate exactly (\d+) MCQ", prompt)
+        if count_match:
+            count = int(count_match.group(1))
+            questions = [self._mcq(topic, i + 1, section) for i in range(count)]
+            return self._maybe_malform(json.dumps(questions, indent=2), json_mode)
+
+        if "solved example" in prompt:
+            return self._example(topic, section)
+        return self._explanation(topic, section)
+
+    def _mcq(self, topic, number, section):
+        a, b = self._random.randint(2, 20), self._random.randint(2, 20)
+        options = [str(a + b + delta) for delta in (-2, 0, 1, 3)]
+        self._random.shuffle(options)
+        return {
+            "id": f"q{number}",
+            "question_text": f"[{topic} / {section}] Practice question {self._random.randint(1, 10**6)}: what is {a} + {b}?",
+            "options": options,
+            "correct_answer": str(a + b),
+        }
+
+    def _explanation(self, topic, section):
+        sentence = (f"{section} is a key idea within {topic}. We start from the definitions, "
+                    f"look at why the idea matters, and connect it to what you already know. ")
+        return sentence * 8
+
+    def _example(self, topic, section):
+        return (f"Problem: Apply the ideas of {section} ({topic}) to find x when 2x + 3 = 11.\n"
+                "Solution:\n1. Subtract 3 from both sides: 2x = 8.\n2. Divide both sides by 2: x = 4.\n"
+                "So x = 4, which we can check by substituting back into the equation.")
+
+    def _maybe_malform(self, text, json_mode=False):
+        if not self.malformed_rate or self._random.random() >= self.malformed_rate:
+            return text
+        # Schema-constrained decoding (response_mime_type=application/json) rules out syntax
+        # defects; output can still be cut off at the token limit or be semantically wrong.
+        kinds = ("truncate", "answer") if json_mode else ("truncate", "comment", "fence", "answer")
+        kind = self._random.choice(kinds)
+        if kind == "truncate":
+            return text[: self._random.randint(len(text) // 3, len(text) - 2)]
+        if kind == "comment":
+            return text.replace("\n", "\n// generated\n", 1)
+        if kind == "fence":
+            return f"Here are your questions:\n```json\n{text}\n```\nLet me know if you need more."
+        return re.sub(r'"correct_answer": "[^"]*"', '"correct_answer": "none of these"', text, count=1)
+
+    def _response(self, prompt, text):
+        usage = SimpleNamespace(prompt_token_count=len(prompt) // 4, candidates_token_count=len(text) // 4)
+        return SimpleNamespace(text=text, prompt_feedback=None, candidates=[], usage_metadata=usage)
+
+    # --- Backend interface ---
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        if stream:
+            return self._stream(prompt)
+        time.sleep(self.sample_latency())
+        self._maybe_fail()
+        return self._response(prompt, self._render(prompt, generation_config))
+
+    async def generate_content_async(self, prompt, generation_config=None):
+        await asyncio.sleep(self.sample_latency())
+        self._maybe_fail()
+        return self._response(prompt, self._render(prompt, generation_config))
+
+    def _stream(self, prompt):
+        total = self.sample_latency()
+        time.sleep(min(self.ttft, total))
+        self._maybe_fail()
+        text = self._render(prompt)
+        pieces = [text[i:i + 80] for i in range(0, len(text), 80)] or [""]
+        per_piece = max(total - self.ttft, 0) / len(pieces)
+        for index, piece in enumerate(pieces):
+            if index:
+                time.sleep(per_piece)
+            chunk = self._response(prompt, piece)
+            # Like Gemini, only the final chunk carries the usage totals for the whole stream.
+            chunk.usage_metadata = self._response(prompt, text).usage_metadata if index == len(pieces) - 1 else None
+            yield chunk
+
+
+BACKENDS = {"gemini": GeminiBackend, "local": LocalBackend}
+
+
+def create_backend(name=None, model_name=None, safety_settings=None):
+    """Builds the backend named by name (default: LLM_BACKEND, else "gemini")."""
+    name = (name or os.environ.get("LLM_BACKEND") or "gemini").lower()
+    if name == "gemini":
+        return GeminiBackend(model_name, safety_settings=safety_settings)
+    if name == "local":
+        return LocalBackend(model_name or "local-stand-in")
+    raise ValueError(f"Unknown LLM_BACKEND '{name}' (expected one of: {', '.join(BACKENDS)})")
@@ -0,0 +1,549 @@
+# backend/llm_gateway.py
+#
+# Asyncio-based gateway in front of the Gemini SDK. All non-streaming generations
+# run as generate_content_async coroutines on one dedicated event loop per process,
+# so a Flask worker thread only blocks on a future instead of holding a connection.
+# The gateway enforces a global in-flight limit and coalesces identical concurrent
+# prompts (single-flight): the first caller makes the upstream call and every
+# caller waiting on the same prompt receives its result.
+#
+# Every upstream call is also admitted through requests-per-minute and
+# tokens-per-minute buckets, retried with jittered backoff on transient errors,
+# and guarded by a circuit breaker. While the breaker is open, calls fail fast
+# with CircuitOpenError so callers can serve degraded content instead of
+# blocking a worker on a request that is certain to fail.
+#
+# Callers wait at most their content type's deadline (LLM_DEADLINES). Student-facing
+# calls are also hedged: if a call is still outstanding after the HEDGE_PERCENTILE
+# latency of recent calls of its type, a backup request is sent, the first valid
+# response is used and the other call is cancelled. Backups are capped at
+# LLM_HEDGES_PER_MINUTE. Background work (pool refills, prefetch, pregeneration)
+# runs inside background() and is never hedged.
+
+import asyncio
+import contextlib
+import concurrent.futures
+import functools
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+
+import content_cache
+import metrics
+import resilience
+
+
+def _parse_deadlines(spec):
+    """"explanation=30,mcqs=45" -> {"explanation": 30.0, "mcqs": 45.0}"""
+    deadlines = {}
+    for item in spec.split(","):
+        content_type, _, seconds = item.partition("=")
+        if content_type.strip() and seconds.strip():
+            deadlines[content_type.strip()] = float(seconds)
+    return deadlines
+
+
+# --- Configuration ---
+MAX_IN_FLIGHT = int(os.environ.get("LLM_MAX_IN_FLIGHT", 16))             # concurrent upstream calls per process
+REQUEST_TIMEOUT_SECONDS = float(os.environ.get("LLM_REQUEST_TIMEOUT", 90))  # how long a caller waits for a result
+# Per-content-type overrides of LLM_REQUEST_TIMEOUT for the student-facing content types.
+DEADLINES = _parse_deadlines(os.environ.get("LLM_DEADLINES", "explanation=30,solved example=30,problem=30,mcqs=45"))
+HEDGE_PERCENTILE = float(os.environ.get("LLM_HEDGE_PERCENTILE", 95))       # recent latency percentile that triggers a backup
+HEDGE_MIN_DELAY_SECONDS = float(os.environ.get("LLM_HEDGE_MIN_DELAY", 1.0))
+HEDGE_MIN_SAMPLES = int(os.environ.get("LLM_HEDGE_MIN_SAMPLES", 20))        # no hedging until a content type has this many
+HEDGES_PER_MINUTE = float(os.environ.get("LLM_HEDGES_PER_MINUTE", 30))      # backup calls per process; 0 disables hedging
+LATENCY_WINDOW = 200                                                          # recent successful calls kept per content type
+# Quotas are enforced per worker process: divide the project quota by the number of workers. 0 disables a bucket.
+REQUESTS_PER_MINUTE = float(os.environ.get("GEMINI_RPM", 1000))
+TOKENS_PER_MINUTE = float(os.environ.get("GEMINI_TPM", 1000000))
+ADMISSION_MAX_WAIT_SECONDS = float(os.environ.get("GEMINI_ADMISSION_MAX_WAIT", 10))
+MAX_RETRIES = int(os.environ.get("GEMINI_MAX_RETRIES", 3))
+BACKOFF_BASE_SECONDS = float(os.environ.get("GEMINI_BACKOFF_BASE", 0.5))
+BACKOFF_CAP_SECONDS = float(os.environ.get("GEMINI_BACKOFF_CAP", 8))
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get("GEMINI_BREAKER_THRESHOLD", 5))
+BREAKER_COOLDOWN_SECONDS = float(os.environ.get("GEMINI_BREAKER_COOLDOWN", 30))
+# Output tokens assumed for admission when the generation config sets no max_output_tokens.
+DEFAULT_OUTPUT_TOKEN_ESTIMATE = 1024
+
+
+class LLMUnavailableError(Exception):
+    """Raised instead of calling Gemini when the call is certain (or very likely) to fail."""
+
+
+class CircuitOpenError(LLMUnavailableError):
+    pass
+
+
+class RateLimitedError(LLMUnavailableError):
+    pass
+
+
+request_bucket = resilience.TokenBucket(REQUESTS_PER_MINUTE)
+token_bucket = resilience.TokenBucket(TOKENS_PER_MINUTE)
+breaker = resilience.CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_COOLDOWN_SECONDS)
+hedge_bucket = resilience.TokenBucket(HEDGES_PER_MINUTE)
+
+_loop = None
+_loop_pid = None
+_loop_lock = threading.Lock()
+_semaphore = None
+_inflight = {}  # coalescing key -> _SharedCall, only touched on the loop thread
+_caller = threading.local()
+
+_stats_lock = threading.Lock()
+_stats = {
+    "calls": 0,
+    "upstream_calls": 0,
+    "coalesced": 0,
+    "errors": 0,
+    "in_flight": 0,
+    "max_in_flight_seen": 0,
+    "prompt_tokens": 0,
+    "output_tokens": 0,
+    "retries": 0,
+    "rate_limited": 0,
+    "rejected_open": 0,
+    "admission_waits": 0,
+    "admission_timeouts": 0,
+    "deadline_exceeded": 0,
+    "hedges_fired": 0,
+    "hedges_won": 0,
+    "hedges_budget_exhausted": 0,
+}
+_latencies = defaultdict(lambda: deque(maxlen=LATENCY_WINDOW))  # content type -> recent upstream latencies (s)
+
+
+def _count(name, delta=1):
+    with _stats_lock:
+        _stats[name] += delta
+        if name == "in_flight" and _stats["in_flight"] > _stats["max_in_flight_seen"]:
+            _stats["max_in_flight_seen"] = _stats["in_flight"]
+
+
+def _get_loop():
+    """Returns this process's gateway loop, starting it on first use (and again after a fork)."""
+    global _loop, _loop_pid, _semaphore, _inflight
+    if _loop is not None and _loop_pid == os.getpid():
+        return _loop
+    with _loop_lock:
+        if _loop is not None and _loop_pid == os.getpid():
+            return _loop
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, name="llm-gateway-loop", daemon=True)
+        thread.start()
+        _semaphore = asyncio.Semaphore(MAX_IN_FLIGHT)
+        _inflight = {}
+        _loop, _loop_pid = loop, os.getpid()
+        logging.info("[LLM GATEWAY] Event loop started (max in-flight %s)", MAX_IN_FLIGHT)
+        return _loop
+
+
+def _coalescing_key(model, prompt, generation_config):
+    model_name = getattr(model, "model_name", repr(model))
+    material = json.dumps(
+        {"model": model_name, "prompt": prompt, "config": content_cache.config_fingerprint(generation_config)},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def estimate_tokens(prompt, generation_config=None):
+    """Rough admission estimate: ~4 characters per prompt token plus the output-token ceiling."""
+    max_output = None
+    if isinstance(generation_config, dict):
+        max_output = generation_config.get("max_output_tokens")
+    elif generation_config is not None:
+        max_output = getattr(generation_config, "max_output_tokens", None)
+    return len(prompt) // 4 + (max_output or DEFAULT_OUTPUT_TOKEN_ESTIMATE)
+
+
+class CallUsage:
+    """
+    Tokens used by every attempt of one call: retries and hedge backups. An attempt's prompt
+    tokens count from the moment it is sent; a cancelled attempt keeps them, a failed one
+    (the API bills nothing for errors) gives them back. Responses without usage metadata
+    count at their estimate.
+    """
+
+    def __init__(self):
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+
+    def sent(self, prompt_estimate):
+        self.prompt_tokens += prompt_estimate
+
+    def failed(self, prompt_estimate):
+        self.prompt_tokens -= prompt_estimate
+
+    def answered(self, prompt_estimate, output_estimate, response):
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None:
+            self.output_tokens += output_estimate
+            return
+        self.prompt_tokens += (getattr(usage, "prompt_token_count", 0) or 0) - prompt_estimate
+        self.output_tokens += getattr(usage, "candidates_token_count", 0) or 0
+
+    def totals(self):
+        return self.prompt_tokens, self.output_tokens
+
+
+def _try_admit(estimate):
+    """Takes one request and estimate tokens from the buckets, or returns the seconds to wait."""
+    wait = request_bucket.try_acquire(1)
+    if wait:
+        return wait
+    wait = token_bucket.try_acquire(estimate)
+    if wait:
+        request_bucket.refund(1)
+    return wait
+
+
+async def _admit(estimate):
+    deadline = time.monotonic() + ADMISSION_MAX_WAIT_SECONDS
+    while True:
+        wait = _try_admit(estimate)
+        if not wait:
+            return
+        if time.monotonic() + wait > deadline:
+            _count("admission_timeouts")
+            raise RateLimitedError(f"Client-side Gemini quota exhausted (next slot in {wait:.1f}s)")
+        _count("admission_waits")
+        await asyncio.sleep(wait)
+
+
+def _record_failure(error):
+    """Feeds an upstream error to the breaker; returns True if it is worth retrying."""
+    if not resilience.is_retryable(error):
+        breaker.release_probe()
+        return False
+    if resilience.is_rate_limit(error):
+        _count("rate_limited")
+    breaker.record_failure()
+    return True
+
+
+async def _call_upstream(model, prompt, generation_config, content_type, usage=None):
+    """One logical call with its retries. usage (a CallUsage) accumulates the tokens of every attempt."""
+    estimate = estimate_tokens(prompt, generation_config)
+    prompt_estimate = len(prompt) // 4
+    usage = usage if usage is not None else CallUsage()
+    attempt = 0
+    while True:
+        if not breaker.allow_request():
+            _count("rejected_open")
+            raise CircuitOpenError("Gemini circuit breaker is open")
+        try:
+            await _admit(estimate)
+        except BaseException:
+            # Quota exhausted, or cancelled while waiting for a slot: no verdict on Gemini's health.
+            breaker.release_probe()
+            raise
+
+        error = None
+        # Hold a concurrency slot only while the request is on the wire, not while backing off.
+        async with _semaphore:
+            _count("in_flight")
+            _count("upstream_calls")
+            started = time.monotonic()
+            usage.sent(prompt_estimate)
+            try:
+                response = await model.generate_content_async(prompt, generation_config=generation_config)
+            except Exception as e:
+                error = e
+                usage.failed(prompt_estimate)
+            except BaseException:
+                # Cancelled (the caller's deadline passed, or the other call of a hedge won): the
+                # call ends without a verdict, so a half-open probe must give its slot back.
+                breaker.release_probe()
+                raise
+            finally:
+                _count("in_flight", -1)
+            elapsed = time.monotonic() - started
+            record_call(content_type, elapsed, error)
+
+        if error is None:
+            with _stats_lock:
+                _latencies[content_type].append(elapsed)
+            breaker.record_success()
+            record_usage(response, estimate, content_type)
+            usage.answered(prompt_estimate, estimate - prompt_estimate, response)
+            return response
+
+        retryable = _record_failure(error)
+        if not retryable or attempt >= MAX_RETRIES or breaker.state != resilience.CircuitBreaker.CLOSED:
+            raise error
+        delay = resilience.backoff_delay(attempt, BACKOFF_BASE_SECONDS, BACKOFF_CAP_SECONDS)
+        logging.warning("[LLM GATEWAY] Retryable Gemini error (%s: %s); retry %s/%s in %.2fs", type(error).__name__, error, attempt + 1, MAX_RETRIES, delay)
+        _count("retries")
+        attempt += 1
+        await asyncio.sleep(delay)
+
+
+def hedge_delay(content_type):
+    """
+    Seconds after which an outstanding call of content_type gets a backup request: the
+    HEDGE_PERCENTILE of its recent latencies, at least HEDGE_MIN_DELAY_SECONDS. None while
+    there are fewer than HEDGE_MIN_SAMPLES successful calls to go by.
+    """
+    with _stats_lock:
+        samples = sorted(_latencies[content_type])
+    if len(samples) < HEDGE_MIN_SAMPLES:
+        return None
+    return max(HEDGE_MIN_DELAY_SECONDS, samples[min(len(samples) - 1, int(len(samples) * HEDGE_PERCENTILE / 100))])
+
+
+def _has_text(response):
+    """Default hedging validator: the response carries some text (.text raises for blocked responses)."""
+    try:
+        return bool(response.text)
+    except ValueError:
+        return False
+
+
+def _hedge(content_type, outcome):
+    metrics.inc("eduro_llm_hedges_total", content_type=content_type, outcome=outcome)
+
+
+async def _call_hedged(model, prompt, generation_config, content_type, validate=None, usage=None):
+    """
+    _call_upstream, plus a backup call once the first has been outstanding for hedge_delay().
+    Returns the first response that passes validate (default: has text) and cancels the
+    other call. If neither response is valid, the first one to arrive is returned; if both
+    calls fail, the first error is raised. Both calls add their tokens to usage.
+    """
+    validate = validate or _has_text
+    tasks = [asyncio.ensure_future(_call_upstream(model, prompt, generation_config, content_type, usage))]
+    try:
+        delay = hedge_delay(content_type) if HEDGES_PER_MINUTE > 0 else None
+        if delay is not None:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done and breaker.state == resilience.CircuitBreaker.CLOSED:
+                if hedge_bucket.try_acquire(1) == 0:
+                    _count("hedges_fired")
+                    _hedge(content_type, "fired")
+                    tasks.append(asyncio.ensure_future(_call_upstream(model, prompt, generation_config, content_type, usage)))
+                else:
+                    _count("hedges_budget_exhausted")
+                    _hedge(content_type, "budget_exhausted")
+        if len(tasks) == 1:
+            return await tasks[0]
+
+        pending, fallback, error = set(tasks), None, None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    error = error or task.exception()
+                elif validate(task.result()):
+                    if task is tasks[1]:
+                        _count("hedges_won")
+                    _hedge(content_type, "backup_won" if task is tasks[1] else "primary_won")
+                    return task.result()
+                elif fallback is None:
+                    fallback = task.result()
+        _hedge(content_type, "neither_valid")
+        if fallback is not None:
+            return fallback
+        raise error
+    finally:
+        # The losing call (or both, if the caller gave up) is cancelled rather than left running.
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+def record_call(content_type, seconds, error=None):
+    """Records the latency and outcome of one upstream call in the metrics registry."""
+    metrics.observe("eduro_llm_call_duration_seconds", seconds, content_type=content_type)
+    metrics.inc("eduro_llm_calls_total", content_type=content_type,
+                outcome="ok" if error is None else type(error).__name__)
+
+
+def record_usage(response, estimate=None, content_type="unknown"):
+    """
+    Adds the token counts from a response's usage metadata (if any) to the gateway totals
+    and the per-content-type token metrics, and refunds the token bucket when admission
+    over-estimated the call.
+    """
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_token_count", 0) or 0
+    output_tokens = getattr(usage, "candidates_token_count", 0) or 0
+    _count("prompt_tokens", prompt_tokens)
+    _count("output_tokens", output_tokens)
+    metrics.inc("eduro_llm_tokens_total", prompt_tokens, content_type=content_type, kind="prompt")
+    metrics.inc("eduro_llm_tokens_total", output_tokens, content_type=content_type, kind="output")
+    if estimate is not None and estimate > prompt_tokens + output_tokens:
+        token_bucket.refund(estimate - prompt_tokens - output_tokens)
+
+
+def admit_sync(prompt, generation_config=None):
+    """
+    Breaker check and admission for calls that bypass the gateway loop (streaming).
+    Raises LLMUnavailableError when the call should not be made; report the outcome
+    with record_outcome() afterwards.
+    """
+    if not breaker.allow_request():
+        _count("rejected_open")
+        raise CircuitOpenError("Gemini circuit breaker is open")
+    estimate = estimate_tokens(prompt, generation_config)
+    deadline = time.monotonic() + ADMISSION_MAX_WAIT_SECONDS
+    while True:
+        wait = _try_admit(estimate)
+        if not wait:
+            return estimate
+        if time.monotonic() + wait > deadline:
+            _count("admission_timeouts")
+            breaker.release_probe()
+            raise RateLimitedError(f"Client-side Gemini quota exhausted (next slot in {wait:.1f}s)")
+        _count("admission_waits")
+        time.sleep(wait)
+
+
+def record_outcome(error=None):
+    """Reports the result of a call admitted with admit_sync() to the circuit breaker."""
+    if error is None:
+        breaker.record_success()
+    else:
+        _record_failure(error)
+
+
+def release_admission():
+    """Ends a call admitted with admit_sync() that stopped without an outcome (e.g. the client went away)."""
+    breaker.release_probe()
+
+
+def circuit_open():
+    """True while the breaker is rejecting calls (callers can skip straight to degraded content)."""
+    return breaker.state == resilience.CircuitBreaker.OPEN
+
+
+class _SharedCall:
+    """One upstream call (hedged or not), run as its own task, and the callers waiting on it."""
+
+    def __init__(self):
+        self.task = None
+        self.waiters = 0
+        self.usage = CallUsage()
+        self.charged = False  # the first caller to receive the response pays for the whole call
+
+
+def _call_finished(key, call, task):
+    if _inflight.get(key) is call:
+        del _inflight[key]
+    if not task.cancelled() and task.exception() is not None:  # also marks the exception as retrieved
+        _count("errors")
+
+
+async def generate_async(model, prompt, generation_config=None, content_type="unknown", hedge=False, validate=None):
+    """
+    Coroutine form of model.generate_content with single-flight coalescing.
+    Must be awaited on the gateway loop (use generate() from synchronous code).
+    content_type labels the call in the metrics and selects its latency history; with
+    hedge, a slow call gets a backup request (see _call_hedged).
+    """
+    response, _ = await _generate_shared(model, prompt, generation_config, content_type, hedge, validate)
+    return response
+
+
+async def _generate_shared(model, prompt, generation_config, content_type, hedge, validate):
+    """
+    Returns (response, (prompt tokens, output tokens) this caller is charged for).
+    The upstream call runs as a task of its own that every caller awaits through shield(),
+    so a caller that is cancelled (its deadline passed) leaves the call running for the
+    others; it is cancelled only when no caller is left waiting for it. The first caller
+    to receive the response is charged for every attempt of the call; the others for nothing.
+    """
+    _count("calls")
+    key = _coalescing_key(model, prompt, generation_config)
+    call = _inflight.get(key)
+    if call is None:
+        call = _inflight[key] = _SharedCall()
+        if hedge:
+            coroutine = _call_hedged(model, prompt, generation_config, content_type, validate, call.usage)
+        else:
+            coroutine = _call_upstream(model, prompt, generation_config, content_type, call.usage)
+        call.task = asyncio.ensure_future(coroutine)
+        call.task.add_done_callback(functools.partial(_call_finished, key, call))
+    else:
+        _count("coalesced")
+
+    call.waiters += 1
+    try:
+        response = await asyncio.shield(call.task)
+    except asyncio.CancelledError:
+        if call.waiters == 1 and not call.task.done():
+            # The last caller gave up: stop the call instead of finishing it for nobody.
+            if _inflight.get(key) is call:
+                del _inflight[key]
+            call.task.cancel()
+        raise
+    finally:
+        call.waiters -= 1
+    charged = (0, 0) if call.charged else call.usage.totals()
+    call.charged = True
+    return response, charged
+
+
+@contextlib.contextmanager
+def background():
+    """LLM calls made by this thread inside the block are background work and are never hedged."""
+    previous = getattr(_caller, "background", False)
+    _caller.background = True
+    try:
+        yield
+    finally:
+        _caller.background = previous
+
+
+def generate(model, prompt, generation_config=None, timeout=None, content_type="unknown", validate=None):
+    """
+    Synchronous entry point used by gemini_interaction: blocks the calling thread on the gateway loop.
+    timeout defaults to the content type's deadline (LLM_REQUEST_TIMEOUT for background work).
+    validate(response) tells a hedged call whether a response is usable (default: it has
+    text). Raises TimeoutError past the deadline.
+    """
+    hedge = not getattr(_caller, "background", False)
+    if timeout is None:
+        timeout = DEADLINES.get(content_type, REQUEST_TIMEOUT_SECONDS) if hedge else REQUEST_TIMEOUT_SECONDS
+    _caller.usage = (0, 0)
+    coroutine = _generate_shared(model, prompt, generation_config, content_type, hedge, validate)
+    future = asyncio.run_coroutine_threadsafe(coroutine, _get_loop())
+    try:
+        response, _caller.usage = future.result(timeout=timeout)
+        return response
+    except concurrent.futures.TimeoutError:
+        _count("deadline_exceeded")
+        future.cancel()
+        raise
+    except Exception:
+        future.cancel()
+        raise
+
+
+def last_usage():
+    """
+    (prompt tokens, output tokens) to charge for this thread's last generate() call: every
+    attempt of the upstream call (retries, hedge backups) for the caller it was made for,
+    (0, 0) for a caller whose prompt was coalesced into another caller's call.
+    """
+    return getattr(_caller, "usage", (0, 0))
+
+
+def stats():
+    """Call, upstream, coalescing, retry and circuit-breaker counters for this process."""
+    with _stats_lock:
+        snapshot = dict(_stats)
+    snapshot["max_in_flight"] = MAX_IN_FLIGHT
+    snapshot["breaker_state"] = breaker.state
+    snapshot["breaker_times_opened"] = breaker.times_opened
+    snapshot["request_bucket_available"] = round(min(request_bucket.available(), 1e12), 1)
+    snapshot["token_bucket_available"] = round(min(token_bucket.available(), 1e12), 1)
+    snapshot["hedge_bucket_available"] = round(min(hedge_bucket.available(), 1e12), 1) if HEDGES_PER_MINUTE > 0 else 0
+    return snapshot
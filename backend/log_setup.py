@@ -0,0 +1,209 @@
+# backend/log_setup.py
+#
+# Logging for the web workers and the command-line tools. configure() points the root
+# logger at a QueueHandler: the calling thread only renders the message (with large
+# arguments truncated) and enqueues the record; a writer thread formats the records
+# (one JSON object per line, or the plain text format) and writes them to stderr in batches.
+# Every record carries the id of the HTTP request it was logged for: app.py sets it
+# from the X-Request-Id header (or a fresh id) and sends it back on the response.
+# Log calls use lazy %-style arguments, so messages below the level are never built:
+#   logging.debug("[GEMINI RAW RESPONSE for %s]:\n%s", content_type, response.text, extra=log_setup.PAYLOAD)
+# Records marked with extra=PAYLOAD (raw model output, rejected items) are sampled.
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+
+# --- Configuration ---
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "")                           # "json" or "text"; empty = the caller's default
+LOG_MAX_ARG_CHARS = int(os.environ.get("LOG_MAX_ARG_CHARS", 2000))     # per interpolated string argument; 0 = no limit
+LOG_PAYLOAD_SAMPLE_RATE = float(os.environ.get("LOG_PAYLOAD_SAMPLE_RATE", 0.1))
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", 10000))          # records beyond this are dropped, not waited for
+LOG_FLUSH_INTERVAL = float(os.environ.get("LOG_FLUSH_INTERVAL", 0.05))  # seconds the writer lets records gather between writes
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(module)s - %(request_id)s - %(message)s'
+
+PAYLOAD = {"payload": True}  # extra= for records that dump model output or other large values
+
+_request_id = contextvars.ContextVar("request_id", default="-")
+_REQUEST_ID = re.compile(r"^[\w.:-]{1,64}$")
+_MAX_BATCH = 512
+_STOP = object()  # queued by _Writer.stop()
+_handler = None
+_writer = None
+_dropped = 0
+
+
+def request_id():
+    return _request_id.get()
+
+
+def set_request_id(raw=None):
+    """Tags this thread's following records with the client-supplied id, or a new one; returns the id."""
+    value = raw if raw and _REQUEST_ID.match(raw) else os.urandom(8).hex()
+    _request_id.set(value)
+    return value
+
+
+def clear_request_id():
+    _request_id.set("-")
+
+
+def _truncate(value):
+    if LOG_MAX_ARG_CHARS and isinstance(value, str) and len(value) > LOG_MAX_ARG_CHARS:
+        return f"{value[:LOG_MAX_ARG_CHARS]}... [{len(value) - LOG_MAX_ARG_CHARS} more chars]"
+    return value
+
+
+class _PayloadSampler(logging.Filter):
+    """Lets through LOG_PAYLOAD_SAMPLE_RATE of the records marked with extra=PAYLOAD."""
+
+    def filter(self, record):
+        return not getattr(record, "payload", False) or random.random() < LOG_PAYLOAD_SAMPLE_RATE
+
+
+class _RequestQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Runs on the thread that logged: only what must be captured now (the message from the
+        # arguments as they are, the request id, the traceback). Formatting and I/O are the writer's.
+        if isinstance(record.args, tuple):
+            record.args = tuple(_truncate(arg) for arg in record.args)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        record.request_id = _request_id.get()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        global _dropped
+        if self.queue.qsize() >= LOG_QUEUE_SIZE:
+            _dropped += 1
+        else:
+            self.queue.put(record)
+
+
+class _Writer(threading.Thread):
+    """Formats queued records and writes each batch (whatever has queued up) with one write."""
+
+    def __init__(self, records, formatter, stream):
+        super().__init__(name="log-writer", daemon=True)
+        self.records = records
+        self.formatter = formatter
+        self.stream = stream
+
+    def run(self):
+        stopping = False
+        while not stopping:
+            batch = [self.records.get()]
+            while len(batch) < _MAX_BATCH:
+                try:
+                    batch.append(self.records.get_nowait())
+                except queue.Empty:
+                    break
+            lines = []
+            for record in batch:
+                if record is _STOP:
+                    stopping = True
+                    continue
+                try:
+                    lines.append(self.formatter.format(record))
+                except Exception:
+                    lines.append(f"[log-writer] could not format a record from {record.module}: {record.msg!r}")
+            if lines:
+                try:
+                    self.stream.write("\n".join(lines) + "\n")
+                    self.stream.flush()
+                except (OSError, ValueError):
+                    pass  # stderr closed or gone: nowhere left to report it
+            if not stopping and LOG_FLUSH_INTERVAL > 0:
+                time.sleep(LOG_FLUSH_INTERVAL)  # fewer, larger writes; less GIL contention with request threads
+
+    def stop(self):
+        self.records.put(_STOP)
+        self.join(timeout=5)
+
+
+class JsonFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__()
+        self._second = None
+        self._second_text = ""
+
+    def format(self, record):
+        second = int(record.created)
+        if second != self._second:  # the writer formats one record at a time, so this cache needs no lock
+            self._second, self._second_text = second, time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(second))
+        entry = {
+            "ts": f"{self._second_text}.{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "module": record.module,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+        }
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        if record.threadName != "MainThread":
+            entry["thread"] = record.threadName
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def configure(default_format="json", level=None):
+    """
+    Replaces the root logger's handlers with the queue handler and starts the writer
+    thread. Safe to call more than once (only the first call per process configures).
+    """
+    global _handler, _writer
+    if _writer is not None:
+        return
+    if (LOG_FORMAT or default_format) == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(TEXT_FORMAT)
+    _handler = _RequestQueueHandler(queue.SimpleQueue())
+    _handler.addFilter(_PayloadSampler())
+    logging.logMultiprocessing = False  # no processName in either format; saves a lookup per record
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(_handler)
+    root.setLevel(level or LOG_LEVEL)
+    _writer = _Writer(_handler.queue, formatter, sys.stderr)
+    _writer.start()
+    atexit.register(_stop)
+
+
+def _stop():
+    # Writes out what is still queued on a normal exit.
+    if _writer is not None and _writer.is_alive():
+        _writer.stop()
+
+
+def _restart_after_fork():
+    # The writer thread does not survive a fork (e.g. a preloaded gunicorn master): start a fresh one.
+    global _writer
+    if _writer is None:
+        return
+    _handler.queue = queue.SimpleQueue()
+    _writer = _Writer(_handler.queue, _writer.formatter, _writer.stream)
+    _writer.start()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def stats():
+    """Records waiting for the writer, and records dropped because it fell LOG_QUEUE_SIZE behind."""
+    return {"dropped": _dropped, "queued": _handler.queue.qsize() if _handler is not None else 0}
@@ -0,0 +1,121 @@
+# backend/mcq_parser.py
+#
+# Tolerant, incremental parser for model output that should be a JSON array of MCQ
+# objects. json.loads rejects a whole response because of one "// comment", a
+# trailing comma, prose or markdown around the array, or a truncated tail. This
+# parser instead scans the text once, tracking strings and bracket depth, and
+# returns every top-level object that is complete and parses. A paid generation
+# is then only lost when it contains no complete question at all.
+
+import json
+
+
+class MCQStreamParser:
+    """
+    Feed text as it arrives (a whole response or stream chunks); each feed() returns
+    the objects completed by that text. close() accounts for an unfinished trailing
+    object. Objects that are complete but still do not parse are counted in
+    self.discarded.
+    """
+
+    def __init__(self):
+        self._buffer = []      # characters of the object being assembled
+        self._depth = 0        # bracket depth inside the current object (0 = between objects)
+        self._in_string = False
+        self._escaped = False
+        self._comment = None   # None, "line" or "block"
+        self._slash = False    # saw a "/" that may start a comment
+        self._star = False     # saw a "*" that may end a block comment
+        self.recovered = 0
+        self.discarded = 0
+
+    def feed(self, text):
+        completed = []
+        for ch in text:
+            if self._comment == "line":
+                if ch == "\n":
+                    self._comment = None
+                continue
+            if self._comment == "block":
+                if self._star and ch == "/":
+                    self._comment = None
+                self._star = ch == "*"
+                continue
+            if self._slash:
+                self._slash = False
+                if ch == "/":
+                    self._comment = "line"
+                    continue
+                if ch == "*":
+                    self._comment, self._star = "block", False
+                    continue
+                self._consume("/", completed)
+            # Comments are only recognised inside an object: prose between objects may contain URLs.
+            if ch == "/" and self._depth and not self._in_string:
+                self._slash = True
+                continue
+            self._consume(ch, completed)
+        return completed
+
+    def close(self):
+        """Ends the input. An object still open at this point was truncated and is discarded."""
+        if self._depth:
+            self.discarded += 1
+        self._buffer, self._depth, self._in_string = [], 0, False
+        return []
+
+    def _consume(self, ch, completed):
+        if self._depth == 0:
+            # Between objects only the start of the next one matters (skips "[", ",", prose and fences).
+            if ch == "{":
+                self._buffer = ["{"]
+                self._depth = 1
+            return
+
+        buffer = self._buffer
+        if self._in_string:
+            buffer.append(ch)
+            if self._escaped:
+                self._escaped = False
+            elif ch == "\\":
+                self._escaped = True
+            elif ch == '"':
+                self._in_string = False
+            return
+
+        if ch == '"':
+            self._in_string = True
+        elif ch in "{[":
+            self._depth += 1
+        elif ch in "}]":
+            # Drop a trailing comma before the closing bracket.
+            while buffer and buffer[-1].isspace():
+                buffer.pop()
+            if buffer and buffer[-1] == ",":
+                buffer.pop()
+            self._depth -= 1
+        buffer.append(ch)
+
+        if self._depth == 0:
+            self._finish("".join(buffer), completed)
+            self._buffer = []
+
+    def _finish(self, text, completed):
+        try:
+            value = json.loads(text)
+        except ValueError:
+            self.discarded += 1
+            return
+        if isinstance(value, dict):
+            self.recovered += 1
+            completed.append(value)
+        else:
+            self.discarded += 1
+
+
+def parse_mcqs(text):
+    """Returns (objects, discarded): every complete MCQ-like object in text and the count of unusable fragments."""
+    parser = MCQStreamParser()
+    objects = parser.feed(text or "")
+    parser.close()
+    return objects, parser.discarded
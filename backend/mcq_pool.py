@@ -0,0 +1,300 @@
+# backend/mcq_pool.py
+#
+# Pre-generated pools of validated MCQs, one per topic in the curriculum catalog.
+# /api/initial-mcqs and /api/advanced-mcqs draw from these pools so a student does
+# not wait on a live Gemini call; a background thread tops each pool back up when
+# it drops below the low-water mark. Pools are per worker process, so only the
+# MCQ_POOL_PREWARM_TOPICS hot set is filled at startup (by every worker); other
+# topics are filled once students ask for them, and kept full while they are asked
+# for within MCQ_POOL_ACTIVE_SECONDS.
+# Topics covered by the content pack (pregenerate.py) are served from the pack and
+# never refilled live.
+
+import hashlib
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+
+import catalog
+import content_pack
+import gemini_interaction
+import llm_gateway
+
+# --- Configuration ---
+POOL_ENABLED = os.environ.get("MCQ_POOL_ENABLED", "1") != "0"
+POOL_TARGET = int(os.environ.get("MCQ_POOL_TARGET", 15))        # questions kept ready per topic
+POOL_LOW_WATER = int(os.environ.get("MCQ_POOL_LOW_WATER", 6))   # refill when a pool drops below this
+REFILL_BATCH = int(os.environ.get("MCQ_POOL_REFILL_BATCH", 5))  # questions requested per Gemini call
+REFILL_RETRY_SECONDS = float(os.environ.get("MCQ_POOL_RETRY_SECONDS", 30))
+REFILL_MAX_BATCHES = int(os.environ.get("MCQ_POOL_MAX_BATCHES", 4))  # Gemini calls per refill at most
+PREWARM_TOPICS = os.environ.get("MCQ_POOL_PREWARM_TOPICS", "")          # comma-separated hot set, "*" for every topic
+ACTIVE_SECONDS = float(os.environ.get("MCQ_POOL_ACTIVE_SECONDS", 3600))  # keep refilling topics drawn this recently
+SWEEP_INTERVAL_SECONDS = 15.0
+MAX_TRACKED_SESSIONS = 10000
+
+_lock = threading.Lock()
+_pools = {}                     # topic -> deque of MCQ dicts
+_retry_after = {}               # topic -> monotonic time before which a failed topic is not refilled
+_last_drawn = {}                # catalog topic -> monotonic time a student last asked for its pool
+_seen_by_session = OrderedDict()  # session_id -> set of question fingerprints already served
+_refill_queue = queue.Queue()
+_queued = set()
+_worker = None
+
+_stats = {
+    "served_from_pack": 0,
+    "served_from_pool": 0,
+    "served_live": 0,
+    "refills": 0,
+    "refill_failures": 0,
+    "refill_seconds_total": 0.0,
+    "last_refill_seconds": 0.0,
+}
+
+
+def _fingerprint(question):
+    text = " ".join(question.get("question_text", "").lower().split())
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _request_refill(topic):
+    """
+    Queues topic for refilling unless it is already queued, backing off, served from the pack,
+    or not a catalog topic (a client can send any string; each refill costs Gemini calls).
+    """
+    if not catalog.has_topic(topic) or content_pack.has("mcqs", topic):
+        return
+    with _lock:
+        depth = len(_pools.get(topic, ()))
+        if depth >= POOL_LOW_WATER or topic in _queued:
+            return
+        if _retry_after.get(topic, 0) > time.monotonic():
+            return
+        _queued.add(topic)
+    _refill_queue.put(topic)
+
+
+def _back_off(topic, reason):
+    """Stops refilling topic for REFILL_RETRY_SECONDS. Call with _lock held."""
+    _stats["refill_failures"] += 1
+    _retry_after[topic] = time.monotonic() + REFILL_RETRY_SECONDS
+    logging.warning("[MCQ POOL] Refill %s for topic '%s', retrying in %ss", reason, topic, REFILL_RETRY_SECONDS)
+
+
+def _refill(topic):
+    """
+    Generates batches until the pool for topic is back at POOL_TARGET. Backs off when a
+    batch fails or adds nothing new (the model keeps repeating pooled questions), and
+    makes at most REFILL_MAX_BATCHES calls per refill.
+    """
+    for _ in range(REFILL_MAX_BATCHES):
+        with _lock:
+            pool = _pools.get(topic, ())
+            missing = POOL_TARGET - len(pool)
+            pooled_texts = [q.get("question_text", "") for q in pool]
+        if missing <= 0:
+            return
+
+        started = time.monotonic()
+        with llm_gateway.background():
+            questions = gemini_interaction.generate_mcqs(topic, num_questions=min(REFILL_BATCH, missing),
+                                                         allow_degraded=False, avoid=pooled_texts)
+        elapsed = time.monotonic() - started
+
+        with _lock:
+            _stats["last_refill_seconds"] = round(elapsed, 3)
+            if not questions:
+                _back_off(topic, "failed")
+                return
+            _stats["refills"] += 1
+            _stats["refill_seconds_total"] += elapsed
+            pool = _pools.setdefault(topic, deque())
+            known = {_fingerprint(q) for q in pool}
+            added = 0
+            for q in questions:
+                fp = _fingerprint(q)
+                if fp not in known:
+                    known.add(fp)
+                    pool.append(q)
+                    added += 1
+            depth = len(pool)
+            if not added:
+                _back_off(topic, "added no new questions")
+                return
+        logging.info("[MCQ POOL] Refilled '%s' with %s new MCQs in %.2fs (depth %s)", topic, added, elapsed, depth)
+
+    with _lock:
+        if len(_pools.get(topic, ())) < POOL_TARGET:
+            _back_off(topic, f"stopped after {REFILL_MAX_BATCHES} batches")
+
+
+def _prewarm_topics():
+    """Catalog topics kept warm whether or not anyone asks for them: the MCQ_POOL_PREWARM_TOPICS hot set."""
+    if PREWARM_TOPICS.strip() == "*":
+        return list(catalog.all_topics())
+    hot = {topic.strip() for topic in PREWARM_TOPICS.split(",")}
+    return [topic for topic in catalog.all_topics() if topic in hot]
+
+
+def _sweep_topics():
+    """The hot set plus the topics drawn in the last ACTIVE_SECONDS (forgetting older ones)."""
+    cutoff = time.monotonic() - ACTIVE_SECONDS
+    with _lock:
+        for topic, drawn_at in list(_last_drawn.items()):
+            if drawn_at < cutoff:
+                del _last_drawn[topic]
+        active = list(_last_drawn)
+    hot = _prewarm_topics()
+    return hot + [topic for topic in active if topic not in hot]
+
+
+def _refill_loop():
+    while True:
+        try:
+            topic = _refill_queue.get(timeout=SWEEP_INTERVAL_SECONDS)
+        except queue.Empty:
+            # Periodic sweep picks up topics whose retry back-off has expired.
+            for topic in _sweep_topics():
+                _request_refill(topic)
+            continue
+        try:
+            _refill(topic)
+        except Exception as e:
+            logging.error("[MCQ POOL] Unexpected error refilling '%s': %s", topic, e)
+            with _lock:
+                _retry_after[topic] = time.monotonic() + REFILL_RETRY_SECONDS
+        finally:
+            with _lock:
+                _queued.discard(topic)
+
+
+def start():
+    """Starts the background refill thread and queues the MCQ_POOL_PREWARM_TOPICS hot set for pre-warming."""
+    global _worker
+    if not POOL_ENABLED:
+        logging.info("[MCQ POOL] Disabled via MCQ_POOL_ENABLED=0")
+        return
+    with _lock:
+        if _worker is not None and _worker.is_alive():
+            return
+        _worker = threading.Thread(target=_refill_loop, name="mcq-pool-refill", daemon=True)
+        _worker.start()
+    hot = _prewarm_topics()
+    for topic in hot:
+        _request_refill(topic)
+    logging.info("[MCQ POOL] Started (target %s, low-water %s, pre-warming %s of %s topics)",
+                 POOL_TARGET, POOL_LOW_WATER, len(hot), len(catalog.all_topics()))
+
+
+def _session_seen(session_id):
+    seen = _seen_by_session.get(session_id)
+    if seen is None:
+        seen = _seen_by_session[session_id] = set()
+        while len(_seen_by_session) > MAX_TRACKED_SESSIONS:
+            _seen_by_session.popitem(last=False)
+    else:
+        _seen_by_session.move_to_end(session_id)
+    return seen
+
+
+def _draw_from_pack(topic, num_questions, session_id):
+    """A random sample of the topic's pre-generated MCQs that this session has not seen yet."""
+    packed = content_pack.lookup("mcqs", topic)
+    if not packed:
+        return None
+    with _lock:
+        seen = _session_seen(session_id) if session_id else set()
+        unseen = [(fp, q) for fp, q in ((_fingerprint(q), q) for q in packed) if fp not in seen]
+        if len(unseen) < num_questions:
+            return None
+        chosen = random.sample(unseen, num_questions)
+        seen.update(fp for fp, _ in chosen)
+        _stats["served_from_pack"] += 1
+    return [dict(q, id=f"q{i + 1}") for i, (_, q) in enumerate(chosen)]
+
+
+def draw(topic, num_questions, session_id=None):
+    """
+    Takes num_questions MCQs for topic from the content pack or out of the pool, skipping
+    any the session has already been served. Returns None when neither can supply enough
+    questions, in which case the caller should generate live.
+    """
+    packed = _draw_from_pack(topic, num_questions, session_id)
+    if packed:
+        return packed
+    if not POOL_ENABLED or not catalog.has_topic(topic):
+        return None  # Pools are only kept for catalog topics.
+
+    drawn = []
+    with _lock:
+        _last_drawn[topic] = time.monotonic()
+        pool = _pools.get(topic)
+        seen = _session_seen(session_id) if session_id else set()
+        if pool:
+            kept = deque()
+            while pool and len(drawn) < num_questions:
+                q = pool.popleft()
+                fp = _fingerprint(q)
+                if fp in seen:
+                    kept.append(q)  # Leave it for other sessions.
+                    continue
+                drawn.append((fp, q))
+            pool.extendleft(reversed(kept))
+
+        if len(drawn) < num_questions:
+            # Not enough unseen questions: put them back and let the caller go live.
+            pool = _pools.setdefault(topic, deque())
+            pool.extendleft(reversed([q for _, q in drawn]))
+            drawn = []
+        else:
+            seen.update(fp for fp, _ in drawn)
+            _stats["served_from_pool"] += 1
+
+    _request_refill(topic)
+    if not drawn:
+        return None
+    # Ids from different generation batches collide, so renumber for this quiz.
+    return [dict(q, id=f"q{i + 1}") for i, (_, q) in enumerate(drawn)]
+
+
+def mark_seen(session_id, questions):
+    """Marks questions served from elsewhere (e.g. the question bank) so the pool skips them for this session."""
+    if not session_id:
+        return
+    with _lock:
+        _session_seen(session_id).update(_fingerprint(q) for q in questions)
+
+
+def record_live_generation(topic, questions, session_id=None):
+    """Counts a live fallback and marks its questions as seen for the session."""
+    with _lock:
+        _stats["served_live"] += 1
+    mark_seen(session_id, questions)
+
+
+def stats(per_topic=True):
+    """
+    Refill latency, pool-vs-live serving counts and pool depth for this process. Depth is
+    summed over the pools that are non-empty or were drawn from recently, and listed per topic
+    for those pools unless per_topic is False (/metrics, where one gauge per topic would not scale).
+    """
+    with _lock:
+        snapshot = dict(_stats)
+        depth = {topic: len(pool) for topic, pool in _pools.items() if pool}
+        for topic in _last_drawn:
+            depth.setdefault(topic, len(_pools.get(topic, ())))
+    snapshot["enabled"] = POOL_ENABLED
+    snapshot["pools"] = len(depth)
+    snapshot["pooled_questions"] = sum(depth.values())
+    snapshot["pools_below_low_water"] = sum(1 for count in depth.values() if count < POOL_LOW_WATER)
+    if per_topic:
+        snapshot["depth"] = depth
+    snapshot["avg_refill_seconds"] = (
+        round(snapshot["refill_seconds_total"] / snapshot["refills"], 3) if snapshot["refills"] else 0.0
+    )
+    snapshot["refill_seconds_total"] = round(snapshot["refill_seconds_total"], 3)
+    return snapshot
@@ -0,0 +1,364 @@
+# backend/metrics.py
+#
+# Prometheus metrics without extra dependencies. Each worker process keeps its
+# counters and histograms in memory (recording one is a dict update under a lock)
+# and a background thread writes a snapshot to METRICS_DIR/<pid>.json every few
+# seconds. GET /metrics, served by whichever worker gunicorn picks, merges the
+# snapshots of all workers, so counters and histograms cover the whole server.
+# The per-process stats() dicts of the other modules are exported as gauges with
+# a pid label. Snapshots of exited workers are folded into an archive file so
+# their counts are kept.
+
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+
+import sqlite_store
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, so metrics stay per process.
+    fcntl = None
+
+# --- Configuration ---
+METRICS_DIR = os.environ.get("METRICS_DIR", sqlite_store.default_path("metrics") if fcntl else "")
+FLUSH_INTERVAL_SECONDS = float(os.environ.get("METRICS_FLUSH_SECONDS", 5))
+ARCHIVE_FILENAME = "archived.json"
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+LLM_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 16, 32, 64, 128)
+
+# name -> (type, help, histogram buckets, label names). Recording an undeclared metric, or one
+# with other labels than declared, raises ValueError.
+METRICS = {
+    "eduro_http_requests_total": ("counter", "HTTP requests by route, method and status.", None, ("route", "method", "status")),
+    "eduro_http_request_duration_seconds": (
+        "histogram", "Time to response headers by route and method (for streams: time to the first byte).", REQUEST_BUCKETS,
+        ("route", "method")),
+    "eduro_llm_calls_total": ("counter", "Upstream LLM calls by content type and outcome.", None, ("content_type", "outcome")),
+    "eduro_llm_call_duration_seconds": ("histogram", "Upstream LLM call latency by content type.", LLM_BUCKETS, ("content_type",)),
+    "eduro_llm_tokens_total": (
+        "counter", "LLM tokens from response usage metadata by content type and kind.", None, ("content_type", "kind")),
+    "eduro_llm_parse_failures_total": (
+        "counter", "LLM responses from which no JSON object could be recovered.", None, ("content_type",)),
+    "eduro_llm_parse_recovered_total": (
+        "counter", "Malformed MCQ responses that strict JSON parsing would have discarded but mcq_parser recovered.", None,
+        ("content_type",)),
+    "eduro_llm_generations_discarded_total": (
+        "counter", "MCQ requests that delivered no valid question, even after top-up rounds.", None, ("content_type",)),
+    "eduro_llm_hedges_total": (
+        "counter", "Hedged LLM calls by content type and outcome (fired, backup_won, primary_won, neither_valid, budget_exhausted).", None,
+        ("content_type", "outcome")),
+    "eduro_llm_tenant_tokens_total": (
+        "counter", "LLM tokens by tenant, model and kind (prompt or output).", None, ("tenant", "model", "kind")),
+    "eduro_llm_spend_usd_total": (
+        "counter", "Estimated LLM spend in USD by tenant, model and content type.", None, ("tenant", "model", "content_type")),
+    "eduro_llm_budget_rejections_total": (
+        "counter", "LLM calls refused by the request or tenant token budget.", None, ("tenant", "content_type", "budget")),
+    "eduro_mcq_topup_rounds_total": (
+        "counter", "Extra LLM calls made to replace MCQs that failed validation.", None, ("content_type",)),
+    "eduro_mcq_delivered_total": (
+        "counter", "Valid MCQs delivered by content type (divide tokens by this for cost per question).", None, ("content_type",)),
+    "eduro_mcq_rejected_total": (
+        "counter", "Generated MCQs dropped by validation, by content type and reason.", None, ("content_type", "reason")),
+    "eduro_batch_graded_submissions_total": ("counter", "Answer sheets scored by /api/grade-batch, by quiz kind.", None, ("kind",)),
+    "eduro_learner_events_total": (
+        "counter", "Quiz and problem outcomes recorded in the learner event log, by kind.", None, ("kind",)),
+}
+
+_lock = threading.Lock()
+_counters = {}    # (name, labels) -> value
+_histograms = {}  # (name, labels) -> [bucket counts..., +Inf count], sum
+_collectors = {}  # prefix -> (stats function, label name for nested dicts)
+_flusher = None
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _check(name, kind, labels):
+    """Raises ValueError unless name is a declared metric of this kind with exactly these label names."""
+    declared = METRICS.get(name)
+    if declared is None or declared[0] != kind:
+        raise ValueError(f"{name} is not a declared {kind} in metrics.METRICS")
+    if set(labels) != set(declared[3]):
+        raise ValueError(f"{name} is declared with labels {sorted(declared[3])}, not {sorted(labels)}")
+
+
+def inc(name, amount=1, **labels):
+    """Adds amount to the counter name with the given labels."""
+    key = (name, _labels(labels))
+    with _lock:
+        value = _counters.get(key)
+        if value is None:  # Only a new label combination needs checking.
+            _check(name, "counter", labels)
+            value = 0
+        _counters[key] = value + amount
+
+
+def observe(name, value, **labels):
+    """Records value in the histogram name with the given labels."""
+    key = (name, _labels(labels))
+    with _lock:
+        entry = _histograms.get(key)
+        if entry is None:
+            _check(name, "histogram", labels)
+            entry = _histograms[key] = [[0] * (len(METRICS[name][2]) + 1), 0.0]
+        index = bisect.bisect_left(METRICS[name][2], value)
+        entry[0][index] += 1
+        entry[1] += value
+
+
+def register_collector(prefix, stats_function, label="key"):
+    """
+    Exports the numeric values of stats_function() as eduro_<prefix>_<key> gauges. Values
+    that are dicts of numbers become one gauge with a label (named label) per entry.
+    """
+    _collectors[prefix] = (stats_function, label)
+
+
+def _collect_gauges():
+    gauges = []
+    for prefix, (stats_function, label) in list(_collectors.items()):
+        try:
+            stats = stats_function()
+        except Exception as e:
+            logging.error("[METRICS] Collector '%s' failed: %s", prefix, e)
+            continue
+        for key, value in stats.items():
+            name = f"eduro_{prefix}_{key}"
+            if isinstance(value, dict):
+                for sub_key, sub_value in value.items():
+                    if isinstance(sub_value, (int, float)):
+                        gauges.append([name, [[label, str(sub_key)]], float(sub_value)])
+            elif isinstance(value, (int, float)):
+                gauges.append([name, [], float(value)])
+    return gauges
+
+
+def _snapshot():
+    with _lock:
+        counters = [[name, list(labels), value] for (name, labels), value in _counters.items()]
+        histograms = [[name, list(labels), list(entry[0]), entry[1]] for (name, labels), entry in _histograms.items()]
+    return {"pid": os.getpid(), "counters": counters, "histograms": histograms, "gauges": _collect_gauges()}
+
+
+# --- Multi-process snapshots ---
+
+def _snapshot_path(pid):
+    return os.path.join(METRICS_DIR, f"{pid}.json")
+
+
+def _write_json(path, data):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class _DirectoryLock:
+    """Exclusive flock on METRICS_DIR/.lock so two workers never merge the archive at once."""
+
+    def __enter__(self):
+        self._file = open(os.path.join(METRICS_DIR, ".lock"), "w")
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info):
+        fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._file.close()
+
+
+def _merge(totals, snapshot):
+    """Adds the counters and histograms of snapshot into totals (same layout, keyed by tuples)."""
+    for name, labels, value in snapshot.get("counters", []):
+        key = (name, tuple(tuple(pair) for pair in labels))
+        totals["counters"][key] = totals["counters"].get(key, 0) + value
+    for name, labels, counts, total in snapshot.get("histograms", []):
+        key = (name, tuple(tuple(pair) for pair in labels))
+        entry = totals["histograms"].get(key)
+        if entry is None or len(entry[0]) != len(counts):
+            entry = totals["histograms"][key] = [[0] * len(counts), 0.0]
+        entry[0] = [a + b for a, b in zip(entry[0], counts)]
+        entry[1] += total
+
+
+def _as_snapshot(totals):
+    return {
+        "counters": [[name, list(labels), value] for (name, labels), value in totals["counters"].items()],
+        "histograms": [[name, list(labels), counts, total] for (name, labels), (counts, total) in totals["histograms"].items()],
+    }
+
+
+def _archive(paths):
+    """Folds the snapshots at paths (exited workers) into the archive and removes them. Caller holds the lock."""
+    archive_path = os.path.join(METRICS_DIR, ARCHIVE_FILENAME)
+    totals = {"counters": {}, "histograms": {}}
+    _merge(totals, _read_json(archive_path) or {})
+    for path in paths:
+        _merge(totals, _read_json(path) or {})
+    _write_json(archive_path, _as_snapshot(totals))
+    for path in paths:
+        os.remove(path)
+
+
+def flush():
+    """Writes this process's snapshot for the other workers to read."""
+    if not METRICS_DIR:
+        return
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        _write_json(_snapshot_path(os.getpid()), _snapshot())
+    except OSError as e:
+        logging.error("[METRICS] Could not write snapshot to %s: %s", METRICS_DIR, e)
+
+
+def _flush_loop():
+    while True:
+        time.sleep(FLUSH_INTERVAL_SECONDS)
+        flush()
+
+
+def _reset_after_fork():
+    global _lock, _flusher
+    was_started = _flusher is not None
+    _lock = threading.Lock()
+    _counters.clear()
+    _histograms.clear()
+    _flusher = None
+    if was_started:
+        start()
+
+
+def start():
+    """Starts the snapshot thread. A snapshot left by an earlier process with our pid is archived first."""
+    global _flusher
+    if not METRICS_DIR or (_flusher is not None and _flusher.is_alive()):
+        return
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        path = _snapshot_path(os.getpid())
+        if os.path.exists(path):
+            with _DirectoryLock():
+                _archive([path])
+    except OSError as e:
+        logging.error("[METRICS] Could not use %s (%s); metrics are per process", METRICS_DIR, e)
+    _flusher = threading.Thread(target=_flush_loop, name="metrics-flush", daemon=True)
+    _flusher.start()
+
+
+if hasattr(os, "register_at_fork"):
+    # A worker forked from a preloaded master must not report the master's counts as its own.
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+# --- Exposition ---
+
+def _gather():
+    """Counters/histograms summed over all workers (plus exited ones) and gauges per live worker."""
+    own = _snapshot()
+    totals = {"counters": {}, "histograms": {}}
+    gauges = [(name, tuple(tuple(pair) for pair in labels) + (("pid", str(own["pid"])),), value)
+              for name, labels, value in own["gauges"]]
+    if not METRICS_DIR:
+        _merge(totals, own)
+        return totals, gauges
+
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        _write_json(_snapshot_path(own["pid"]), own)
+        with _DirectoryLock():
+            exited = []
+            for filename in os.listdir(METRICS_DIR):
+                if not filename.endswith(".json"):
+                    continue
+                path = os.path.join(METRICS_DIR, filename)
+                snapshot = own if filename == f"{own['pid']}.json" else _read_json(path)
+                if snapshot is None:
+                    continue
+                _merge(totals, snapshot)
+                pid = snapshot.get("pid")
+                if pid is None or pid == own["pid"]:
+                    continue
+                if _pid_alive(pid):
+                    gauges.extend((name, tuple(tuple(pair) for pair in labels) + (("pid", str(pid)),), value)
+                                  for name, labels, value in snapshot.get("gauges", []))
+                else:
+                    exited.append(path)
+            if exited:
+                _archive(exited)
+    except OSError as e:
+        logging.error("[METRICS] Could not aggregate snapshots in %s: %s", METRICS_DIR, e)
+        totals = {"counters": {}, "histograms": {}}
+        _merge(totals, own)
+    return totals, gauges
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def render():
+    """The merged metrics of every worker in the Prometheus text exposition format (0.0.4)."""
+    totals, gauges = _gather()
+    lines = []
+    for name, (kind, help_text, buckets, _) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "counter":
+            for (metric, labels), value in sorted(totals["counters"].items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+            continue
+        for (metric, labels), (counts, total) in sorted(totals["histograms"].items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(list(buckets) + [float("inf")], counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', _format_value(float(bound)))])} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+
+    described = set()
+    for name, labels, value in sorted(gauges):
+        if name not in described:
+            described.add(name)
+            lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
@@ -1,11 +1,14 @@
+import logging
 import random
-import google.generativeai as gemini
 
+# Offline stand-ins for the Gemini generators. gemini_interaction also serves these as
+# degraded content while the Gemini circuit breaker is open; the return shapes match the
+# real generators (MCQ dicts with id/question_text/options/correct_answer, plain text).
 
 
 def generate_mcqs_mock(topic, num_questions=3):
     """Mocks Gemini generating MCQ questions."""
-    print(f"[MOCK GEMINI] Generating {num_questions} MCQs for topic: {topic}")
+    logging.debug("[MOCK GEMINI] Generating %s MCQs for topic: %s", num_questions, topic)
     questions = []
     for i in range(num_questions):
         options = [f"Option {chr(65+j)} for Q{i+1}" for j in range(4)]
@@ -20,14 +23,14 @@ def generate_mcqs_mock(topic, num_questions=3):
 
 def generate_explanation_mock(topic, section_title):
     """Mocks Gemini generating an explanation for a section."""
-    print(f"[MOCK GEMINI] Generating explanation for: {topic} - {section_title}")
+    logging.debug("[MOCK GEMINI] Generating explanation for: %s - %s", topic, section_title)
     return (f"This is a detailed mock explanation about '{section_title}' within the topic of '{topic}'. "
             "It would cover key concepts, definitions, and importance. "
             "Lorem ipsum dolor sit amet, consectetur adipiscing elit.")
 
 def generate_solved_example_mock(topic, section_title):
     """Mocks Gemini generating a solved example for a section."""
-    print(f"[MOCK GEMINI] Generating solved example for: {topic} - {section_title}")
+    logging.debug("[MOCK GEMINI] Generating solved example for: %s - %s", topic, section_title)
     return (f"Here's a mock solved example for '{section_title}' ({topic}):\n"
             "Problem: If x + 5 = 10, what is x?\n"
             "Solution: \n"
@@ -36,14 +39,18 @@ def generate_solved_example_mock(topic, section_title):
             "This demonstrates how to solve the concept.")
 
 def generate_problem_mock(topic, section_title):
-    """Mocks Gemini generating a problem for the user to solve."""
-    print(f"[MOCK GEMINI] Generating problem for: {topic} - {section_title}")
-    return (f"Now, try this problem related to '{section_title}' ({topic}):\n"
-            "Problem: If 2y - 3 = 7, what is y? Type your answer.")
+    """Mocks Gemini generating a problem MCQ for the user to solve (same shape as generate_problem)."""
+    logging.debug("[MOCK GEMINI] Generating problem for: %s - %s", topic, section_title)
+    return {
+        "id": "q1",
+        "question_text": f"Practice problem for '{section_title}' ({topic}): If 2y - 3 = 7, what is y?",
+        "options": ["3", "4", "5", "7"],
+        "correct_answer": "5"
+    }
 
 # You might add a mock for evaluating user's free-text answer to a problem later
 # def evaluate_user_problem_answer_mock(problem, user_answer):
-#     print(f"[MOCK GEMINI] Evaluating user answer '{user_answer}' for problem '{problem}'")
+#     logging.debug("[MOCK GEMINI] Evaluating user answer '%s' for problem '%s'", user_answer, problem)
 #     return random.choice([
 #         "That's correct! Well done.",
 #         "Not quite, let's review the concept.",
@@ -0,0 +1,80 @@
+# backend/permute.py
+#
+# Serving-time view of a stored MCQ for one student. The same pooled, banked, packed
+# or cached question can then be served to many students without everyone seeing
+# the correct answer in the same position:
+#   - options are shuffled deterministically from (view key, question text), so the
+#     same student sees the same order again and grading can rebuild the view;
+#   - templated questions pick one of their value sets. A template has "{name}"
+#     placeholders in question_text, options and correct_answer, plus
+#     "variants": [{"name": "3", ...}, ...], each a self-consistent set of values.
+# Only the canonical question is stored (with the quiz's view key); the grader calls
+# view() again instead of keeping a per-student copy.
+#
+# Options that refer to other options by position ("All of the above", "Both A and B")
+# would change meaning when moved, so questions containing them keep their order.
+
+import hashlib
+import os
+import random
+import re
+
+# --- Configuration ---
+SHUFFLE_OPTIONS = os.environ.get("PERMUTE_OPTIONS", "1") != "0"
+VARY_TEMPLATES = os.environ.get("PERMUTE_VARIANTS", "1") != "0"  # with 0, templates always use their first variant
+
+_POSITIONAL_OPTION = re.compile(r"\b(all|none|both|neither) of (the )?(above|these)\b|\b[a-d] (and|or|&) [a-d]\b", re.IGNORECASE)
+_PLACEHOLDER = re.compile(r"\{(\w+)\}")
+
+
+def _rng(view_key, question):
+    seed = hashlib.blake2b(f"{view_key}\x1f{question.get('question_text', '')}".encode("utf-8"), digest_size=8).digest()
+    return random.Random(int.from_bytes(seed, "little"))
+
+
+def _fill(text, values):
+    return _PLACEHOLDER.sub(lambda m: str(values.get(m.group(1), m.group(0))), text) if isinstance(text, str) else text
+
+
+def _apply_variant(question, values):
+    filled = dict(question)
+    filled["question_text"] = _fill(question.get("question_text", ""), values)
+    filled["options"] = [_fill(option, values) for option in question.get("options", [])]
+    filled["correct_answer"] = _fill(question.get("correct_answer", ""), values)
+    return filled
+
+
+def _valid(question):
+    options = question["options"]
+    return question["correct_answer"] in options and len(set(options)) == len(options)
+
+
+def view(question, view_key):
+    """
+    The question as the student identified by view_key sees it (a new dict; question is not
+    modified). view_key None returns the stored question with any template resolved to its
+    first variant, the view used for quizzes stored before permutation existed.
+    """
+    variants = question.get("variants")
+    shown = {key: value for key, value in question.items() if key != "variants"}
+    rng = _rng(view_key, question) if view_key is not None else None
+
+    if isinstance(variants, list) and variants:
+        order = list(range(len(variants)))
+        if rng is not None and VARY_TEMPLATES:
+            rng.shuffle(order)
+        # The first value set that yields a well-formed MCQ (distinct options, answer among them).
+        for index in order:
+            if isinstance(variants[index], dict):
+                candidate = _apply_variant(shown, variants[index])
+                if _valid(candidate):
+                    shown = candidate
+                    break
+
+    options = shown.get("options")
+    if (rng is not None and SHUFFLE_OPTIONS and isinstance(options, list)
+            and not any(_POSITIONAL_OPTION.search(str(option)) for option in options)):
+        options = list(options)
+        rng.shuffle(options)
+        shown["options"] = options
+    return shown
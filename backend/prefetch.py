@@ -0,0 +1,179 @@
+# backend/prefetch.py
+#
+# Speculative lookahead for the lesson flow. The frontend always walks
+# explanation -> example -> problem -> next section's explanation, so when a step
+# is served we start generating the next one or two steps on a bounded thread pool.
+# The generators write into content_cache, so the follow-up request is a cache hit.
+
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+import catalog
+import gemini_interaction
+import llm_gateway
+
+# --- Configuration ---
+PREFETCH_ENABLED = os.environ.get("PREFETCH_ENABLED", "1") != "0"
+PREFETCH_DEPTH = int(os.environ.get("PREFETCH_DEPTH", 2))                    # steps to look ahead
+PREFETCH_MAX_CONCURRENCY = int(os.environ.get("PREFETCH_MAX_CONCURRENCY", 4))  # per worker process
+PREFETCH_MAX_PENDING = int(os.environ.get("PREFETCH_MAX_PENDING", 32))       # queued + running jobs
+PREFETCH_WAIT_SECONDS = float(os.environ.get("PREFETCH_WAIT_SECONDS", 30))   # how long a request waits on an in-flight prefetch
+MAX_TRACKED_SESSIONS = 5000
+
+LESSON_STEPS = ("explanation", "example", "problem")
+
+_GENERATORS = {
+    "explanation": gemini_interaction.generate_explanation,
+    "example": gemini_interaction.generate_solved_example,
+    "problem": gemini_interaction.generate_problem,
+}
+
+_executor = ThreadPoolExecutor(max_workers=PREFETCH_MAX_CONCURRENCY, thread_name_prefix="lesson-prefetch")
+_lock = threading.Lock()
+_sessions = OrderedDict()  # session_id -> _SessionPrefetch
+_pending = 0
+_stats = {"scheduled": 0, "used": 0, "waited": 0, "wasted": 0, "cancelled": 0, "skipped_capacity": 0, "failed": 0}
+
+
+class _SessionPrefetch:
+    """Prefetch state for one learner session: the topic it is on and its outstanding steps."""
+
+    def __init__(self, subject, topic):
+        self.subject = subject
+        self.topic = topic
+        self.futures = {}  # (section_title, content_type) -> Future
+
+
+def next_steps(sections, section_title, content_type, depth=PREFETCH_DEPTH):
+    """Returns up to depth (section_title, content_type) steps that follow the given one in the lesson path."""
+    if section_title not in sections or content_type not in LESSON_STEPS:
+        return []
+    section_index = sections.index(section_title)
+    step_index = LESSON_STEPS.index(content_type)
+    steps = []
+    while len(steps) < depth:
+        step_index += 1
+        if step_index == len(LESSON_STEPS):
+            step_index = 0
+            section_index += 1
+        if section_index >= len(sections):
+            break
+        steps.append((sections[section_index], LESSON_STEPS[step_index]))
+    return steps
+
+
+def _retire(state):
+    """Cancels a session's outstanding prefetches and counts the unused ones as wasted. Caller holds _lock."""
+    global _pending
+    for future in state.futures.values():
+        if future.cancel():
+            # A cancelled job never runs, so release its slot here.
+            _pending -= 1
+            _stats["cancelled"] += 1
+        else:
+            _stats["wasted"] += 1
+    state.futures.clear()
+
+
+def _session(session_id, subject, topic):
+    """Returns the session's prefetch state, retiring it first if the session moved to another topic. Caller holds _lock."""
+    state = _sessions.get(session_id)
+    if state is not None and (state.subject, state.topic) != (subject, topic):
+        _retire(state)
+        state = None
+    if state is None:
+        state = _sessions[session_id] = _SessionPrefetch(subject, topic)
+        while len(_sessions) > MAX_TRACKED_SESSIONS:
+            _, evicted = _sessions.popitem(last=False)
+            _retire(evicted)
+    else:
+        _sessions.move_to_end(session_id)
+    return state
+
+
+def _run(topic, section_title, content_type):
+    global _pending
+    try:
+        with llm_gateway.background():
+            result = _GENERATORS[content_type](topic, section_title)
+        if not result or (isinstance(result, str) and result.startswith(gemini_interaction.content_cache.ERROR_PREFIXES)):
+            with _lock:
+                _stats["failed"] += 1
+        return result
+    finally:
+        with _lock:
+            _pending -= 1
+
+
+def enter_topic(session_id, subject, topic):
+    """Marks the session as working on topic, cancelling prefetches left over from a previous topic."""
+    if not PREFETCH_ENABLED or not session_id:
+        return
+    with _lock:
+        _session(session_id, subject, topic)
+
+
+def leave(session_id):
+    """Cancels everything outstanding for a session that has finished or abandoned its lesson."""
+    if not session_id:
+        return
+    with _lock:
+        state = _sessions.pop(session_id, None)
+        if state is not None:
+            _retire(state)
+
+
+def wait_for(session_id, subject, topic, section_title, content_type):
+    """
+    Called before serving a step. If that step was prefetched for this session, counts it as
+    used and waits for an in-flight prefetch to finish so we do not generate it twice.
+    """
+    if not PREFETCH_ENABLED or not session_id:
+        return
+    with _lock:
+        state = _session(session_id, subject, topic)
+        future = state.futures.pop((section_title, content_type), None)
+        if future is None:
+            return
+        _stats["used"] += 1
+        if not future.done():
+            _stats["waited"] += 1
+    try:
+        future.result(timeout=PREFETCH_WAIT_SECONDS)
+    except FutureTimeoutError:
+        logging.warning("[PREFETCH] Timed out waiting for prefetched %s of '%s'", content_type, section_title)
+    except Exception as e:
+        logging.error("[PREFETCH] Prefetched %s of '%s' failed: %s", content_type, section_title, e)
+
+
+def schedule_after(session_id, subject, topic, section_title, content_type):
+    """Starts generating the steps that follow (section_title, content_type) for this session."""
+    global _pending
+    if not PREFETCH_ENABLED or not session_id:
+        return
+    sections = catalog.get_sections(subject, topic)
+    with _lock:
+        state = _session(session_id, subject, topic)
+        for step in next_steps(sections, section_title, content_type):
+            if step in state.futures:
+                continue
+            if _pending >= PREFETCH_MAX_PENDING:
+                _stats["skipped_capacity"] += 1
+                continue
+            _pending += 1
+            _stats["scheduled"] += 1
+            state.futures[step] = _executor.submit(_run, topic, *step)
+            logging.info("[PREFETCH] Scheduled %s for %s - %s", step[1], topic, step[0])
+
+
+def stats():
+    """Prefetch usage counters for this process."""
+    with _lock:
+        snapshot = dict(_stats)
+        snapshot["pending"] = _pending
+        snapshot["tracked_sessions"] = len(_sessions)
+    snapshot["enabled"] = PREFETCH_ENABLED
+    return snapshot
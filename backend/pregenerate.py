@@ -0,0 +1,231 @@
+# backend/pregenerate.py
+#
+# Offline curriculum pre-generation. Walks every subject/topic/section in
+# the curriculum catalog and generates explanations, solved examples, practice
+# problems and an MCQ pool per topic on a thread pool (the work is I/O-bound;
+# llm_gateway multiplexes the calls). Each result is validated and appended to a
+# journal as soon as it completes, so an interrupted or partly failed run resumes
+# where it stopped. At the end the journal is written out as a content pack
+# (content_pack.py) that the app memory-maps at startup and serves without LLM calls.
+#
+#   cd backend
+#   python pregenerate.py --workers 8 --mcqs-per-topic 30        # writes var/content.pack
+#   python pregenerate.py                                        # re-run to resume after failures
+#   LLM_BACKEND=local python pregenerate.py --out /tmp/test.pack # offline dry run
+#
+# Restart (or HUP) the gunicorn workers afterwards to pick up the new pack.
+
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Never store placeholder content: fail the entry instead, so a re-run retries it.
+os.environ["LLM_DEGRADED_MODE"] = "0"
+
+import catalog
+import content_cache
+import content_pack
+import gemini_interaction
+import llm_gateway
+import log_setup
+
+
+def _text_ok(value):
+    return content_cache.is_cacheable(value) and isinstance(value, str)
+
+
+def _problem_ok(q):
+    return q is not None and not gemini_interaction._mcq_rejection_reason(q)
+
+
+# Per-section content type -> (generator(topic, section_title), validator)
+SECTION_GENERATORS = {
+    "explanation": (gemini_interaction.generate_explanation, _text_ok),
+    "solved example": (gemini_interaction.generate_solved_example, _text_ok),
+    "problem": (gemini_interaction.generate_problem, _problem_ok),
+}
+
+
+def plan_jobs(subjects):
+    """One job per (content type, topic, section) plus one MCQ pool job per topic."""
+    jobs = []
+    for subject in subjects:
+        for topic in catalog.get_topics(subject):
+            for section_title in catalog.get_sections(subject, topic):
+                for content_type in SECTION_GENERATORS:
+                    jobs.append((content_type, topic, section_title))
+            jobs.append(("mcqs", topic, None))
+    return jobs
+
+
+class Journal:
+    """Append-only JSONL record of completed entries; the first line pins the prompt version and model."""
+
+    def __init__(self, path, fresh):
+        self.path = path
+        self.entries = {}
+        self._lock = threading.Lock()
+        header = {"prompt_version": gemini_interaction.PROMPT_VERSION, "model": gemini_interaction.MODEL_NAME}
+        if fresh or not os.path.exists(path):
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, "w") as f:
+                f.write(json.dumps(header) + "\n")
+        else:
+            self._read(header)
+        self._file = open(path, "a")
+
+    def _read(self, header):
+        with open(self.path) as f:
+            lines = f.read().splitlines()
+        if not lines or json.loads(lines[0]) != header:
+            sys.exit(f"{self.path} was written for a different prompt version or model; re-run with --fresh")
+        for line in lines[1:]:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # A line cut short by a crash.
+            self.entries[tuple(record["key"])] = record["value"]
+
+    def record(self, key, value):
+        with self._lock:
+            self.entries[key] = value
+            self._file.write(json.dumps({"key": list(key), "value": value}) + "\n")
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def run_section_job(journal, content_type, topic, section_title, retries):
+    generate, valid = SECTION_GENERATORS[content_type]
+    for attempt in range(retries + 1):
+        value = generate(topic, section_title)
+        if valid(value):
+            journal.record((content_type, topic, section_title), value)
+            return True
+        logging.warning("[PREGENERATE] %s for %s / %s failed (attempt %s)", content_type, topic, section_title, attempt + 1)
+    return False
+
+
+def run_mcq_pool_job(journal, topic, total, batch_size, retries):
+    """
+    Generates a topic's MCQ pool batch by batch. Each batch lists the questions already
+    accepted so the pool does not fill up with repeats (identical concurrent prompts
+    would also be coalesced into one call by llm_gateway). Finished batches are
+    journalled individually, so a resumed run continues with the next batch.
+    """
+    accepted_texts = [q["question_text"] for key, batch in sorted(journal.entries.items())
+                      if key[0] == "mcqs" and key[1] == topic for q in batch]
+    batches = -(-total // batch_size) if total > 0 else 0
+    for batch in range(batches):
+        key = ("mcqs", topic, f"batch-{batch}")
+        if key in journal.entries:
+            continue
+        size = min(batch_size, total - batch * batch_size)
+        questions = []
+        for attempt in range(retries + 1):
+            questions = gemini_interaction.generate_mcqs(topic, num_questions=size, allow_degraded=False, avoid=accepted_texts)
+            if questions:
+                break
+            logging.warning("[PREGENERATE] MCQ batch %s for %s failed (attempt %s)", batch, topic, attempt + 1)
+        if not questions:
+            return False
+        journal.record(key, questions)
+        accepted_texts += [q["question_text"] for q in questions]
+    return True
+
+
+def _is_done(journal, job, args):
+    content_type, topic, section_title = job
+    if content_type != "mcqs":
+        return job in journal.entries
+    batches = -(-args.mcqs_per_topic // args.mcq_batch) if args.mcqs_per_topic > 0 else 0
+    return all(("mcqs", topic, f"batch-{batch}") in journal.entries for batch in range(batches))
+
+
+def build_entries(journal_entries):
+    """Journal entries as pack entries: MCQ batches are merged (and de-duplicated) per topic."""
+    entries = {}
+    pools = {}
+    for (content_type, topic, section_key), value in journal_entries.items():
+        if content_type == "mcqs":
+            pools.setdefault(topic, []).extend(value)
+        else:
+            entries[(content_type, topic, section_key)] = value
+    for topic, questions in pools.items():
+        unique = {}
+        for q in questions:
+            unique.setdefault(" ".join(q["question_text"].lower().split()), q)
+        entries[("mcqs", topic, "")] = list(unique.values())
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-generate the curriculum into a content pack.")
+    parser.add_argument("--out", default=content_pack.PACK_PATH, help="Pack file to write")
+    parser.add_argument("--journal", help="Resume journal (default: <out>.journal.jsonl)")
+    parser.add_argument("--subject", action="append", help="Only this subject (repeatable)")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--mcqs-per-topic", type=int, default=30)
+    parser.add_argument("--mcq-batch", type=int, default=5, help="MCQs requested per call")
+    parser.add_argument("--retries", type=int, default=2, help="Extra attempts per entry before giving up")
+    parser.add_argument("--pack-version", help="Version label stored in the pack (default: UTC timestamp)")
+    parser.add_argument("--fresh", action="store_true", help="Ignore the journal and start over")
+    args = parser.parse_args()
+    log_setup.configure(default_format="text")
+
+    if not gemini_interaction.configure_backend():
+        sys.exit("No LLM backend available (set GOOGLE_API_KEY, or LLM_BACKEND=local).")
+
+    subjects = args.subject or catalog.get_subjects()
+    journal = Journal(args.journal or f"{args.out}.journal.jsonl", args.fresh)
+    jobs = [job for job in plan_jobs(subjects) if not _is_done(journal, job, args)]
+    logging.info("[PREGENERATE] %s entries already done, %s jobs to run", len(journal.entries), len(jobs))
+
+    def run(job):
+        content_type, topic, section_title = job
+        with llm_gateway.background():  # offline work: never worth a hedged backup call
+            if content_type == "mcqs":
+                return run_mcq_pool_job(journal, topic, args.mcqs_per_topic, args.mcq_batch, args.retries)
+            return run_section_job(journal, content_type, topic, section_title, args.retries)
+
+    started = time.monotonic()
+    failed = []
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        futures = {pool.submit(run, job): job for job in jobs}
+        for done, future in enumerate(as_completed(futures), 1):
+            job = futures[future]
+            try:
+                ok = future.result()
+            except Exception as e:
+                logging.error("[PREGENERATE] %s for %s / %s raised: %s", job[0], job[1], job[2], e)
+                ok = False
+            if not ok:
+                failed.append(job)
+            if done % 10 == 0 or done == len(jobs):
+                logging.info("[PREGENERATE] %s/%s done (%s failed, %.0fs)", done, len(jobs), len(failed), time.monotonic() - started)
+    journal.close()
+
+    entries = build_entries(journal.entries)
+    metadata = content_pack.write_pack(args.out, entries, {
+        "pack_version": args.pack_version or time.strftime("%Y%m%dT%H%M%SZ", time.gmtime()),
+        "prompt_version": gemini_interaction.PROMPT_VERSION,
+        "model": gemini_interaction.model.model_name,
+        "subjects": subjects,
+    })
+    size_kb = os.path.getsize(args.out) / 1024
+    print(f"Wrote {args.out}: {metadata['entries']} entries, {size_kb:.0f} KiB, version {metadata['pack_version']}")
+    if failed:
+        print(f"{len(failed)} entries failed and are not in the pack (served live). Re-run to retry them:")
+        for content_type, topic, section_title in failed[:20]:
+            print(f"  {content_type}: {topic}" + (f" / {section_title}" if section_title else ""))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
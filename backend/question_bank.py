@@ -0,0 +1,356 @@
+# backend/question_bank.py
+#
+# Persistent bank of every validated MCQ the app generates (generate_mcqs and
+# generate_problem), so a question paid for once can be served to other students
+# instead of being thrown away. One SQLite database shared by all workers on a host
+# (WAL mode, see sqlite_store.py).
+#
+# Inserts reject exact duplicates (normalized question text) and near-duplicates:
+# each question gets a one-permutation MinHash signature (one hash per shingle, with
+# rotation densification for empty bins) over character shingles of its text and
+# options, and LSH buckets (NUM_BANDS bands of ROWS_PER_BAND values, scoped to the
+# topic) find the few stored questions similar enough to compare. A candidate whose
+# estimated Jaccard similarity is at least NEAR_DUP_THRESHOLD blocks the insert.
+#
+# fetch_unseen() returns N questions for (topic, section, difficulty) that a session
+# has not been served yet, via a range scan on the (topic, section, difficulty, id)
+# index from a random starting id. Sessions' served questions are recorded by
+# fingerprint, so questions served from the pool, the pack or a live call count too.
+#
+#   python question_bank.py export bank.jsonl      # one {"topic", "section", "difficulty", "question"} per line
+#   python question_bank.py import bank.jsonl
+#   python question_bank.py stats
+
+import argparse
+import array
+import hashlib
+import json
+import logging
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import sqlite_store
+
+# --- Configuration ---
+# Set QUESTION_BANK_DB to an empty string to disable the bank.
+QUESTION_BANK_DB = os.environ.get("QUESTION_BANK_DB", sqlite_store.default_path("question_bank.sqlite3"))
+NEAR_DUP_THRESHOLD = float(os.environ.get("QUESTION_BANK_NEAR_DUP", 0.7))
+SEEN_TTL_SECONDS = float(os.environ.get("QUESTION_BANK_SEEN_TTL", 30 * 86400))
+DEFAULT_DIFFICULTY = "standard"
+_PURGE_EVERY_N_WRITES = 1000
+
+# MinHash/LSH parameters: 16 bands of 4 rows put the LSH threshold near 0.5, so pairs
+# at the default 0.7 rejection threshold become candidates with probability ~0.99.
+# (A one-word rewording of a typical question scores ~0.8, a numeric variant ~0.4.)
+NUM_PERM = 64
+NUM_BANDS = 16
+ROWS_PER_BAND = NUM_PERM // NUM_BANDS
+SHINGLE_SIZE = 5
+_EMPTY_BIN = 1 << 32
+_DENSIFY_OFFSET = 0x9E3779B1  # Added per step when an empty bin borrows a neighbour's value.
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS questions (
+    id INTEGER PRIMARY KEY,
+    topic TEXT NOT NULL,
+    section TEXT NOT NULL,
+    difficulty TEXT NOT NULL,
+    fingerprint BLOB NOT NULL UNIQUE,
+    signature BLOB NOT NULL,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS questions_by_slot ON questions (topic, section, difficulty, id);
+CREATE TABLE IF NOT EXISTS question_bands (
+    bucket INTEGER NOT NULL,
+    question_id INTEGER NOT NULL,
+    PRIMARY KEY (bucket, question_id)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS question_seen (
+    session_id TEXT NOT NULL,
+    fingerprint BLOB NOT NULL,
+    seen_at REAL NOT NULL,
+    PRIMARY KEY (session_id, fingerprint)) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS question_seen_by_time ON question_seen (seen_at);
+"""
+
+_conn = sqlite_store.ThreadLocalConnection(QUESTION_BANK_DB, _SCHEMA) if QUESTION_BANK_DB else None
+_lock = threading.Lock()
+_writes = 0
+_writer = None
+_writer_pid = None
+_stats = {"added": 0, "rejected_duplicate": 0, "rejected_near_duplicate": 0, "served": 0, "fetch_misses": 0}
+
+
+def _normalized(text):
+    return " ".join(str(text).lower().split())
+
+
+def fingerprint(question):
+    """Exact-duplicate key: SHA-1 of the normalized question text (the same rule as mcq_pool)."""
+    return hashlib.sha1(_normalized(question.get("question_text", "")).encode("utf-8")).digest()
+
+
+def signature(question):
+    """
+    MinHash signature (NUM_PERM 32-bit values) over character shingles of the text and options.
+    Each shingle is hashed once: the low bits pick a bin and the next 32 bits compete for its
+    minimum. An empty bin takes the next non-empty bin's value (circularly) plus an offset per
+    step, which keeps equal-bin probability equal to the Jaccard similarity.
+    """
+    options = question.get("options") or []
+    text = _normalized(" ".join([str(question.get("question_text", ""))] + [str(option) for option in options]))
+    bins = [_EMPTY_BIN] * NUM_PERM
+    for shingle in {text[i:i + SHINGLE_SIZE] for i in range(max(1, len(text) - SHINGLE_SIZE + 1))}:
+        h = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+        index, value = h % NUM_PERM, (h // NUM_PERM) & 0xFFFFFFFF
+        if value < bins[index]:
+            bins[index] = value
+    filled = list(bins)
+    for index, value in enumerate(bins):
+        step = 0
+        while value == _EMPTY_BIN:
+            step += 1
+            value = bins[(index + step) % NUM_PERM]
+        filled[index] = (value + step * _DENSIFY_OFFSET) & 0xFFFFFFFF
+    return array.array("I", filled)
+
+
+def _buckets(topic, sig):
+    """One LSH bucket id per band; buckets are scoped to the topic."""
+    buckets = []
+    for band in range(NUM_BANDS):
+        rows = sig[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND].tobytes()
+        digest = hashlib.blake2b(topic.encode("utf-8") + bytes([band]) + rows, digest_size=8).digest()
+        buckets.append(int.from_bytes(digest, "little", signed=True))
+    return buckets
+
+
+def _similarity(sig, other_blob):
+    other = array.array("I")
+    other.frombytes(other_blob)
+    return sum(1 for x, y in zip(sig, other) if x == y) / NUM_PERM
+
+
+def _insert(conn, question, topic, section, difficulty, fp, sig, now):
+    """Inserts one question inside the caller's transaction. Returns "added" or the rejection reason."""
+    if conn.execute("SELECT 1 FROM questions WHERE fingerprint = ?", (fp,)).fetchone():
+        return "rejected_duplicate"
+    buckets = _buckets(topic, sig)
+    placeholders = ",".join("?" * len(buckets))
+    candidates = conn.execute(
+        f"SELECT DISTINCT q.signature FROM question_bands b JOIN questions q ON q.id = b.question_id"
+        f" WHERE b.bucket IN ({placeholders})", buckets).fetchall()
+    if any(_similarity(sig, blob) >= NEAR_DUP_THRESHOLD for (blob,) in candidates):
+        return "rejected_near_duplicate"
+    payload = json.dumps({k: v for k, v in question.items() if k != "id"}, separators=(",", ":"))
+    question_id = conn.execute(
+        "INSERT INTO questions (topic, section, difficulty, fingerprint, signature, payload, created_at)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (topic, section, question.get("difficulty") or difficulty, fp, sig.tobytes(), payload, now)).lastrowid
+    conn.executemany("INSERT OR IGNORE INTO question_bands (bucket, question_id) VALUES (?, ?)",
+                     [(bucket, question_id) for bucket in buckets])
+    return "added"
+
+
+def add(questions, topic, section_title="", difficulty=DEFAULT_DIFFICULTY):
+    """
+    Stores validated MCQ dicts for (topic, section_title, difficulty); a question's own
+    "difficulty" key takes precedence. Returns the number added (duplicates are skipped).
+    """
+    if _conn is None or not questions:
+        return 0
+    return _add_many([(q, topic, section_title or "", difficulty) for q in questions])
+
+
+def _add_many(rows):
+    outcomes = {}
+    # Hashing is the expensive part; do it before taking the write lock.
+    prepared = [(row, fingerprint(row[0]), signature(row[0])) for row in rows]
+    conn = _conn.get()
+    now = time.time()
+    try:
+        # IMMEDIATE takes the write lock up front, so the near-duplicate check and the insert
+        # are atomic across workers.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for (question, topic, section, difficulty), fp, sig in prepared:
+                outcome = _insert(conn, question, topic, section, difficulty, fp, sig, now)
+                outcomes[outcome] = outcomes.get(outcome, 0) + 1
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    except sqlite3.Error as e:
+        logging.error("[QUESTION BANK] Insert failed: %s", e)
+        return 0
+    with _lock:
+        for outcome, count in outcomes.items():
+            _stats[outcome] += count
+    return outcomes.get("added", 0)
+
+
+def record(questions, topic, section_title="", difficulty=DEFAULT_DIFFICULTY):
+    """add() on a background thread, so the MinHash and SQLite write stay off the request path."""
+    global _writer, _writer_pid
+    if _conn is None or not questions:
+        return
+    with _lock:
+        if _writer is None or _writer_pid != os.getpid():
+            _writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="question-bank")
+            _writer_pid = os.getpid()
+        writer = _writer
+    questions = [dict(q) for q in questions]
+    writer.submit(_record_safely, questions, topic, section_title, difficulty)
+
+
+def _record_safely(questions, topic, section_title, difficulty):
+    try:
+        add(questions, topic, section_title, difficulty)
+    except Exception as e:
+        logging.error("[QUESTION BANK] Could not record questions for '%s': %s", topic, e)
+
+
+def fetch_unseen(topic, num_questions, session_id=None, section_title="", difficulty=DEFAULT_DIFFICULTY):
+    """
+    num_questions stored questions for (topic, section_title, difficulty) that session_id has
+    not been served, starting from a random id so sessions spread over the bank. They are
+    marked as seen. Returns None when the bank cannot supply enough (the caller generates live).
+    """
+    if _conn is None:
+        return None
+    section = section_title or ""
+    slot = (topic, section, difficulty)
+    try:
+        conn = _conn.get()
+        low, high = conn.execute(
+            "SELECT (SELECT min(id) FROM questions WHERE topic = ? AND section = ? AND difficulty = ?),"
+            " (SELECT max(id) FROM questions WHERE topic = ? AND section = ? AND difficulty = ?)", slot + slot).fetchone()
+        rows = []
+        if low is not None:
+            pivot = random.randint(low, high)
+            unseen = ("SELECT fingerprint, payload FROM questions q WHERE topic = ? AND section = ? AND difficulty = ?"
+                      " AND id {op} ? AND NOT EXISTS (SELECT 1 FROM question_seen s"
+                      " WHERE s.session_id = ? AND s.fingerprint = q.fingerprint) ORDER BY id LIMIT ?")
+            rows = conn.execute(unseen.format(op=">="), slot + (pivot, session_id or "", num_questions)).fetchall()
+            if len(rows) < num_questions:
+                rows += conn.execute(unseen.format(op="<"), slot + (pivot, session_id or "", num_questions - len(rows))).fetchall()
+    except sqlite3.Error as e:
+        logging.error("[QUESTION BANK] Lookup failed for '%s': %s", topic, e)
+        return None
+    if len(rows) < num_questions:
+        with _lock:
+            _stats["fetch_misses"] += 1
+        return None
+    _mark_seen_fingerprints(session_id, [fp for fp, _ in rows])
+    with _lock:
+        _stats["served"] += len(rows)
+    return [dict(json.loads(payload), id=f"q{i + 1}") for i, (_, payload) in enumerate(rows)]
+
+
+def mark_seen(session_id, questions):
+    """Records that session_id was served these questions (from any source)."""
+    if _conn is None or not session_id or not questions:
+        return
+    _mark_seen_fingerprints(session_id, [fingerprint(q) for q in questions])
+
+
+def _mark_seen_fingerprints(session_id, fingerprints):
+    global _writes
+    if not session_id:
+        return
+    now = time.time()
+    try:
+        conn = _conn.get()
+        conn.executemany("INSERT OR REPLACE INTO question_seen (session_id, fingerprint, seen_at) VALUES (?, ?, ?)",
+                         [(session_id, fp, now) for fp in fingerprints])
+        with _lock:
+            _writes += 1
+            purge = _writes % _PURGE_EVERY_N_WRITES == 0
+        if purge:
+            conn.execute("DELETE FROM question_seen WHERE seen_at < ?", (now - SEEN_TTL_SECONDS,))
+    except sqlite3.Error as e:
+        logging.error("[QUESTION BANK] Could not record served questions for session %s: %s", session_id, e)
+
+
+def import_jsonl(path, batch_size=1000):
+    """Bulk import of export_jsonl() output. Returns (added, skipped)."""
+    if _conn is None:
+        raise RuntimeError("The question bank is disabled (QUESTION_BANK_DB is empty)")
+    added = total = 0
+    batch = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            batch.append((record["question"], record["topic"], record.get("section") or "",
+                          record.get("difficulty") or DEFAULT_DIFFICULTY))
+            if len(batch) >= batch_size:
+                added += _add_many(batch)
+                total += len(batch)
+                batch = []
+    if batch:
+        added += _add_many(batch)
+        total += len(batch)
+    return added, total - added
+
+
+def export_jsonl(path, topic=None):
+    """Writes every stored question (or one topic's) as JSONL. Returns the number written."""
+    if _conn is None:
+        raise RuntimeError("The question bank is disabled (QUESTION_BANK_DB is empty)")
+    query = "SELECT topic, section, difficulty, payload FROM questions"
+    params = ()
+    if topic:
+        query += " WHERE topic = ?"
+        params = (topic,)
+    written = 0
+    with open(path, "w") as f:
+        for row_topic, section, difficulty, payload in _conn.get().execute(query + " ORDER BY id", params):
+            f.write(json.dumps({"topic": row_topic, "section": section, "difficulty": difficulty,
+                                "question": json.loads(payload)}) + "\n")
+            written += 1
+    return written
+
+
+def stats():
+    """Insert/serve counters for this process, plus the bank size (highest id; rows are never deleted)."""
+    with _lock:
+        snapshot = dict(_stats)
+    snapshot["enabled"] = _conn is not None
+    snapshot["questions"] = 0
+    if _conn is not None:
+        try:
+            snapshot["questions"] = _conn.get().execute("SELECT max(id) FROM questions").fetchone()[0] or 0
+        except sqlite3.Error:
+            pass
+    return snapshot
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import/export for the question bank.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export")
+    export_parser.add_argument("path")
+    export_parser.add_argument("--topic")
+    commands.add_parser("import").add_argument("path")
+    commands.add_parser("stats")
+    args = parser.parse_args()
+
+    if _conn is None:
+        sys.exit("The question bank is disabled (QUESTION_BANK_DB is empty)")
+    if args.command == "export":
+        print(f"Exported {export_jsonl(args.path, args.topic)} questions to {args.path}")
+    elif args.command == "import":
+        added, skipped = import_jsonl(args.path)
+        print(f"Imported {added} questions from {args.path} ({skipped} duplicates skipped)")
+    else:
+        print(json.dumps(stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
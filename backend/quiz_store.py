@@ -0,0 +1,108 @@
+# backend/quiz_store.py
+#
+# Server-side storage for generated quizzes and practice problems. The client only
+# receives the questions without their answers plus a quiz id; grading looks the
+# answer key up here. Entries live in a SQLite database shared by all workers and
+# expire after QUIZ_TTL_SECONDS.
+
+import json
+import logging
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+import permute
+import sqlite_store
+
+# --- Configuration ---
+# Set QUIZ_STORE_DB to an empty string to keep quizzes in process memory only (single worker).
+QUIZ_STORE_DB = os.environ.get("QUIZ_STORE_DB", sqlite_store.default_path("quiz_store.sqlite3"))
+QUIZ_TTL_SECONDS = float(os.environ.get("QUIZ_TTL_SECONDS", 6 * 3600))
+ASSIGNMENT_TTL_SECONDS = float(os.environ.get("ASSIGNMENT_TTL_SECONDS", 14 * 24 * 3600))  # class assignments live longer
+_PURGE_EVERY_N_WRITES = 500
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS quizzes ("
+    " quiz_id TEXT PRIMARY KEY,"
+    " payload TEXT NOT NULL,"
+    " expires_at REAL NOT NULL);"
+)
+
+_conn = sqlite_store.ThreadLocalConnection(QUIZ_STORE_DB, _SCHEMA) if QUIZ_STORE_DB else None
+_memory = {}  # quiz_id -> (expires_at, payload); used when QUIZ_STORE_DB is empty
+_lock = threading.Lock()
+_writes = 0
+
+
+def public_question(question, view_key=None):
+    """
+    The view of a stored question that is safe to send to the client (no answer key), with
+    options ordered for view_key (see permute.py). Pass the same view_key to create_quiz.
+    """
+    return {key: value for key, value in permute.view(question, view_key).items() if key not in ("correct_answer", "degraded")}
+
+
+def create_quiz(kind, questions, **context):
+    """
+    Stores questions (MCQ dicts including correct_answer) and returns a new quiz id.
+    kind is "mcq" or "problem" (one student's quiz or problem), or "assignment" (one quiz
+    handed out to a whole class, kept for ASSIGNMENT_TTL_SECONDS); context holds whatever the grader needs later
+    (subject, topic, section_title, the view_key the questions were shown with, and
+    degraded=True for offline placeholder questions, which are not a real assessment).
+    """
+    global _writes
+    quiz_id = secrets.token_urlsafe(12)
+    # Separators without spaces keep the stored payload compact.
+    payload = json.dumps({"kind": kind, "questions": questions, **context}, separators=(",", ":"))
+    expires_at = time.time() + (ASSIGNMENT_TTL_SECONDS if kind == "assignment" else QUIZ_TTL_SECONDS)
+
+    if _conn is None:
+        with _lock:
+            _memory[quiz_id] = (expires_at, payload)
+            _writes += 1
+            if _writes % _PURGE_EVERY_N_WRITES == 0:
+                now = time.time()
+                for key in [k for k, (exp, _) in _memory.items() if exp < now]:
+                    del _memory[key]
+        return quiz_id
+
+    conn = _conn.get()
+    conn.execute("INSERT INTO quizzes (quiz_id, payload, expires_at) VALUES (?, ?, ?)", (quiz_id, payload, expires_at))
+    with _lock:
+        _writes += 1
+        purge = _writes % _PURGE_EVERY_N_WRITES == 0
+    if purge:
+        conn.execute("DELETE FROM quizzes WHERE expires_at < ?", (time.time(),))
+    return quiz_id
+
+
+def get_quiz(quiz_id):
+    """Returns the stored quiz dict, or None if it never existed or has expired."""
+    if not quiz_id:
+        return None
+    if _conn is None:
+        with _lock:
+            entry = _memory.get(quiz_id)
+    else:
+        try:
+            entry = _conn.get().execute(
+                "SELECT expires_at, payload FROM quizzes WHERE quiz_id = ?", (quiz_id,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logging.error("Quiz store: lookup failed for %s: %s", quiz_id, e)
+            return None
+    if entry is None or entry[0] < time.time():
+        return None
+    return json.loads(entry[1])
+
+
+def student_questions(quiz):
+    """The quiz's questions as its student saw them, rebuilt from the stored canonical questions."""
+    return [permute.view(q, quiz.get("view_key")) for q in quiz["questions"]]
+
+
+def answer_key(quiz):
+    """Maps question id -> correct answer so each submitted answer is graded with one dict lookup."""
+    return {q["id"]: q["correct_answer"] for q in student_questions(quiz)}
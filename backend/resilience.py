@@ -0,0 +1,171 @@
+# backend/resilience.py
+#
+# Building blocks for calling a rate-limited upstream API: a token bucket for
+# client-side admission control, classification of retryable errors, jittered
+# exponential backoff and a circuit breaker. llm_gateway composes these around
+# every Gemini call.
+
+import random
+import threading
+import time
+
+# HTTP / gRPC-mapped status codes worth retrying: quota, server errors, timeouts.
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+# Exception class names (matched by name so the SDK does not have to be imported here).
+RETRYABLE_ERROR_NAMES = {
+    "ResourceExhausted",
+    "TooManyRequests",
+    "ServiceUnavailable",
+    "InternalServerError",
+    "DeadlineExceeded",
+    "GatewayTimeout",
+    "Aborted",
+    "TimeoutError",
+    "ConnectionError",
+    "ConnectionResetError",
+}
+
+
+def is_retryable(error):
+    """True for transient failures (rate limiting, 5xx, timeouts, dropped connections)."""
+    code = getattr(error, "code", None)
+    if isinstance(code, int) and code in RETRYABLE_STATUS_CODES:
+        return True
+    return any(cls.__name__ in RETRYABLE_ERROR_NAMES for cls in type(error).__mro__)
+
+
+def is_rate_limit(error):
+    code = getattr(error, "code", None)
+    return code == 429 or type(error).__name__ in ("ResourceExhausted", "TooManyRequests")
+
+
+def backoff_delay(attempt, base_seconds, cap_seconds):
+    """'Full jitter' exponential backoff: uniform in [0, min(cap, base * 2**attempt)]."""
+    return random.uniform(0, min(cap_seconds, base_seconds * (2 ** attempt)))
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at rate_per_minute, holding at most capacity tokens.
+    A rate of 0 disables the bucket (every request is admitted).
+    """
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = float(capacity if capacity is not None else rate_per_minute)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.rate_per_second > 0
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate_per_second)
+        self._updated = now
+
+    def try_acquire(self, amount=1.0):
+        """
+        Takes amount tokens if available and returns 0. Otherwise takes nothing and returns
+        the number of seconds until enough tokens will have accumulated.
+        """
+        if not self.enabled:
+            return 0.0
+        # Requests larger than the bucket could never be admitted; cap them at a full bucket.
+        amount = min(float(amount), self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if self._tokens >= amount:
+                self._tokens -= amount
+                return 0.0
+            return (amount - self._tokens) / self.rate_per_second
+
+    def refund(self, amount):
+        """Returns tokens taken for a request that was not sent after all."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+    def charge(self, amount):
+        """Takes tokens for usage that has already happened: the bucket may go into debt."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= amount
+
+    def available(self):
+        if not self.enabled:
+            return float("inf")
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+
+class CircuitBreaker:
+    """
+    Classic three-state breaker. CLOSED passes calls through and counts consecutive
+    failures; after failure_threshold it goes OPEN and rejects calls for
+    cooldown_seconds; then HALF_OPEN lets a single probe through, which closes the
+    breaker on success or re-opens it on failure.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold, cooldown_seconds):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.times_opened = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown_seconds:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow_request(self):
+        """True if a call may be attempted now. In HALF_OPEN only one probe is allowed at a time."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.cooldown_seconds:
+                    return False
+                self._state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive_failures += 1
+            if self._state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.times_opened += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def release_probe(self):
+        """Frees the half-open probe slot when the probe ended without a verdict (e.g. a caller error)."""
+        with self._lock:
+            self._probe_in_flight = False
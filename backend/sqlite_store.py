@@ -0,0 +1,43 @@
+# backend/sqlite_store.py
+#
+# Small helper shared by the SQLite-backed stores (content cache, quiz sessions).
+# Every gunicorn worker on a host opens the same database file in WAL mode, which
+# lets readers proceed while one writer commits.
+
+import os
+import sqlite3
+import threading
+
+DEFAULT_DATA_DIR = os.environ.get(
+    "EDURO_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "var")
+)
+
+
+def default_path(filename):
+    """Path of a database file inside the shared data directory (EDURO_DATA_DIR, default backend/var/)."""
+    return os.path.join(DEFAULT_DATA_DIR, filename)
+
+
+class ThreadLocalConnection:
+    """
+    Hands out one sqlite3 connection per thread per process. Connections are never shared
+    across a fork: a worker that inherits this object from the master opens its own.
+    """
+
+    def __init__(self, db_path, schema_sql):
+        self.db_path = db_path
+        self.schema_sql = schema_sql
+        self._local = threading.local()
+
+    def get(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=5.0, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(self.schema_sql)
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
@@ -0,0 +1,100 @@
+// Service worker: keeps the app shell and the subject/topic lists available on slow or
+// dropped connections. Lesson text is cached by the page itself (IndexedDB, see script.js).
+//   - page loads: network first, falling back to the cached shell when offline;
+//   - scripts, stylesheets and fonts: cache first (index.html names them with ?v=<hash>),
+//     falling back to any cached version of the file when offline;
+//   - GET /api/subjects and /api/topics: served from cache and refreshed in the background.
+// Bump SHELL_CACHE to drop every cached response on the next visit.
+const SHELL_CACHE = 'eduro-shell-v1';
+const SHELL_URLS = ['./', 'style.css', 'script.js'];
+const CATALOG_PATHS = ['/api/subjects', '/api/topics'];
+
+self.addEventListener('install', event => {
+    event.waitUntil(
+        caches.open(SHELL_CACHE)
+            .then(cache => cache.addAll(SHELL_URLS))
+            .then(() => self.skipWaiting())
+    );
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil(
+        caches.keys()
+            .then(names => Promise.all(names.filter(name => name !== SHELL_CACHE).map(name => caches.delete(name))))
+            .then(() => self.clients.claim())
+    );
+});
+
+// Stores a response, replacing older versions of the same path (other ?v= hashes).
+async function putLatest(cache, request, response) {
+    const url = new URL(request.url);
+    if (url.searchParams.has('v')) {
+        const stale = await cache.keys();
+        await Promise.all(stale
+            .filter(old => {
+                const oldUrl = new URL(old.url);
+                return oldUrl.origin === url.origin && oldUrl.pathname === url.pathname && oldUrl.search !== url.search;
+            })
+            .map(old => cache.delete(old)));
+    }
+    await cache.put(request, response);
+}
+
+async function networkFirst(request) {
+    const cache = await caches.open(SHELL_CACHE);
+    try {
+        const response = await fetch(request);
+        if (response.ok) await cache.put('./', response.clone());
+        return response;
+    } catch (error) {
+        const cached = await cache.match('./');
+        if (cached) return cached;
+        throw error;
+    }
+}
+
+async function cacheFirst(request) {
+    const cache = await caches.open(SHELL_CACHE);
+    const cached = await cache.match(request);
+    if (cached) return cached;
+    try {
+        const response = await fetch(request);
+        if (response.ok || response.type === 'opaque') await putLatest(cache, request, response.clone());
+        return response;
+    } catch (error) {
+        // Offline with a version never fetched (e.g. the first visit): any cached copy of the file.
+        const fallback = await cache.match(request, { ignoreSearch: true });
+        if (fallback) return fallback;
+        throw error;
+    }
+}
+
+async function staleWhileRevalidate(event) {
+    const cache = await caches.open(SHELL_CACHE);
+    const cached = await cache.match(event.request);
+    const refresh = fetch(event.request).then(response => {
+        if (response.ok) return cache.put(event.request, response.clone()).then(() => response);
+        return response;
+    });
+    if (cached) {
+        event.waitUntil(refresh.catch(() => null));
+        return cached;
+    }
+    return refresh;
+}
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    if (request.method !== 'GET') return;
+    const url = new URL(request.url);
+
+    if (CATALOG_PATHS.some(path => url.pathname.endsWith(path))) {
+        event.respondWith(staleWhileRevalidate(event));
+    } else if (url.pathname.includes('/api/')) {
+        return; // Everything else from the API is per student or per request.
+    } else if (request.mode === 'navigate') {
+        event.respondWith(networkFirst(request));
+    } else if (request.destination === 'script' || request.destination === 'style' || request.destination === 'font') {
+        event.respondWith(cacheFirst(request));
+    }
+});
@@ -0,0 +1,177 @@
+# backend/static_assets.py
+#
+# Serving of the front end in static/. Text assets are compressed ahead of time next
+# to the originals (name.gz, and name.br when the brotli module is installed); each
+# request gets the smallest fresh variant its Accept-Encoding allows.
+# index.html refers to its scripts and stylesheets as "name?v=<content hash>", so those
+# URLs can be cached by browsers and proxies for a year: a deploy changes the hash and
+# with it the URL. index.html and the service worker are always revalidated.
+#
+#   cd backend && python static_assets.py      # (re)build the compressed variants
+
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import sys
+import threading
+
+from flask import Response, send_from_directory
+
+import log_setup
+
+try:
+    import brotli
+except ImportError:  # Optional: without it only gzip variants are built.
+    brotli = None
+
+# --- Configuration ---
+ASSET_MAX_AGE = int(os.environ.get("STATIC_ASSET_MAX_AGE", 365 * 24 * 3600))  # for ?v=<hash> URLs
+PRECOMPRESS_ON_START = os.environ.get("STATIC_PRECOMPRESS", "1") != "0"
+COMPRESSIBLE_SUFFIXES = (".html", ".js", ".css", ".json", ".svg", ".txt")
+MIN_COMPRESS_BYTES = 512
+ALWAYS_REVALIDATE = {"index.html", "sw.js"}  # the entry points that name every other URL
+INDEX_FILENAME = "index.html"
+
+# Encodings in order of preference: (Accept-Encoding token, file suffix).
+_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+_LOCAL_ASSET_REF = re.compile(r'(?P<attr>src|href)="(?P<path>[\w./-]+\.(?:js|css))"')
+
+_lock = threading.Lock()
+_hashes = {}  # path -> (mtime_ns, size, short content hash)
+_index = {}   # folder -> (signature, rendered html)
+
+
+def _compress(data, suffix):
+    if suffix == ".br":
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def precompress(folder):
+    """
+    Writes missing or outdated .br/.gz variants of the compressible files in folder.
+    Returns the number of files written; a read-only folder is logged and skipped.
+    """
+    suffixes = [suffix for _, suffix in _ENCODINGS if suffix != ".br" or brotli is not None]
+    written = 0
+    for root, _, files in os.walk(folder):
+        for name in files:
+            if not name.endswith(COMPRESSIBLE_SUFFIXES) or name == INDEX_FILENAME:
+                continue  # index.html is rendered per request (versioned_index)
+            source = os.path.join(root, name)
+            for suffix in suffixes:
+                target = source + suffix
+                if _fresh(source, target):
+                    continue
+                with open(source, "rb") as f:
+                    data = f.read()
+                if len(data) < MIN_COMPRESS_BYTES:
+                    break
+                compressed = _compress(data, suffix)
+                if len(compressed) >= len(data):
+                    continue
+                try:
+                    with open(target + ".tmp", "wb") as f:
+                        f.write(compressed)
+                    os.replace(target + ".tmp", target)
+                except OSError as e:
+                    logging.warning("[STATIC] Cannot write compressed assets in %s: %s", folder, e)
+                    return written
+                written += 1
+    if written:
+        logging.info("[STATIC] Precompressed %s asset variant(s) in %s%s", written, folder, "" if brotli else " (gzip only; brotli not installed)")
+    return written
+
+
+def _fresh(source, variant):
+    try:
+        return os.stat(variant).st_mtime_ns >= os.stat(source).st_mtime_ns
+    except OSError:
+        return False
+
+
+def content_hash(folder, filename):
+    """A short hash of the file's content, recomputed when the file changes; None if it does not exist."""
+    path = os.path.join(folder, filename)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    with _lock:
+        cached = _hashes.get(path)
+    if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return cached[2]
+    with open(path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()[:12]
+    with _lock:
+        _hashes[path] = (stat.st_mtime_ns, stat.st_size, digest)
+    return digest
+
+
+def versioned_index(folder):
+    """index.html with every local script and stylesheet reference suffixed with ?v=<content hash>."""
+    path = os.path.join(folder, INDEX_FILENAME)
+    with open(path, "rb") as f:
+        html = f.read().decode("utf-8")
+    refs = sorted(set(match.group("path") for match in _LOCAL_ASSET_REF.finditer(html)))
+    signature = (hashlib.sha256(html.encode("utf-8")).hexdigest(), tuple(content_hash(folder, ref) for ref in refs))
+    with _lock:
+        cached = _index.get(folder)
+    if cached and cached[0] == signature:
+        return cached[1]
+
+    def versioned(match):
+        digest = content_hash(folder, match.group("path"))
+        if digest is None:
+            return match.group(0)
+        return f'{match.group("attr")}="{match.group("path")}?v={digest}"'
+
+    rendered = _LOCAL_ASSET_REF.sub(versioned, html)
+    with _lock:
+        _index[folder] = (signature, rendered)
+    return rendered
+
+
+def index_response(folder, request):
+    response = Response(versioned_index(folder), mimetype="text/html")
+    response.headers["Cache-Control"] = "no-cache"
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+def send(folder, filename, accept_encodings, version=None):
+    """
+    Response for static/filename: the best fresh compressed variant that the client's
+    Accept-Encoding (a werkzeug Accept) allows, with long-lived caching when version is
+    the file's current content hash.
+    """
+    source = os.path.join(folder, filename)
+    variant, encoding = filename, None
+    if filename.endswith(COMPRESSIBLE_SUFFIXES):
+        for token, suffix in _ENCODINGS:
+            if accept_encodings.quality(token) > 0 and _fresh(source, source + suffix):
+                variant, encoding = filename + suffix, token
+                break
+
+    response = send_from_directory(folder, variant, mimetype=mimetypes.guess_type(filename)[0])
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    if filename.endswith(COMPRESSIBLE_SUFFIXES):
+        response.vary.add("Accept-Encoding")
+    if os.path.basename(filename) in ALWAYS_REVALIDATE or not version:
+        response.headers["Cache-Control"] = "no-cache"
+    elif version == content_hash(folder, filename):
+        response.headers["Cache-Control"] = f"public, max-age={ASSET_MAX_AGE}, immutable"
+    else:
+        # An outdated ?v= (a page from before a deploy): serve the current file, but do not pin it.
+        response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+if __name__ == "__main__":
+    log_setup.configure(default_format="text")
+    static_folder = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+    print(f"{precompress(static_folder)} variant(s) written in {static_folder}")
@@ -0,0 +1,47 @@
+# backend/tests/conftest.py
+#
+# The backend modules read their configuration from the environment when they are
+# imported, so it is set here first: every store lives in a throwaway data directory,
+# metrics stay in process memory and no test can reach Gemini.
+#
+#   cd backend && python -m pytest -q
+
+import os
+import sys
+import tempfile
+import time
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ["EDURO_DATA_DIR"] = tempfile.mkdtemp(prefix="eduro-tests-")
+os.environ["METRICS_DIR"] = ""
+os.environ["LLM_BACKEND"] = "local"
+os.environ["LLM_WARMUP"] = "0"
+os.environ["MCQ_POOL_ENABLED"] = "0"
+os.environ["PREFETCH_ENABLED"] = "0"
+os.environ.pop("GOOGLE_API_KEY", None)
+
+sys.path.insert(0, BACKEND_DIR)
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    """A fresh gateway circuit breaker that opens on one failure and half-opens after 50 ms."""
+    import llm_gateway
+    import resilience
+    breaker = resilience.CircuitBreaker(failure_threshold=1, cooldown_seconds=0.05)
+    monkeypatch.setattr(llm_gateway, "breaker", breaker)
+    monkeypatch.setattr(llm_gateway, "MAX_RETRIES", 0)
+    return breaker
+
+
+@pytest.fixture
+def half_open_breaker(breaker):
+    """The breaker fixture, opened by a failure and past its cooldown: the next call is the probe."""
+    breaker.record_failure()
+    assert breaker.state == breaker.OPEN
+    time.sleep(0.06)
+    assert breaker.state == breaker.HALF_OPEN
+    return breaker
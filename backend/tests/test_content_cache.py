@@ -0,0 +1,47 @@
+# backend/tests/test_content_cache.py
+
+import content_cache
+
+
+def test_a_put_is_served_from_memory_then_from_the_shared_tier(monkeypatch):
+    key = content_cache.make_key("model", "v1", "explanation", "Explain inequalities.")
+    assert content_cache.get(key) is None
+    assert content_cache.put(key, {"text": "An inequality compares two values."})
+
+    served = content_cache.get(key)
+    served["text"] = "changed by a caller"
+    assert content_cache.get(key) == {"text": "An inequality compares two values."}  # callers get copies
+
+    monkeypatch.setattr(content_cache, "_memory", content_cache._MemoryTier(8, 60))  # as in another worker
+    before = content_cache.stats()["persistent_hits"]
+    assert content_cache.get(key) == {"text": "An inequality compares two values."}
+    assert content_cache.stats()["persistent_hits"] == before + 1
+
+
+def test_errors_and_empty_results_are_never_cached():
+    key = content_cache.make_key("model", "v1", "explanation", "Explain fractions.")
+    assert not content_cache.put(key, "[AI Error: quota exceeded]")
+    assert not content_cache.put(key, "")
+    assert content_cache.get(key) is None
+    assert content_cache.put(key, "Fractions are parts of a whole.")
+    assert content_cache.get(key) == "Fractions are parts of a whole."
+
+
+def test_memory_tier_evicts_least_recently_used_and_expired_entries():
+    tier = content_cache._MemoryTier(max_entries=2, ttl_seconds=60)
+    tier.put("a", 1)
+    tier.put("b", 2)
+    tier.get("a")
+    tier.put("c", 3)
+    assert (tier.get("a"), tier.get("b"), tier.get("c")) == (1, None, 3)
+
+    expired = content_cache._MemoryTier(max_entries=2, ttl_seconds=-1)
+    expired.put("a", 1)
+    assert expired.get("a") is None
+
+
+def test_config_fingerprint_separates_generation_configs():
+    assert content_cache.config_fingerprint({"temperature": 0.6}) == {"temperature": 0.6}
+    assert content_cache.config_fingerprint(None) is None
+    assert (content_cache.make_key("model", "v1", "mcqs", "Prompt", {"temperature": 0.6})
+            != content_cache.make_key("model", "v1", "mcqs", "Prompt", {"temperature": 0.7}))
@@ -0,0 +1,64 @@
+# backend/tests/test_degraded.py
+#
+# Placeholder content served while Gemini is unavailable: it is flagged to the client and
+# never graded as a real assessment.
+
+import pytest
+
+import app as app_module
+import catalog
+import event_log
+import gemini_interaction
+import llm_gateway
+import mock_gemini
+import quiz_store
+
+SUBJECT, TOPIC = "Mathematics", "Algebra Basics"
+
+
+@pytest.fixture
+def client():
+    app_module.app.config["TESTING"] = True
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def degraded_mcqs(monkeypatch):
+    def placeholder_quiz(topic, num_questions, session_id):
+        return gemini_interaction._serve_degraded("MCQs", llm_gateway.CircuitOpenError("open"),
+                                                  mock_gemini.generate_mcqs_mock, topic, num_questions)
+    monkeypatch.setattr(app_module, "_draw_or_generate_mcqs", placeholder_quiz)
+
+
+def test_placeholder_quiz_is_flagged_without_leaking_the_flag_per_question(client, degraded_mcqs):
+    data = client.post("/api/initial-mcqs", json={"subject": SUBJECT, "topic": TOPIC, "session_id": "s1"}).get_json()
+    assert data["degraded"] is True
+    assert all("degraded" not in q and "correct_answer" not in q for q in data["questions"])
+
+
+def test_placeholder_quiz_decides_nothing_and_records_nothing(client, degraded_mcqs, monkeypatch):
+    recorded = []
+    monkeypatch.setattr(event_log, "record", lambda *args, **kwargs: recorded.append(args))
+    quiz = client.post("/api/initial-mcqs", json={"subject": SUBJECT, "topic": TOPIC, "session_id": "s2"}).get_json()
+    answers = [{"question_id": q["id"], "selected_answer": option}
+               for q in quiz["questions"] for option in q["options"]]  # every option: would score all correct
+
+    result = client.post("/api/evaluate-initial-mcqs", json={"quiz_id": quiz["quiz_id"], "answers": answers}).get_json()
+
+    assert result["degraded"] is True
+    assert result["all_correct"] is False
+    assert result["sections"] == list(catalog.get_sections(SUBJECT, TOPIC))
+    assert recorded == []
+
+
+def test_placeholder_problem_answer_is_not_recorded(client, monkeypatch):
+    recorded = []
+    monkeypatch.setattr(event_log, "record", lambda *args, **kwargs: recorded.append(args))
+    problem = mock_gemini.generate_problem_mock(TOPIC, "Inequalities")
+    problem_id = quiz_store.create_quiz("problem", [problem], subject=SUBJECT, topic=TOPIC,
+                                        section_title="Inequalities", view_key="s3", degraded=True)
+
+    result = client.post("/api/evaluate-problem-answer", json={"problem_id": problem_id, "user_answer": "5"}).get_json()
+
+    assert result["correct"] is True
+    assert recorded == []
@@ -0,0 +1,102 @@
+# backend/tests/test_event_log.py
+#
+# Learner tokens, and the per-section mastery and placement plan built from recorded answers.
+
+import sqlite3
+
+import pytest
+
+import app as app_module
+import event_log
+import quiz_store
+
+SUBJECT, TOPIC = "Mathematics", "Algebra Basics"
+
+
+def test_learner_token_round_trips_and_rejects_forgeries():
+    token = event_log.issue_learner_token()
+    student = event_log.student_id(token)
+    assert student and token.startswith(student + ".")
+    assert event_log.student_id(event_log.issue_learner_token()) != student
+
+    assert event_log.student_id(student) is None                      # unsigned id
+    assert event_log.student_id(student + ".0" * 16) is None           # wrong signature
+    assert event_log.student_id("someone-else" + token[len(student):]) is None
+    assert event_log.student_id(None) is None
+    assert event_log.student_id("\ud800." + token) is None
+
+
+def test_answers_are_recorded_for_the_signed_learner_only(monkeypatch):
+    recorded = []
+    monkeypatch.setattr(event_log, "record", lambda kind, student, *args, **kwargs: recorded.append(student))
+    client = app_module.app.test_client()
+    problem = {"id": "q1", "question_text": "2 + 2?", "options": ["3", "4"], "correct_answer": "4"}
+
+    def answer(**token):
+        problem_id = quiz_store.create_quiz("problem", [dict(problem)], subject=SUBJECT, topic=TOPIC,
+                                            section_title="Inequalities", view_key="s1")
+        return client.post("/api/evaluate-problem-answer",
+                           json={"problem_id": problem_id, "user_answer": "4", **token}).get_json()
+
+    issued = answer()["learner_token"]
+    assert answer(learner_token=issued)["learner_token"] == issued
+    forged = answer(learner_token="victim.0123456789abcdef0123456789abcdef")["learner_token"]
+
+    assert forged != issued
+    assert recorded == [event_log.student_id(issued)] * 2 + [event_log.student_id(forged)]
+
+
+def _record_and_flush(student, section, *answers):
+    event_log.record("problem", student, SUBJECT, TOPIC, [(section, f"q{i}", correct) for i, correct in enumerate(answers)])
+    event_log.flush()
+
+
+def test_rebuild_replaces_the_mastery_table_in_one_transaction(monkeypatch):
+    student = event_log.student_id(event_log.issue_learner_token())
+    _record_and_flush(student, "Inequalities", True, True, False)
+    before = event_log.mastery(student, SUBJECT, TOPIC)
+    assert before["Inequalities"]["attempts"] == 3
+
+    monkeypatch.setattr(event_log, "_UPSERT", "INSERT INTO no_such_table VALUES (?)")
+    with pytest.raises(sqlite3.Error):
+        event_log.rebuild()
+    assert event_log.mastery(student, SUBJECT, TOPIC) == before  # the failed rebuild rolled back its DELETE
+
+    monkeypatch.undo()
+    event_log.rebuild()
+    assert event_log.mastery(student, SUBJECT, TOPIC) == before
+
+
+def test_mastery_counts_pending_and_written_answers():
+    student = event_log.student_id(event_log.issue_learner_token())
+    _record_and_flush(student, "Inequalities", True, False)
+    event_log.record("problem", student, SUBJECT, TOPIC, [("Inequalities", "q9", True), ("", "q10", False)])
+
+    assert event_log.mastery(student, SUBJECT, TOPIC) == {
+        "Inequalities": {"attempts": 3, "correct": 2, "mastery": 0.6},   # (2 + 1) / (3 + 2)
+        "": {"attempts": 1, "correct": 0, "mastery": 0.333},
+    }
+    assert event_log.mastery(student, SUBJECT, "Geometry") == {}
+
+
+def test_section_plan_skips_mastered_and_expands_weak_sections():
+    student = event_log.student_id(event_log.issue_learner_token())
+    _record_and_flush(student, "Variables and Expressions", True, True, True, True)  # 5/6
+    _record_and_flush(student, "Inequalities", False, False, False)                  # 1/5
+    _record_and_flush(student, "Solving Linear Equations", True, True)               # too few answers
+    sections = ["Variables and Expressions", "Solving Linear Equations", "Inequalities"]
+
+    plan = event_log.section_plan(student, SUBJECT, TOPIC, sections, quiz_score=2 / 3)
+    assert [item["action"] for item in plan] == ["skip", "study", "expand"]
+
+    weak_quiz = event_log.section_plan(student, SUBJECT, TOPIC, sections, quiz_score=1 / 3)
+    assert [item["action"] for item in weak_quiz] == ["study", "study", "expand"]
+
+
+def test_section_plan_always_keeps_one_section():
+    student = event_log.student_id(event_log.issue_learner_token())
+    _record_and_flush(student, "Variables and Expressions", True, True, True, True, True)  # 6/7
+    _record_and_flush(student, "Inequalities", True, True, True, True)                     # 5/6
+
+    plan = event_log.section_plan(student, SUBJECT, TOPIC, ["Variables and Expressions", "Inequalities"], quiz_score=1.0)
+    assert [item["action"] for item in plan] == ["skip", "study"]
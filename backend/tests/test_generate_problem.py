@@ -0,0 +1,33 @@
+# backend/tests/test_generate_problem.py
+
+import json
+
+import gemini_interaction
+
+
+class Response:
+    def __init__(self, questions):
+        self.text = json.dumps(questions)
+
+
+def test_problem_retry_asks_the_model_to_avoid_the_rejected_problem(monkeypatch):
+    invalid = {"id": "q1", "question_text": "What is 2 + 2 in the rejected problem?", "options": ["3", "5", "6", "7"],
+               "correct_answer": "4"}  # answer not among the options
+    valid = {"id": "q1", "question_text": "What is 3 + 3?", "options": ["5", "6", "7", "8"], "correct_answer": "6"}
+    prompts = []
+
+    def fake_send(content_type, model_name, prompt, generation_config, validate=None):
+        prompts.append(prompt)
+        return Response([invalid] if len(prompts) == 1 else [valid])
+
+    monkeypatch.setattr(gemini_interaction, "model", object())
+    monkeypatch.setattr(gemini_interaction, "_send", fake_send)
+    monkeypatch.setattr(gemini_interaction.content_cache, "get", lambda key: None)
+    monkeypatch.setattr(gemini_interaction.content_cache, "put", lambda key, value: True)
+    monkeypatch.setattr(gemini_interaction.question_bank, "record", lambda *args, **kwargs: None)
+
+    problem = gemini_interaction.generate_problem("Algebra Basics", "Retry Test Section")
+
+    assert problem["question_text"] == "What is 3 + 3?"
+    assert invalid["question_text"] not in prompts[0]
+    assert invalid["question_text"] in prompts[1]
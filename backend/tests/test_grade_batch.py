@@ -0,0 +1,63 @@
+# backend/tests/test_grade_batch.py
+#
+# Batch grading is for teachers only, and grades class assignments, never a student's own quiz.
+
+import pytest
+
+import app as app_module
+import quiz_store
+
+TEACHER = {"Authorization": "Bearer teacher-key"}
+
+
+def question(number):
+    return {"id": f"q{number}", "question_text": f"Question {number}?", "options": ["1", "2", "3", "4"], "correct_answer": "2"}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(app_module, "TEACHER_API_KEY", "teacher-key")
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def assignment():
+    return quiz_store.create_quiz("assignment", [question(1), question(2)], subject="Mathematics",
+                                  topic="Algebra Basics", view_key="class")
+
+
+def sheets(assignment_id):
+    shown = quiz_store.student_questions(quiz_store.get_quiz(assignment_id))
+    return [{"student_id": option, "answers": {q["id"]: option for q in shown}} for option in shown[0]["options"]]
+
+
+def test_grade_batch_requires_the_teacher_token(client, assignment, monkeypatch):
+    body = {"assignment_id": assignment, "submissions": sheets(assignment)}
+    assert client.post("/api/grade-batch", json=body).status_code == 401
+    assert client.post("/api/grade-batch", json=body, headers={"Authorization": "Bearer guess"}).status_code == 401
+
+    monkeypatch.setattr(app_module, "TEACHER_API_KEY", "")
+    assert client.post("/api/grade-batch", json=body, headers={"Authorization": "Bearer "}).status_code == 403
+
+
+def test_grade_batch_grades_assignments_only(client, assignment):
+    result = client.post("/api/grade-batch", headers=TEACHER,
+                         json={"assignment_id": assignment, "submissions": sheets(assignment)}).get_json()
+    assert result["students"] == 4 and result["all_correct"] == 1
+    assert {row["student_id"]: row["score"] for row in result["results"]}["2"] == 2
+
+    own_quiz = quiz_store.create_quiz("mcq", [question(1)], subject="Mathematics", topic="Algebra Basics", view_key="s1")
+    response = client.post("/api/grade-batch", headers=TEACHER, json={"assignment_id": own_quiz, "submissions": sheets(assignment)})
+    assert response.status_code == 404
+
+
+def test_assignments_are_created_by_teachers_without_answers(client, monkeypatch):
+    monkeypatch.setattr(app_module.gemini_api, "generate_mcqs",
+                        lambda topic, num_questions=3, allow_degraded=True, avoid=(): [question(i) for i in range(num_questions)])
+    body = {"subject": "Mathematics", "topic": "Algebra Basics", "num_questions": 3}
+    assert client.post("/api/assignments", json=body).status_code == 401
+
+    created = client.post("/api/assignments", json=body, headers=TEACHER).get_json()
+    assert len(created["questions"]) == 3
+    assert all("correct_answer" not in q for q in created["questions"])
+    assert quiz_store.get_quiz(created["assignment_id"])["kind"] == "assignment"
@@ -0,0 +1,112 @@
+import asyncio
+import concurrent.futures
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import llm_gateway
+import resilience
+
+
+class FakeModel:
+    """Answers after delay seconds (or raises error), counting the calls that reach it."""
+
+    model_name = "fake-model"
+
+    def __init__(self, delay=0.0, error=None, text="ok", usage=(10, 20)):
+        self.delay = delay
+        self.error = error
+        self.text = text
+        self.usage = usage
+        self.calls = 0
+        self.completed = 0
+
+    async def generate_content_async(self, prompt, generation_config=None):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        self.completed += 1
+        if self.error is not None:
+            raise self.error
+        return SimpleNamespace(
+            text=self.text,
+            usage_metadata=SimpleNamespace(prompt_token_count=self.usage[0], candidates_token_count=self.usage[1]),
+        )
+
+
+class Unavailable(Exception):
+    code = 503
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_probe_that_times_out_frees_the_half_open_slot(half_open_breaker):
+    breaker = half_open_breaker
+    with pytest.raises(concurrent.futures.TimeoutError):
+        llm_gateway.generate(FakeModel(delay=5), "probe that times out", timeout=0.1, content_type="test")
+
+    # The cancellation reaches the call on the gateway loop shortly after the caller gives up.
+    assert wait_until(lambda: not breaker._probe_in_flight)
+    assert breaker.allow_request()
+
+
+def test_background_probe_that_times_out_frees_the_half_open_slot(half_open_breaker):
+    breaker = half_open_breaker
+    with llm_gateway.background(), pytest.raises(concurrent.futures.TimeoutError):
+        llm_gateway.generate(FakeModel(delay=5), "unhedged probe that times out", timeout=0.1, content_type="test")
+
+    assert wait_until(lambda: not breaker._probe_in_flight)
+    assert breaker.allow_request()
+
+
+def test_failed_probe_reopens_and_successful_probe_closes(half_open_breaker):
+    breaker = half_open_breaker
+    with pytest.raises(Unavailable):
+        llm_gateway.generate(FakeModel(error=Unavailable()), "failing probe", content_type="test")
+    assert breaker.state == resilience.CircuitBreaker.OPEN
+    with pytest.raises(llm_gateway.CircuitOpenError):
+        llm_gateway.generate(FakeModel(), "rejected while open", content_type="test")
+
+    time.sleep(0.06)
+    assert llm_gateway.generate(FakeModel(), "healthy probe", content_type="test").text == "ok"
+    assert breaker.state == resilience.CircuitBreaker.CLOSED
+
+
+def test_cancelled_owner_does_not_fail_coalesced_callers(breaker):
+    model = FakeModel(delay=0.3)
+    results = {}
+
+    def background_caller():
+        time.sleep(0.05)  # joins the owner's call
+        with llm_gateway.background():
+            results["background"] = llm_gateway.generate(model, "shared prompt", timeout=5, content_type="test")
+
+    waiter = threading.Thread(target=background_caller)
+    waiter.start()
+    with pytest.raises(concurrent.futures.TimeoutError):
+        llm_gateway.generate(model, "shared prompt", timeout=0.1, content_type="test")
+    waiter.join()
+
+    assert results["background"].text == "ok"
+    assert model.calls == 1
+    assert breaker.state == breaker.CLOSED
+
+
+def test_call_is_cancelled_once_every_caller_gave_up(breaker):
+    model = FakeModel(delay=0.5)
+    for _ in range(2):
+        with pytest.raises(concurrent.futures.TimeoutError):
+            llm_gateway.generate(model, "abandoned prompt", timeout=0.1, content_type="test")
+
+    assert model.calls == 2  # the second caller did not join the cancelled call
+    assert wait_until(lambda: llm_gateway.stats()["in_flight"] == 0)
+    time.sleep(0.5)
+    assert model.completed == 0
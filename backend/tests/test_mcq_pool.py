@@ -0,0 +1,113 @@
+from collections import deque
+
+import pytest
+
+import catalog
+import gemini_interaction
+import mcq_pool
+
+TOPIC = "Algebra Basics"
+
+
+def question(number):
+    return {"id": f"q{number}", "question_text": f"Question {number}?", "options": ["1", "2", "3", "4"], "correct_answer": "1"}
+
+
+@pytest.fixture
+def generator(monkeypatch):
+    """Replaces generate_mcqs with batches from a list of callables; records every call."""
+    monkeypatch.setattr(mcq_pool, "_pools", {})
+    monkeypatch.setattr(mcq_pool, "_retry_after", {})
+    calls = []
+
+    def install(make_batch):
+        def fake_generate_mcqs(topic, num_questions=3, allow_degraded=True, avoid=()):
+            calls.append({"num_questions": num_questions, "allow_degraded": allow_degraded, "avoid": list(avoid)})
+            return make_batch(len(calls), num_questions)
+        monkeypatch.setattr(gemini_interaction, "generate_mcqs", fake_generate_mcqs)
+        return calls
+    return install
+
+
+def test_refill_stops_when_a_batch_only_repeats_pooled_questions(generator):
+    calls = generator(lambda call, n: [question(i) for i in range(n)])
+    mcq_pool._refill(TOPIC)
+
+    assert len(calls) == 2  # the second batch added nothing new
+    assert calls[1]["avoid"] == [f"Question {i}?" for i in range(mcq_pool.REFILL_BATCH)]
+    assert mcq_pool._retry_after[TOPIC] > 0
+
+
+def test_refill_makes_at_most_max_batches_calls(generator):
+    calls = generator(lambda call, n: [question(call)])  # one new question per call
+    mcq_pool._refill(TOPIC)
+
+    assert len(calls) == mcq_pool.REFILL_MAX_BATCHES
+    assert len(mcq_pool._pools[TOPIC]) == mcq_pool.REFILL_MAX_BATCHES
+    assert mcq_pool._retry_after[TOPIC] > 0
+
+
+def test_refill_stops_at_target(generator):
+    calls = generator(lambda call, n: [question(call * 100 + i) for i in range(n)])
+    mcq_pool._refill(TOPIC)
+
+    assert len(mcq_pool._pools[TOPIC]) == mcq_pool.POOL_TARGET
+    assert all(not call["allow_degraded"] for call in calls)
+    assert TOPIC not in mcq_pool._retry_after
+
+
+def test_failed_batch_backs_off(generator):
+    calls = generator(lambda call, n: [])
+    mcq_pool._refill(TOPIC)
+
+    assert len(calls) == 1
+    assert mcq_pool._retry_after[TOPIC] > 0
+
+
+def test_startup_prewarms_only_the_hot_set(monkeypatch):
+    monkeypatch.setattr(mcq_pool, "PREWARM_TOPICS", "")
+    assert mcq_pool._prewarm_topics() == []
+    monkeypatch.setattr(mcq_pool, "PREWARM_TOPICS", " Geometry ,Not A Topic")
+    assert mcq_pool._prewarm_topics() == ["Geometry"]
+    monkeypatch.setattr(mcq_pool, "PREWARM_TOPICS", "*")
+    assert mcq_pool._prewarm_topics() == list(catalog.all_topics())
+
+
+def test_sweep_keeps_recently_drawn_topics_warm(monkeypatch):
+    monkeypatch.setattr(mcq_pool, "POOL_ENABLED", True)
+    monkeypatch.setattr(mcq_pool, "PREWARM_TOPICS", "Geometry")
+    monkeypatch.setattr(mcq_pool, "_pools", {})
+    monkeypatch.setattr(mcq_pool, "_last_drawn", {})
+    monkeypatch.setattr(mcq_pool, "_request_refill", lambda topic: None)
+
+    mcq_pool.draw(TOPIC, 3, "s1")
+    mcq_pool.draw("Not A Topic", 3, "s1")
+    assert mcq_pool._sweep_topics() == ["Geometry", TOPIC]
+
+    monkeypatch.setattr(mcq_pool, "ACTIVE_SECONDS", -1)
+    assert mcq_pool._sweep_topics() == ["Geometry"]
+    assert mcq_pool._last_drawn == {}
+
+
+def test_unknown_topics_get_no_pool_and_no_refill(monkeypatch):
+    monkeypatch.setattr(mcq_pool, "POOL_ENABLED", True)
+    monkeypatch.setattr(mcq_pool, "_pools", {})
+    monkeypatch.setattr(mcq_pool, "_queued", set())
+    monkeypatch.setattr(mcq_pool, "_refill_queue", mcq_pool.queue.Queue())
+
+    assert mcq_pool.draw("Anything A Client Sends", 3, "s1") is None
+    mcq_pool._request_refill("Anything A Client Sends")
+    assert mcq_pool._pools == {} and mcq_pool._refill_queue.empty()
+
+    mcq_pool.draw(TOPIC, 3, "s1")
+    assert TOPIC in mcq_pool._pools and mcq_pool._refill_queue.get_nowait() == TOPIC
+
+
+def test_stats_list_only_active_pools_and_metrics_only_totals(monkeypatch):
+    monkeypatch.setattr(mcq_pool, "_pools", {TOPIC: deque([question(1), question(2)]), "Geometry": deque()})
+    monkeypatch.setattr(mcq_pool, "_last_drawn", {"Photosynthesis": 0.0})
+
+    stats = mcq_pool.stats()
+    assert stats["depth"] == {TOPIC: 2, "Photosynthesis": 0}
+    assert (stats["pools"], stats["pooled_questions"], stats["pools_below_low_water"]) == (2, 2, 2)
+    assert "depth" not in mcq_pool.stats(per_topic=False)
@@ -0,0 +1,26 @@
+# backend/tests/test_metrics.py
+
+import pytest
+
+import metrics
+
+
+def test_declared_metrics_are_recorded_and_rendered():
+    metrics.inc("eduro_learner_events_total", 2, kind="metrics-test")
+    metrics.observe("eduro_llm_call_duration_seconds", 0.3, content_type="metrics-test")
+    text = metrics.render()
+    assert 'eduro_learner_events_total{kind="metrics-test"} 2' in text
+    assert 'eduro_llm_call_duration_seconds_bucket{content_type="metrics-test",le="0.5"} 1' in text
+
+
+@pytest.mark.parametrize("record", [
+    lambda: metrics.inc("eduro_no_such_metric_total", kind="metrics-test"),
+    lambda: metrics.inc("eduro_llm_call_duration_seconds", content_type="metrics-test"),   # a histogram
+    lambda: metrics.observe("eduro_learner_events_total", 1.0, kind="metrics-test"),       # a counter
+    lambda: metrics.inc("eduro_learner_events_total", kind="metrics-test", extra="x"),
+    lambda: metrics.inc("eduro_mcq_rejected_total", content_type="metrics-test"),          # missing reason
+])
+def test_undeclared_names_and_label_sets_are_rejected(record):
+    with pytest.raises(ValueError):
+        record()
+    assert "extra" not in metrics.render()
@@ -0,0 +1,87 @@
+from types import SimpleNamespace
+
+import pytest
+
+import content_cache
+import gemini_interaction
+import token_budget
+
+
+def make_chunk(text, blocked=False, usage=(40, 10)):
+    return SimpleNamespace(
+        text=text,
+        prompt_feedback=SimpleNamespace(block_reason="SAFETY" if blocked else None, block_reason_message="blocked"),
+        candidates=[],
+        usage_metadata=SimpleNamespace(prompt_token_count=usage[0], candidates_token_count=usage[1]),
+    )
+
+
+class StreamModel:
+    model_name = "fake-model"
+
+    def __init__(self, chunks=(), error=None):
+        self.chunks = chunks
+        self.error = error
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        if self.error is not None:
+            raise self.error
+        return iter(self.chunks)
+
+
+class Unavailable(Exception):
+    code = 503
+
+
+@pytest.fixture
+def stream_with(monkeypatch):
+    """Streams an explanation from a fake model inside a request budget scope; returns (generator, scope)."""
+    monkeypatch.setattr(content_cache, "get", lambda key: None)
+    monkeypatch.setattr(content_cache, "put", lambda key, value: None)
+
+    def start(fake):
+        monkeypatch.setattr(gemini_interaction, "model", fake)
+        monkeypatch.setattr(gemini_interaction, "_backend", lambda model_name: fake)
+        scope = token_budget.begin("tests", budget=100000)
+        return gemini_interaction.stream_text_content("explanation", "Algebra Basics", "Inequalities"), scope
+
+    yield start
+    token_budget.end()
+
+
+def test_client_disconnect_frees_the_probe_and_keeps_the_usage(half_open_breaker, stream_with):
+    stream, scope = stream_with(StreamModel([make_chunk("first "), make_chunk("second")]))
+    assert next(stream) == ("chunk", "first ")
+    stream.close()  # what Flask does when the client goes away
+
+    assert not half_open_breaker._probe_in_flight
+    assert half_open_breaker.allow_request()
+    assert scope.spent == 50  # settled from the last chunk's usage, not left reserved
+
+
+def test_blocked_stream_reports_its_outcome(half_open_breaker, stream_with):
+    stream, scope = stream_with(StreamModel([make_chunk("partial "), make_chunk("", blocked=True)]))
+    events = list(stream)
+
+    assert events[-1][0] == "error" and "blocked" in events[-1][1]
+    assert half_open_breaker.state == half_open_breaker.CLOSED
+    assert not half_open_breaker._probe_in_flight
+    assert scope.spent == 50
+
+
+def test_failed_stream_releases_its_reservation(half_open_breaker, stream_with):
+    stream, scope = stream_with(StreamModel(error=Unavailable("upstream down")))
+    events = list(stream)
+
+    assert events[-1][0] == "done"  # offline placeholder content
+    assert half_open_breaker.state == half_open_breaker.OPEN
+    assert scope.spent == 0
+
+
+def test_completed_stream_settles_once(breaker, stream_with):
+    stream, scope = stream_with(StreamModel([make_chunk("Inequalities "), make_chunk("compare values.")]))
+    events = list(stream)
+    stream.close()
+
+    assert events[-1] == ("done", "Inequalities compare values.")
+    assert scope.spent == 50
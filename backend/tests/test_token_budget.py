@@ -0,0 +1,86 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import gemini_interaction
+import llm_gateway
+import token_budget
+
+
+class SequenceModel:
+    """The n-th call answers after delays[n] seconds with usage (prompt, output) tokens."""
+
+    model_name = "fake-model"
+
+    def __init__(self, delays, usage=(100, 50)):
+        self.delays = list(delays)
+        self.usage = usage
+        self.calls = 0
+
+    async def generate_content_async(self, prompt, generation_config=None):
+        delay = self.delays[min(self.calls, len(self.delays) - 1)]
+        self.calls += 1
+        await asyncio.sleep(delay)
+        return SimpleNamespace(
+            text="ok",
+            usage_metadata=SimpleNamespace(prompt_token_count=self.usage[0], candidates_token_count=self.usage[1]),
+        )
+
+
+@pytest.fixture
+def send_with(monkeypatch, breaker):
+    def install(fake):
+        monkeypatch.setattr(gemini_interaction, "_backend", lambda model_name: fake)
+        return lambda prompt: gemini_interaction._send("mcqs", "fake-model", prompt, {"max_output_tokens": 200})
+    return install
+
+
+def test_coalesced_call_is_charged_once(send_with):
+    send = send_with(SequenceModel([0.2]))
+    scopes = {}
+
+    def student(name):
+        with token_budget.scope(name, budget=100000) as active:
+            scopes[name] = active
+            send("the same prompt for everyone")
+
+    threads = [threading.Thread(target=student, args=(f"tenant-{i}",)) for i in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sorted(active.spent for active in scopes.values()) == [0, 0, 150]
+
+
+def test_hedged_call_charges_both_attempts(send_with, monkeypatch):
+    monkeypatch.setattr(llm_gateway, "hedge_delay", lambda content_type: 0.05)
+    send = send_with(SequenceModel([1.0, 0.01]))  # the backup wins, the primary is cancelled
+    prompt = "a slow prompt worth hedging " * 10
+
+    with token_budget.scope("tenant", budget=100000) as active:
+        send(prompt)
+
+    # The winner's usage, plus the prompt tokens of the cancelled primary (already sent).
+    assert llm_gateway.last_usage() == (100 + len(prompt) // 4, 50)
+    assert active.spent == 150 + len(prompt) // 4
+
+
+def test_unlisted_tenant_ids_share_the_default_budget(monkeypatch):
+    monkeypatch.setattr(token_budget, "TENANTS", frozenset({"school-a"}))
+    assert token_budget.tenant_id("school-a") == "school-a"
+    assert token_budget.tenant_id("rotated-1234") == token_budget.DEFAULT_TENANT
+    assert token_budget.tenant_id(None) == token_budget.DEFAULT_TENANT
+
+
+def test_usage_beyond_the_estimate_is_taken_from_the_tenant(monkeypatch):
+    monkeypatch.setattr(token_budget, "_tenant_buckets", {})
+    with token_budget.scope("overage", budget=100000) as active:
+        reservation = token_budget.reserve(100, "mcqs")
+        before = token_budget._tenant_bucket("overage").available()
+        token_budget.settle(reservation, "fake-model", "mcqs", (200, 100))
+
+    assert active.spent == 300
+    assert token_budget._tenant_bucket("overage").available() == pytest.approx(before - 200, abs=5)
@@ -0,0 +1,207 @@
+# backend/token_budget.py
+#
+# Token budgets and spend accounting for LLM calls. app.py opens a scope for each
+# HTTP request, naming the tenant (X-Tenant-Id header) and the request's token
+# budget. gemini_interaction reserves a call's estimated tokens (prompt plus
+# output cap) before sending it and settles the actual usage afterwards (every
+# attempt, hedge backups included; a call shared by coalesced callers is charged
+# to one of them):
+#   - a call that would take the request past LLM_REQUEST_TOKEN_BUDGET, or the tenant
+#     past LLM_TENANT_TOKENS_PER_HOUR, raises BudgetExceededError instead of being sent
+#     (callers treat it like any other unavailability and serve degraded content);
+#   - every settled call, including background work outside any scope, is added to the
+#     spend counters (tokens and estimated USD per tenant and model).
+# Tenant budgets are enforced per worker process, like the Gemini quotas in llm_gateway.
+# X-Tenant-Id is not authenticated, so the tenant budget is a soft quota: only the ids
+# listed in LLM_TENANTS are honoured (set the header at a trusted proxy), and every
+# other or missing id shares the "default" tenant's budget.
+
+import contextlib
+import functools
+import json
+import logging
+import os
+import threading
+
+import llm_gateway
+import metrics
+import resilience
+
+# --- Configuration ---
+REQUEST_TOKEN_BUDGET = int(os.environ.get("LLM_REQUEST_TOKEN_BUDGET", 40000))            # per HTTP request; 0 = unlimited
+TENANT_TOKENS_PER_HOUR = float(os.environ.get("LLM_TENANT_TOKENS_PER_HOUR", 2000000))    # per tenant and process; 0 = unlimited
+TENANTS = frozenset(name.strip() for name in os.environ.get("LLM_TENANTS", "").split(",") if name.strip())
+DEFAULT_TENANT = "default"
+BACKGROUND_TENANT = "background"  # spend of calls made outside any request (pool refills, prefetch, pregeneration)
+# USD per million (prompt, output) tokens, for the spend estimate. Override with LLM_PRICES='{"model": [in, out]}'.
+MODEL_PRICES = {
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-2.0-flash-lite": (0.075, 0.30),
+}
+MODEL_PRICES.update({name: tuple(prices) for name, prices in json.loads(os.environ.get("LLM_PRICES", "{}")).items()})
+
+
+class BudgetExceededError(llm_gateway.LLMUnavailableError):
+    """Raised instead of sending a call that the request or tenant budget cannot cover."""
+
+
+class _Scope:
+    def __init__(self, tenant, budget):
+        self.tenant = tenant
+        self.budget = budget
+        self.spent = 0  # settled tokens plus outstanding reservations
+        self.lock = threading.Lock()
+
+
+_local = threading.local()
+_lock = threading.Lock()
+_tenant_buckets = {}  # tenant -> resilience.TokenBucket; at most one per configured tenant, plus the default
+_spend = {"tokens": {}, "usd": {}, "rejected": {}}  # per tenant
+
+
+def tenant_id(raw):
+    """The tenant named by a client-supplied id if it is one of LLM_TENANTS, else DEFAULT_TENANT."""
+    return raw if raw in TENANTS else DEFAULT_TENANT
+
+
+def current():
+    return getattr(_local, "scope", None)
+
+
+@contextlib.contextmanager
+def scope(tenant, budget=REQUEST_TOKEN_BUDGET):
+    """Calls made by this thread inside the block are charged to tenant and limited to budget tokens."""
+    previous = current()
+    _local.scope = _Scope(tenant, budget)
+    try:
+        yield _local.scope
+    finally:
+        _local.scope = previous
+
+
+def begin(tenant, budget=REQUEST_TOKEN_BUDGET):
+    """Opens a scope for the rest of this thread's request (app.py); close it with end()."""
+    _local.scope = _Scope(tenant, budget)
+    return _local.scope
+
+
+def end():
+    """Closes the scope opened by begin() and returns it."""
+    active, _local.scope = current(), None
+    return active
+
+
+def bind(function):
+    """Wraps function to run in the calling thread's scope (for work handed to a thread pool)."""
+    captured = current()
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        previous = current()
+        _local.scope = captured
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _local.scope = previous
+    return wrapper
+
+
+def _tenant_bucket(tenant):
+    with _lock:
+        bucket = _tenant_buckets.get(tenant)
+        if bucket is None:
+            bucket = _tenant_buckets[tenant] = resilience.TokenBucket(TENANT_TOKENS_PER_HOUR / 60, capacity=TENANT_TOKENS_PER_HOUR)
+        return bucket
+
+
+def _reject(active, content_type, reason):
+    tenant = active.tenant
+    with _lock:
+        _spend["rejected"][tenant] = _spend["rejected"].get(tenant, 0) + 1
+    metrics.inc("eduro_llm_budget_rejections_total", tenant=tenant, content_type=content_type, budget=reason)
+    logging.warning("[TOKEN BUDGET] %s call refused for tenant '%s': %s budget exhausted", content_type, active.tenant, reason)
+    raise BudgetExceededError(f"{reason} token budget exhausted")
+
+
+def reserve(estimate, content_type):
+    """
+    Reserves estimate tokens from the current request and tenant budgets, or raises
+    BudgetExceededError. Pass the return value to settle() (or release() if the call failed).
+    """
+    active = current()
+    if active is None:
+        return None
+    with active.lock:
+        if active.budget and active.spent + estimate > active.budget:
+            within_request = False
+        else:
+            within_request = True
+            active.spent += estimate
+    if not within_request:
+        _reject(active, content_type, "request")
+    if TENANT_TOKENS_PER_HOUR > 0 and _tenant_bucket(active.tenant).try_acquire(estimate):
+        release((active, estimate, False))
+        _reject(active, content_type, "tenant")
+    return active, estimate, TENANT_TOKENS_PER_HOUR > 0
+
+
+def release(reservation):
+    """Returns a reservation whose call was not made or produced no usage."""
+    if reservation is None:
+        return
+    active, estimate, from_tenant = reservation
+    with active.lock:
+        active.spent -= estimate
+    if from_tenant:
+        _tenant_bucket(active.tenant).refund(estimate)
+
+
+def usage_of(response):
+    """(prompt tokens, output tokens) from a response's usage metadata, or None if it reports none."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return None
+    return (getattr(usage, "prompt_token_count", 0) or 0), (getattr(usage, "candidates_token_count", 0) or 0)
+
+
+def settle(reservation, model_name, content_type, usage):
+    """
+    Replaces the reservation with the call's actual usage, a (prompt tokens, output tokens)
+    pair (llm_gateway.last_usage() or usage_of(response)), and records the spend. With usage
+    None the estimate stays charged. Usage beyond the estimate (a hedged call) is taken
+    from the tenant budget as well.
+    """
+    prompt_tokens, output_tokens = usage if usage is not None else (0, 0)
+    actual = prompt_tokens + output_tokens
+    tenant = BACKGROUND_TENANT
+    if reservation is not None:
+        active, estimate, from_tenant = reservation
+        tenant = active.tenant
+        if usage is not None:
+            with active.lock:
+                active.spent += actual - estimate
+            if from_tenant and estimate > actual:
+                _tenant_bucket(tenant).refund(estimate - actual)
+            elif from_tenant and actual > estimate:
+                _tenant_bucket(tenant).charge(actual - estimate)
+
+    input_price, output_price = MODEL_PRICES.get(model_name, (0.0, 0.0))
+    usd = (prompt_tokens * input_price + output_tokens * output_price) / 1e6
+    with _lock:
+        _spend["tokens"][tenant] = _spend["tokens"].get(tenant, 0) + actual
+        _spend["usd"][tenant] = _spend["usd"].get(tenant, 0.0) + usd
+    metrics.inc("eduro_llm_tenant_tokens_total", prompt_tokens, tenant=tenant, model=model_name, kind="prompt")
+    metrics.inc("eduro_llm_tenant_tokens_total", output_tokens, tenant=tenant, model=model_name, kind="output")
+    metrics.inc("eduro_llm_spend_usd_total", usd, tenant=tenant, model=model_name, content_type=content_type)
+
+
+def stats():
+    """Tokens, estimated USD and refused calls per tenant in this process."""
+    with _lock:
+        return {
+            "tokens": dict(_spend["tokens"]),
+            "usd": {tenant: round(usd, 6) for tenant, usd in _spend["usd"].items()},
+            "rejected": dict(_spend["rejected"]),
+            "request_budget": REQUEST_TOKEN_BUDGET,
+            "tenant_tokens_per_hour": TENANT_TOKENS_PER_HOUR,
+        }
@@ -32,11 +32,156 @@ const mainContent = document.querySelector('.main-content');
 let currentSubject = '';
 let currentTopic = '';
 let initialMcqQuestions = [];
+let initialQuizId = null;
 let learningSections = [];
 let currentSectionIndex = 0;
 let currentSectionPhase = '';
 let currentLearningProblem = null;
+let lessonBundle = {}; // section_title -> pre-generated {explanation, example, problem} from /api/lesson-bundle
+let prefetchedContent = {}; // lesson cache key -> Promise of lesson text being fetched ahead of the student
 let statusTimeout = null; // To manage auto-hiding status
+let expandedSections = new Set(); // sections this learner found hard before: an extra practice problem each
+let skippedSections = [];          // sections this learner has already mastered
+let sectionProblemsSolved = 0;
+const EXPANDED_SECTION_PROBLEMS = 2;
+
+function newId() {
+    return (window.crypto && crypto.randomUUID)
+        ? crypto.randomUUID()
+        : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+}
+
+// Identifies this page session to the server so pooled quiz questions are not repeated.
+const sessionId = newId();
+
+// Identifies this learner across visits, so answers build up per-section mastery on the server.
+// The server issues it (signed) with the first graded answer; we send it back with every answer.
+let learnerToken = (() => {
+    try {
+        return localStorage.getItem('eduro-learner-token');
+    } catch (error) {
+        return null; // Storage unavailable: mastery is tracked for this visit only.
+    }
+})();
+
+function rememberLearnerToken(token) {
+    if (!token || token === learnerToken) return;
+    learnerToken = token;
+    try {
+        localStorage.setItem('eduro-learner-token', token);
+    } catch (error) {
+        // Storage unavailable: keep it for this visit.
+    }
+}
+
+// --- Lesson Cache (IndexedDB) ---
+// Explanations and solved examples are kept between visits, keyed by subject|topic|section|content type.
+// Least recently used entries are evicted once the cache holds more than LESSON_CACHE_MAX_BYTES.
+// Problems are never cached: each one is issued to this student and graded by its problem_id.
+const LESSON_CACHE_DB = 'eduro-lessons';
+const LESSON_CACHE_STORE = 'lessons';
+const LESSON_CACHE_MAX_BYTES = 5 * 1024 * 1024;
+const LESSON_CACHE_MAX_AGE_MS = 30 * 24 * 60 * 60 * 1000;
+let lessonCacheDb = null; // Promise of the database, resolving to null where IndexedDB is unavailable
+
+function lessonCacheKey(sectionTitle, contentType) {
+    return [currentSubject, currentTopic, sectionTitle, contentType].join('|');
+}
+
+function openLessonCache() {
+    if (!lessonCacheDb) {
+        lessonCacheDb = new Promise(resolve => {
+            if (!window.indexedDB) return resolve(null);
+            const request = indexedDB.open(LESSON_CACHE_DB, 1);
+            request.onupgradeneeded = () => {
+                const store = request.result.createObjectStore(LESSON_CACHE_STORE, { keyPath: 'key' });
+                store.createIndex('lastUsed', 'lastUsed');
+            };
+            request.onsuccess = () => resolve(request.result);
+            request.onerror = () => resolve(null); // e.g. private browsing: run without the cache
+            request.onblocked = () => resolve(null);
+        });
+    }
+    return lessonCacheDb;
+}
+
+// Resolves to the cached content for key (marking it recently used), or null.
+async function getCachedLesson(key) {
+    const db = await openLessonCache();
+    if (!db) return null;
+    return new Promise(resolve => {
+        try {
+            const store = db.transaction(LESSON_CACHE_STORE, 'readwrite').objectStore(LESSON_CACHE_STORE);
+            const request = store.get(key);
+            request.onsuccess = () => {
+                const record = request.result;
+                if (!record) return resolve(null);
+                if (Date.now() - record.storedAt > LESSON_CACHE_MAX_AGE_MS) {
+                    store.delete(key);
+                    return resolve(null);
+                }
+                record.lastUsed = Date.now();
+                store.put(record);
+                resolve(record.content);
+            };
+            request.onerror = () => resolve(null);
+        } catch (error) {
+            console.warn("Lesson cache read failed:", error);
+            resolve(null);
+        }
+    });
+}
+
+// Stores content under key, then evicts the least recently used entries beyond the size limit.
+async function putCachedLesson(key, content) {
+    const db = await openLessonCache();
+    if (!db || !content) return;
+    try {
+        const now = Date.now();
+        const transaction = db.transaction(LESSON_CACHE_STORE, 'readwrite');
+        const store = transaction.objectStore(LESSON_CACHE_STORE);
+        const size = JSON.stringify(content).length * 2; // UTF-16 code units, roughly what the browser stores
+        store.put({ key: key, content: content, size: size, storedAt: now, lastUsed: now });
+        let total = 0;
+        const cursorRequest = store.index('lastUsed').openCursor(null, 'prev'); // most recently used first
+        cursorRequest.onsuccess = () => {
+            const cursor = cursorRequest.result;
+            if (!cursor) return;
+            total += cursor.value.size || 0;
+            if (total > LESSON_CACHE_MAX_BYTES) cursor.delete();
+            cursor.continue();
+        };
+        await new Promise((resolve, reject) => {
+            transaction.oncomplete = resolve;
+            transaction.onerror = () => reject(transaction.error);
+            transaction.onabort = () => reject(transaction.error);
+        });
+    } catch (error) {
+        console.warn("Lesson cache write failed:", error);
+    }
+}
+
+// Lesson text for a step from a prefetch or the lesson cache, or null if neither has it.
+async function takeCachedContent(sectionTitle, contentType) {
+    const key = lessonCacheKey(sectionTitle, contentType);
+    const pending = prefetchedContent[key];
+    delete prefetchedContent[key];
+    const prefetched = pending ? await pending : null;
+    return prefetched || getCachedLesson(key);
+}
+
+// Fetches a lesson text step into the lesson cache while the student reads the current one.
+function prefetchLessonText(sectionTitle, contentType) {
+    const key = lessonCacheKey(sectionTitle, contentType);
+    const item = lessonBundle[sectionTitle];
+    if (prefetchedContent[key] || (item && item[contentType])) return;
+    prefetchedContent[key] = getCachedLesson(key)
+        .then(cached => cached || fetchLearningContent(sectionTitle, contentType))
+        .catch(error => {
+            console.warn(`Prefetching the ${contentType} for "${sectionTitle}" failed:`, error.message);
+            return null;
+        });
+}
 
 // --- Helper Functions ---
 function showStatus(message, isError = false) {
@@ -65,6 +210,15 @@ function showStatus(message, isError = false) {
     }, 4000); // Hide after 4 seconds
 }
 
+// Placeholder content served while the AI tutor is unavailable: its answer keys are arbitrary,
+// so it is shown as practice and never used for placement or progress.
+function addDegradedNotice(container, message) {
+    const notice = document.createElement('p');
+    notice.classList.add('degraded-notice');
+    notice.textContent = message;
+    container.prepend(notice);
+}
+
 function toggleVisibility(element, show) {
     if (show) {
         element.classList.remove('hidden');
@@ -76,10 +230,15 @@ function toggleVisibility(element, show) {
 function addChatMessage(message, sender = 'tutor') {
     const messageDiv = document.createElement('div');
     messageDiv.classList.add('chat-message', sender);
+    chatLog.appendChild(messageDiv);
+    setChatMessageText(messageDiv, message);
+    return messageDiv;
+}
+
+function setChatMessageText(messageDiv, message) {
     let formattedMessage = message.replace(/\*\*(.*?)\*\*/g, '<strong>$1</strong>');
     formattedMessage = formattedMessage.replace(/\n/g, '<br>');
     messageDiv.innerHTML = formattedMessage;
-    chatLog.appendChild(messageDiv);
     chatLog.scrollTop = chatLog.scrollHeight;
 }
 
@@ -146,7 +305,7 @@ async function startInitialMcq() {
         const response = await fetch(`${API_BASE_URL}/initial-mcqs`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ subject: currentSubject, topic: currentTopic })
+            body: JSON.stringify({ subject: currentSubject, topic: currentTopic, session_id: sessionId })
         });
         const data = await response.json();
         if (!response.ok) {
@@ -161,7 +320,11 @@ async function startInitialMcq() {
             return;
         }
         initialMcqQuestions = data.questions;
+        initialQuizId = data.quiz_id;
         renderMcqs(data.questions, mcqQuestionsDiv);
+        if (data.degraded) {
+            addDegradedNotice(mcqQuestionsDiv, "The AI tutor is unavailable right now, so these are practice questions only. Your answers won't decide where you start.");
+        }
         showStatus('Initial quiz loaded. Please answer the questions.');
     } catch (error) {
         showStatus(`Error fetching initial MCQs: ${error.message}`, true);
@@ -214,24 +377,27 @@ async function submitInitialMcqs() {
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ 
                 answers: userAnswers, 
-                original_questions: initialMcqQuestions,
-                subject: currentSubject,
-                topic: currentTopic
+                quiz_id: initialQuizId,
+                learner_token: learnerToken
             })
         });
         const result = await response.json();
         if (!response.ok) {
             throw new Error(result.error || `HTTP error! status: ${response.status}`);
         }
+        rememberLearnerToken(result.learner_token);
         showStatus(result.message);
         // toggleVisibility(mcqArea, false); // This will be handled by next step
 
-        if (result.all_correct) {
+        if (result.all_correct && !result.degraded) { // No placement from placeholder questions.
             // toggleMainInterface(false); // Will be handled by startAdvancedMcq
             startAdvancedMcq();
         } else {
             learningSections = result.sections || [];
+            skippedSections = result.skipped_sections || [];
+            expandedSections = new Set(result.expanded_sections || []);
             currentSectionIndex = 0;
+            loadLessonBundle(currentSubject, currentTopic); // In the background; steps fall back to per-step fetches.
             startLearningFlow(); // This will call toggleMainInterface(true)
         }
     } catch (error) {
@@ -252,7 +418,7 @@ async function startAdvancedMcq() {
         const response = await fetch(`${API_BASE_URL}/advanced-mcqs`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ topic: currentTopic })
+            body: JSON.stringify({ subject: currentSubject, topic: currentTopic, session_id: sessionId })
         });
         const data = await response.json();
         if (!response.ok) {
@@ -266,6 +432,9 @@ async function startAdvancedMcq() {
             return;
         }
         renderMcqs(data.questions, advancedMcqQuestionsDiv);
+        if (data.degraded) {
+            addDegradedNotice(advancedMcqQuestionsDiv, "The AI tutor is unavailable right now, so these are placeholder practice questions.");
+        }
         showStatus('Advanced quiz loaded.');
     } catch (error) {
         showStatus(`Error fetching advanced MCQs: ${error.message}`, true);
@@ -287,9 +456,13 @@ function submitAdvancedMcqsHandler() {
 function startLearningFlow() {
     toggleMainInterface(true);
     chatLog.innerHTML = '';
+    if (skippedSections.length > 0) {
+        addChatMessage(`You've already mastered ${skippedSections.map(title => `**${title}**`).join(', ')}, so we'll skip ahead.`);
+    }
     if (learningSections.length > 0) {
         currentSectionIndex = 0;
         currentSectionPhase = '';
+        sectionProblemsSolved = 0;
         handleNextLearningStep();
     } else {
         addChatMessage("No learning sections defined for this topic. Let's go to the advanced quiz or pick another topic.");
@@ -315,41 +488,65 @@ async function handleNextLearningStep() {
         if (!currentSectionPhase) {
             currentSectionPhase = 'explanation';
             addChatMessage(`Let's start with the section: **${sectionTitle}**.`);
+            if (expandedSections.has(sectionTitle)) {
+                addChatMessage("This section was tricky last time, so we'll finish it with an extra practice problem.");
+            }
             addChatMessage("Ready for an explanation? (Click 'Next' or type 'next')");
+            prefetchLessonText(sectionTitle, 'explanation');
             toggleVisibility(nextStepBtn, true);
             toggleVisibility(userInputArea, true);
             userChatInput.placeholder = "Type 'next' or click the button";
             userChatInput.value = '';
         } else if (currentSectionPhase === 'get_explanation') {
-            showStatus(`Fetching explanation for "${sectionTitle}"...`);
-            const content = await fetchLearningContent(sectionTitle, 'explanation');
-            showStatus(""); // Clear status after fetch
-            addChatMessage(content);
+            const bundledExplanation = takeBundledContent(sectionTitle, 'explanation')
+                || await takeCachedContent(sectionTitle, 'explanation');
+            if (bundledExplanation) {
+                addChatMessage(bundledExplanation);
+            } else {
+                showStatus(`Fetching explanation for "${sectionTitle}"...`);
+                await streamLearningContentToChat(sectionTitle, 'explanation');
+                showStatus(""); // Clear status after fetch
+            }
             addChatMessage("Understood? Ready for a solved example? (Click 'Next' or type 'next')");
+            prefetchLessonText(sectionTitle, 'example');
             currentSectionPhase = 'example';
             toggleVisibility(nextStepBtn, true);
             toggleVisibility(userInputArea, true);
             userChatInput.placeholder = "Type 'next' or click the button";
         } else if (currentSectionPhase === 'get_example') {
-            showStatus(`Fetching solved example for "${sectionTitle}"...`);
-            const content = await fetchLearningContent(sectionTitle, 'example');
-            showStatus("");
-            addChatMessage(content);
+            const bundledExample = takeBundledContent(sectionTitle, 'example')
+                || await takeCachedContent(sectionTitle, 'example');
+            if (bundledExample) {
+                addChatMessage(bundledExample);
+            } else {
+                showStatus(`Fetching solved example for "${sectionTitle}"...`);
+                await streamLearningContentToChat(sectionTitle, 'example');
+                showStatus("");
+            }
             addChatMessage("Got it? Now, ready for a problem to solve on your own? (Click 'Next' or type 'next')");
             currentSectionPhase = 'problem';
             toggleVisibility(nextStepBtn, true);
             toggleVisibility(userInputArea, true);
             userChatInput.placeholder = "Type 'next' or click the button";
         } else if (currentSectionPhase === 'get_problem') {
-            showStatus(`Fetching a problem for "${sectionTitle}"...`);
-            const problemData = await fetchLearningContent(sectionTitle, 'problem');
-            showStatus("");
+            let problemData = takeBundledContent(sectionTitle, 'problem');
+            if (!problemData) {
+                showStatus(`Fetching a problem for "${sectionTitle}"...`);
+                problemData = await fetchLearningContent(sectionTitle, 'problem');
+                showStatus("");
+            }
 
             if (typeof problemData === 'object' && problemData.question_text && problemData.options) {
                 currentLearningProblem = problemData;
+                if (problemData.degraded) {
+                    addChatMessage("The AI tutor is unavailable right now, so this is a placeholder problem. It won't count toward your progress.");
+                }
                 addChatMessage(`**Problem:**\n${problemData.question_text}`);
                 renderProblemOptions(problemData.options);
                 currentSectionPhase = 'awaiting_problem_selection';
+                if (currentSectionIndex + 1 < learningSections.length) {
+                    prefetchLessonText(learningSections[currentSectionIndex + 1], 'explanation');
+                }
             } else {
                 throw new Error(problemData.error || "Failed to load problem content correctly.");
             }
@@ -400,21 +597,31 @@ async function handleProblemOptionClick(selectedOption) {
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({
                 user_answer: selectedOption,
-                problem: currentLearningProblem
+                problem_id: currentLearningProblem.problem_id,
+                learner_token: learnerToken
             })
         });
         const result = await response.json();
         if (!response.ok) {
             throw new Error(result.error || `HTTP error! status: ${response.status}`);
         }
+        rememberLearnerToken(result.learner_token);
         
         showStatus(result.message); // Show evaluation message (correct/incorrect)
         addChatMessage(result.message, 'tutor');
 
         if (result.correct) {
+            sectionProblemsSolved++;
+            currentLearningProblem = null;
+            if (expandedSections.has(learningSections[currentSectionIndex]) && sectionProblemsSolved < EXPANDED_SECTION_PROBLEMS) {
+                addChatMessage("Nice! One more problem on this section to lock it in. Click 'Next' to get it.", 'tutor');
+                currentSectionPhase = 'problem';
+                toggleVisibility(nextStepBtn, true);
+                return;
+            }
             currentSectionIndex++;
             currentSectionPhase = '';
-            currentLearningProblem = null;
+            sectionProblemsSolved = 0;
             handleNextLearningStep();
         } else {
             addChatMessage("Let's try another problem on this section, or review the material. Click 'Next' to get a new problem.", 'tutor');
@@ -433,6 +640,7 @@ async function handleProblemOptionClick(selectedOption) {
 }
 
 async function fetchLearningContent(sectionTitle, contentType) {
+    const cacheKey = lessonCacheKey(sectionTitle, contentType);
     try {
         const response = await fetch(`${API_BASE_URL}/learning-content`, {
             method: 'POST',
@@ -441,7 +649,8 @@ async function fetchLearningContent(sectionTitle, contentType) {
                 subject: currentSubject,
                 topic: currentTopic,
                 section_title: sectionTitle,
-                content_type: contentType
+                content_type: contentType,
+                session_id: sessionId
             })
         });
         const data = await response.json(); 
@@ -457,12 +666,128 @@ async function fetchLearningContent(sectionTitle, contentType) {
         if (data.content === undefined) {
              throw new Error("Received OK response but no 'content' from backend.");
         }
+        if (data.cacheable) putCachedLesson(cacheKey, data.content);
+        if (data.degraded && contentType !== 'problem') {
+            showStatus("The AI tutor is unavailable right now, so this is placeholder text.", true);
+        }
         return data.content; 
     } catch (error) {
         throw error;
     }
 }
 
+// Fetches the whole lesson (every section's explanation, example and problem) in one request.
+async function loadLessonBundle(subject, topic) {
+    lessonBundle = {};
+    try {
+        const response = await fetch(`${API_BASE_URL}/lesson-bundle`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ subject: subject, topic: topic, session_id: sessionId })
+        });
+        const data = await response.json();
+        if (!response.ok) throw new Error(data.error || `HTTP error! status: ${response.status}`);
+        if (subject !== currentSubject || topic !== currentTopic) return; // The student moved on.
+        (data.sections || []).forEach(item => {
+            lessonBundle[item.section_title] = item;
+            if (data.cacheable) {
+                putCachedLesson(lessonCacheKey(item.section_title, 'explanation'), item.explanation);
+                putCachedLesson(lessonCacheKey(item.section_title, 'example'), item.example);
+            }
+        });
+    } catch (error) {
+        console.warn("Lesson bundle unavailable, fetching steps individually:", error.message);
+    }
+}
+
+// Returns (and consumes) a bundled lesson part, or null if the bundle does not have it.
+// Consuming it means a retried problem is fetched fresh instead of repeating the same one.
+function takeBundledContent(sectionTitle, contentType) {
+    const item = lessonBundle[sectionTitle];
+    if (!item || !item[contentType]) return null;
+    const content = item[contentType];
+    item[contentType] = null;
+    return content;
+}
+
+// Reads a Server-Sent Events response body, calling onEvent(eventName, payload) per event.
+async function readSseStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            let eventName = 'message';
+            let dataLines = [];
+            rawEvent.split('\n').forEach(line => {
+                if (line.startsWith('event:')) eventName = line.slice(6).trim();
+                else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim());
+            });
+            if (dataLines.length > 0) {
+                onEvent(eventName, JSON.parse(dataLines.join('\n')));
+            }
+        }
+    }
+}
+
+// Streams explanation/example text into a new chat message as it is generated.
+// Falls back to the non-streaming endpoint when the browser cannot read response streams.
+async function streamLearningContentToChat(sectionTitle, contentType) {
+    if (!window.ReadableStream || !window.TextDecoder) {
+        addChatMessage(await fetchLearningContent(sectionTitle, contentType));
+        return;
+    }
+    const cacheKey = lessonCacheKey(sectionTitle, contentType);
+
+    const response = await fetch(`${API_BASE_URL}/learning-content/stream`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json', 'Accept': 'text/event-stream' },
+        body: JSON.stringify({
+            subject: currentSubject,
+            topic: currentTopic,
+            section_title: sectionTitle,
+            content_type: contentType,
+            session_id: sessionId
+        })
+    });
+    if (!response.ok || !response.body) {
+        addChatMessage(await fetchLearningContent(sectionTitle, contentType));
+        return;
+    }
+
+    let messageDiv = null;
+    let text = '';
+    let streamError = null;
+    let completed = false;
+    await readSseStream(response, (eventName, payload) => {
+        if (eventName === 'chunk') {
+            text += payload.text;
+            if (!messageDiv) messageDiv = addChatMessage(text);
+            else setChatMessageText(messageDiv, text);
+        } else if (eventName === 'done') {
+            completed = true;
+            if (payload.cacheable) putCachedLesson(cacheKey, payload.content);
+            if (payload.degraded) showStatus("The AI tutor is unavailable right now, so this is placeholder text.", true);
+            if (messageDiv) setChatMessageText(messageDiv, payload.content);
+            else addChatMessage(payload.content);
+        } else if (eventName === 'error') {
+            if (payload.raw_error) console.error("Raw backend error:", payload.raw_error);
+            streamError = payload.error || `Server error while fetching ${contentType}`;
+        }
+    });
+
+    if (streamError || !completed) {
+        if (messageDiv) messageDiv.remove();
+        throw new Error(streamError || `The ${contentType} stream ended unexpectedly.`);
+    }
+}
+
 function handleUserChatInput() {
     const userInput = userChatInput.value.trim();
     if (!userInput) return;
@@ -530,10 +855,16 @@ function resetState(showWelcome = true) { // Added parameter
     startLearningBtn.disabled = true;
     
     initialMcqQuestions = [];
+    initialQuizId = null;
     learningSections = [];
     currentSectionIndex = 0;
     currentSectionPhase = '';
     currentLearningProblem = null;
+    lessonBundle = {};
+    prefetchedContent = {};
+    expandedSections = new Set();
+    skippedSections = [];
+    sectionProblemsSolved = 0;
     
     mcqQuestionsDiv.innerHTML = '';
     advancedMcqQuestionsDiv.innerHTML = '';
@@ -555,5 +886,9 @@ function resetState(showWelcome = true) { // Added parameter
 }
 
 // Initial load
+// The service worker keeps the app shell and the subject/topic lists for slow or dropped connections.
+if ('serviceWorker' in navigator && window.location.protocol.startsWith('http')) {
+    navigator.serviceWorker.register('sw.js').catch(error => console.warn("Service worker registration failed:", error));
+}
 fetchSubjects();
 resetState(); // This will call showStatus with the welcome message.
\ No newline at end of file